@@ -0,0 +1,19 @@
+from .scoring import (
+    BAND_HIGH,
+    BAND_LABELS,
+    BAND_LOW,
+    BAND_MEDIUM,
+    DEFAULT_SCHEME,
+    HIGH_THRESHOLD,
+    INDICATORS,
+    MEDIUM_THRESHOLD,
+    WEIGHT_SCHEMES,
+    WEIGHTS,
+    ScoreResult,
+    as_matrix,
+    compute_scores,
+    contributions,
+    rating_bands,
+    register_weight_scheme,
+    score_batch,
+)
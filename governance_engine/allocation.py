@@ -0,0 +1,111 @@
+from collections import namedtuple
+
+import numpy as np
+
+AllocationResult = namedtuple("AllocationResult", ["alloc", "duration", "eligible", "unallocated"])
+
+METHOD_PROPORTIONAL = "proportional"
+METHOD_MIN_DURATION = "min_duration"
+
+
+def _prepare(g, total_capital, min_gov, max_alloc):
+    g = np.asarray(g, dtype=np.float64).ravel()
+    eligible = g >= min_gov
+    cap = np.full(g.shape, np.inf) if max_alloc is None else np.broadcast_to(
+        np.asarray(max_alloc, dtype=np.float64), g.shape).astype(np.float64)
+    cap = np.where(eligible, np.maximum(cap, 0.0), 0.0)
+    if total_capital < 0:
+        raise ValueError("total_capital must be non-negative")
+    return g, eligible, cap
+
+
+def _result(alloc, g, eligible, total_capital, shock_impact):
+    duration = (alloc * shock_impact) / (g + 1)
+    unallocated = max(float(total_capital - alloc.sum()), 0.0)
+    return AllocationResult(alloc, duration, eligible, unallocated)
+
+
+def proportional_allocation(g, total_capital, shock_impact, min_gov=0.0, max_alloc=None):
+    """توزيع تناسبي مع (الحوكمة + 1) بسقف لكل وحدة، بطريقة التعبئة المائية.
+
+    يُبحث عن المستوى λ الذي يحقق Σ min(λ·w, السقف) = رأس المال، فتُحترم السقوف بدقة
+    ويُوزع رأس المال كاملًا على الوحدات المؤهلة فقط ما دامت السقوف تسمح بذلك.
+    """
+    g, eligible, cap = _prepare(g, total_capital, min_gov, max_alloc)
+    w = np.where(eligible, g + 1, 0.0)
+    alloc = np.zeros_like(g)
+    active = (w > 0) & (cap > 0)
+    if not active.any() or total_capital == 0:
+        return _result(alloc, g, eligible, total_capital, shock_impact)
+
+    w_a, cap_a = w[active], cap[active]
+    if cap_a.sum() <= total_capital:
+        alloc[active] = cap_a
+        return _result(alloc, g, eligible, total_capital, shock_impact)
+
+    # نقاط التشبع: عند λ = cap/w تصل الوحدة إلى سقفها
+    t = cap_a / w_a
+    order = np.argsort(t)
+    t_sorted, w_sorted, cap_sorted = t[order], w_a[order], cap_a[order]
+    capped_sum = np.concatenate([[0.0], np.cumsum(cap_sorted)])
+    free_w = w_sorted.sum() - np.concatenate([[0.0], np.cumsum(w_sorted)])
+    # المجموع عند كل نقطة تشبع؛ أول نقطة تتجاوز رأس المال تحدد المقطع الذي يقع فيه λ
+    filled_at = capped_sum[:-1] + t_sorted * free_w[:-1]
+    k = int(np.searchsorted(filled_at, total_capital, side="left"))
+    lam = (total_capital - capped_sum[k]) / free_w[k]
+    alloc[active] = np.minimum(lam * w_a, cap_a)
+    return _result(alloc, g, eligible, total_capital, shock_impact)
+
+
+def min_duration_allocation(g, total_capital, shock_impact, min_gov=0.0, max_alloc=None):
+    """الحل الأمثل الدقيق لتقليل Σ (التخصيص × الصدمة) / (الحوكمة + 1) تحت قيود الأهلية والسقف.
+
+    الهدف خطي، لذا الحل الأمثل للبرنامج الخطي هو ملء الوحدات الأقل كلفة (الأعلى حوكمة) حتى سقفها
+    بالترتيب، بتعقيد O(n log n).
+    """
+    g, eligible, cap = _prepare(g, total_capital, min_gov, max_alloc)
+    alloc = np.zeros_like(g)
+    idx = np.flatnonzero(eligible & (cap > 0))
+    if idx.size == 0 or total_capital == 0:
+        return _result(alloc, g, eligible, total_capital, shock_impact)
+
+    order = idx[np.argsort(-g[idx], kind="stable")]
+    # المخصص قبل كل وحدة (مجموع تراكمي استثنائي)؛ بلا سقف تكون cap = inf فلا يجوز طرحها من المجموع
+    before = np.concatenate([[0.0], np.cumsum(cap[order])[:-1]])
+    alloc[order] = np.clip(total_capital - before, 0.0, cap[order])
+    return _result(alloc, g, eligible, total_capital, shock_impact)
+
+
+def solve_allocation_lp(g, total_capital, shock_impact, min_gov=0.0, max_alloc=None, solver=None):
+    """نفس مسألة min_duration_allocation عبر CVXPY، للتحقق أو لإضافة قيود أخرى."""
+    import cvxpy as cp
+
+    g, eligible, cap = _prepare(g, total_capital, min_gov, max_alloc)
+    alloc = np.zeros_like(g)
+    idx = np.flatnonzero(eligible & (cap > 0))
+    if idx.size == 0 or total_capital == 0:
+        return _result(alloc, g, eligible, total_capital, shock_impact)
+
+    cost = shock_impact / (g[idx] + 1)
+    target = min(float(total_capital), float(cap[idx].sum()))
+    x = cp.Variable(idx.size)
+    constraints = [cp.sum(x) == target, x >= 0]
+    finite = np.isfinite(cap[idx])
+    if finite.any():
+        constraints.append(x[np.flatnonzero(finite)] <= cap[idx][finite])
+    prob = cp.Problem(cp.Minimize(cost @ x), constraints)
+    prob.solve(solver=solver)
+    if x.value is None:
+        raise RuntimeError(f"allocation LP failed with status {prob.status}")
+    alloc[idx] = np.clip(x.value, 0.0, cap[idx])
+    return _result(alloc, g, eligible, total_capital, shock_impact)
+
+
+ALLOCATORS = {
+    METHOD_PROPORTIONAL: proportional_allocation,
+    METHOD_MIN_DURATION: min_duration_allocation,
+}
+
+
+def allocate_capital(g, total_capital, shock_impact, min_gov=0.0, max_alloc=None, method=METHOD_PROPORTIONAL):
+    return ALLOCATORS[method](g, total_capital, shock_impact, min_gov=min_gov, max_alloc=max_alloc)
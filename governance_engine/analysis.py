@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+
+SCORE_COL = "Governance_Score"
+
+# حد الارتباط الذي يبدأ عنده عرض نموذج الانحدار في التبويب 3
+REGRESSION_MIN_CORR = 0.4
+
+# حدود تفسير قوة العلاقة كما في التبويب 3
+STRENGTH_LEVELS = ((0.7, "قوية جدًا"), (0.4, "متوسطة"), (0.2, "ضعيفة"))
+STRENGTH_NONE = "لا توجد علاقة"
+
+SCREEN_COLUMNS = ["metric", "n", "pearson", "spearman", "slope", "intercept", "r2", "mae", "mse", "rmse", "strength"]
+
+
+def clean_pair(df, metric, score_col=SCORE_COL):
+    """عمودا الحوكمة والمؤشر المالي بعد التحويل الرقمي وحذف القيم الناقصة."""
+    df_clean = df[[score_col, metric]].copy()
+    df_clean[score_col] = pd.to_numeric(df_clean[score_col], errors="coerce")
+    df_clean[metric] = pd.to_numeric(df_clean[metric], errors="coerce")
+    return df_clean.dropna()
+
+
+def strength_label(corr):
+    if not np.isfinite(corr):
+        return STRENGTH_NONE
+    for threshold, label in STRENGTH_LEVELS:
+        if corr >= threshold:
+            return label
+    return STRENGTH_NONE
+
+
+def _pearson_columns(x, Y, mask):
+    """ارتباط بيرسون والانحدار لكل عمود في Y مقابل x (عمود واحد أو مصفوفة بنفس الشكل) على الصفوف المكتملة لكل زوج."""
+    n = mask.sum(axis=0).astype(np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_x = np.where(mask, x, 0.0).sum(axis=0) / n
+        mean_y = np.where(mask, Y, 0.0).sum(axis=0) / n
+        dx = np.where(mask, x - mean_x, 0.0)
+        dy = np.where(mask, Y - mean_y, 0.0)
+        sxx = (dx * dx).sum(axis=0)
+        syy = (dy * dy).sum(axis=0)
+        sxy = (dx * dy).sum(axis=0)
+        corr = np.where((sxx > 0) & (syy > 0), sxy / np.sqrt(sxx * syy), np.nan)
+        slope = np.where(sxx > 0, sxy / sxx, np.nan)
+    return n, mean_x, mean_y, dx, dy, corr, slope, syy
+
+
+def _average_ranks(values):
+    """رتب متوسطة للتعادلات لكل صف من مصفوفة (أعمدة × صفوف)، والقيم الناقصة تبقى NaN.
+
+    ترتيب quicksort مع معالجة التعادلات عبر bincount أسرع بعدة مرات من rankdata على المصفوفات الكبيرة.
+    """
+    k, n = values.shape
+    order = np.argsort(values, axis=1)
+    ordered = np.take_along_axis(values, order, axis=1)
+    starts = np.ones((k, n), dtype=bool)
+    starts[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+    groups = (np.cumsum(starts, axis=1) - 1 + (np.arange(k) * n)[:, None]).ravel()
+    positions = np.broadcast_to(np.arange(1, n + 1, dtype=np.float64), (k, n)).ravel()
+    sums = np.bincount(groups, weights=positions, minlength=k * n)
+    counts = np.bincount(groups, minlength=k * n)
+    with np.errstate(invalid="ignore"):
+        ordered_ranks = (sums / counts)[groups].reshape(k, n)
+    ranks = np.empty((k, n))
+    np.put_along_axis(ranks, order, ordered_ranks, axis=1)
+    ranks[np.isnan(values)] = np.nan
+    return ranks
+
+
+def _column_ranks(Y, mask):
+    # الترتيب على مصفوفة منقولة متصلة في الذاكرة أسرع بكثير من الترتيب على المحور 0
+    return _average_ranks(np.ascontiguousarray(np.where(mask, Y, np.nan).T)).T
+
+
+def metric_screen(df, metrics=None, score_col=SCORE_COL):
+    """جدول ترتيب لكل المؤشرات المالية مقابل مؤشر الحوكمة في تمريرة مصفوفية واحدة.
+
+    لكل عمود: ارتباط بيرسون وسبيرمان، ميل وثابت الانحدار الخطي، R²، MAE، MSE و RMSE،
+    محسوبة على الصفوف المكتملة لذلك العمود فقط (مثل dropna في التحليل الفردي).
+    """
+    if metrics is None:
+        metrics = [c for c in df.select_dtypes(include=["float", "int"]).columns if c != score_col]
+    metrics = list(metrics)
+    x = pd.to_numeric(df[score_col], errors="coerce").to_numpy(dtype=np.float64)
+    Y = df[metrics].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+    if Y.ndim == 1:
+        Y = Y[:, None]
+    mask = ~np.isnan(x)[:, None] & ~np.isnan(Y)
+
+    n, mean_x, mean_y, dx, dy, corr, slope, syy = _pearson_columns(x[:, None], Y, mask)
+    intercept = mean_y - slope * mean_x
+    with np.errstate(invalid="ignore"):
+        # البواقي: dy - slope·dx على الصفوف المكتملة
+        resid = np.where(mask, dy - slope * dx, 0.0)
+        mae = np.abs(resid).sum(axis=0) / n
+        mse = (resid * resid).sum(axis=0) / n
+        r2 = np.where(syy > 0, 1 - (resid * resid).sum(axis=0) / syy, np.nan)
+
+    # سبيرمان = بيرسون على الرتب، مع ترتيب x داخل الصفوف المكتملة لكل عمود
+    rank_y = _column_ranks(Y, mask)
+    rank_x = np.empty_like(rank_y)
+    # الأعمدة التي لا تنقصها قيم تشترك في رتب x نفسها، فلا تُعاد إلا للأعمدة الناقصة
+    x_valid = ~np.isnan(x)
+    shared = (mask == x_valid[:, None]).all(axis=0)
+    if shared.any():
+        rank_x[:, shared] = _column_ranks(x[:, None], x_valid[:, None])
+    if not shared.all():
+        rank_x[:, ~shared] = _column_ranks(np.broadcast_to(x[:, None], mask[:, ~shared].shape), mask[:, ~shared])
+    spearman = _pearson_columns(rank_x, rank_y, mask)[5]
+
+    table = pd.DataFrame({
+        "metric": metrics,
+        "n": n.astype(np.int64),
+        "pearson": corr,
+        "spearman": spearman,
+        "slope": slope,
+        "intercept": intercept,
+        "r2": r2,
+        "mae": mae,
+        "mse": mse,
+        "rmse": np.sqrt(mse),
+    })
+    table["strength"] = [strength_label(abs(c)) + (" (عكسية)" if c < 0 else "") for c in table["pearson"]]
+    order = np.argsort(-np.nan_to_num(np.abs(table["pearson"].to_numpy()), nan=-1.0), kind="stable")
+    return table.iloc[order].reset_index(drop=True)
+
+
+def analyze_pair(df_clean, metric, score_col=SCORE_COL):
+    """الارتباط ونموذج الانحدار الخطي بين مؤشر الحوكمة ومؤشر مالي واحد."""
+    result = {"n": len(df_clean), "corr": None, "slope": None, "intercept": None, "regression": None}
+    if df_clean[score_col].nunique() <= 1 or df_clean[metric].nunique() <= 1:
+        return result
+
+    row = metric_screen(df_clean, [metric], score_col).iloc[0]
+    corr = row["pearson"]
+    result.update(corr=corr, slope=float(row["slope"]), intercept=float(row["intercept"]))
+
+    if abs(corr) >= REGRESSION_MIN_CORR:
+        result["regression"] = {
+            "slope": float(row["slope"]),
+            "intercept": float(row["intercept"]),
+            "r2": float(row["r2"]),
+            "mae": float(row["mae"]),
+            "mse": float(row["mse"]),
+            "rmse": float(row["rmse"]),
+        }
+    return result
+
+
+def clean_and_analyze(df, metric, score_col=SCORE_COL):
+    df_clean = clean_pair(df, metric, score_col)
+    return df_clean, analyze_pair(df_clean, metric, score_col)
@@ -0,0 +1,262 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .allocation import METHOD_MIN_DURATION, METHOD_PROPORTIONAL, allocate_capital
+from .analysis import metric_screen
+from .bootstrap import bootstrap_pair
+from .covariance import METHOD_LEDOIT_WOLF, estimate_covariance
+from .frontier import default_lambdas, efficient_frontier
+from .panel import panel_regression
+from .peers import ALL_PERIODS, PeerIndex
+from .portfolio import DEFAULT_VARIANCE, heuristic_weights
+from .scoring import INDICATORS, score_batch
+from .screening import screen_frame
+from .sensitivity import weight_sensitivity
+from .simulation import SHOCK_IMPACT, SHOCK_TYPES, adjustment_duration, monte_carlo_adjustment
+from .streaming import RunningStats
+from .trajectory import simulate_trajectories
+
+# الحد الأدنى لزمن القياس لكل حجم: تُكرر النواة حتى تبلغه (أو حتى max_repeat)
+MIN_TIME = 0.2
+DEFAULT_TOLERANCE = 1.3
+
+Kernel = namedtuple("Kernel", ["name", "unit", "quick", "full", "setup", "run"])
+Measurement = namedtuple("Measurement", ["kernel", "size", "unit", "seconds", "median", "repeats", "throughput",
+                                         "peak_mb"])
+
+
+def _indicators(rng, n):
+    return rng.random((n, len(INDICATORS))) * 10
+
+
+def _panel(rng, n):
+    df = pd.DataFrame(_indicators(rng, n), columns=INDICATORS)
+    df["Bank"] = rng.integers(0, max(n // 10, 2), n)
+    df["ROA"] = 0.1 * df["Transparency"] + rng.normal(size=n)
+    return df
+
+
+def _metrics(rng, n):
+    x = rng.random(n) * 10
+    df = pd.DataFrame({"Governance_Score": x})
+    for j in range(5):
+        df[f"M{j}"] = 0.1 * j * x + rng.normal(size=n)
+    return df
+
+
+def _assets(rng, n):
+    r = rng.random(n) * 0.1 + 0.01
+    return r, np.zeros(n), np.full(n, min(1.0, 5.0 / n))
+
+
+def _dense_covariance(rng, n):
+    # تغاير مقدر بانكماش Ledoit-Wolf من سجل عوائد، كما في التبويب 6
+    return estimate_covariance(rng.normal(size=(250, n)) * 0.01, METHOD_LEDOIT_WOLF)[0]
+
+
+def _screening_panel(rng, n):
+    # خمس سنوات لكل مؤسسة بملف مؤشرات ثابت وتذبذب صغير سنويًا، حتى تكون القفزات والقيم الشاذة نادرة كما في ملف حقيقي
+    profile = np.repeat(_indicators(rng, n // 5 + 1), 5, axis=0)[:n]
+    df = pd.DataFrame(np.clip(profile + rng.normal(0, 0.3, profile.shape), 0, 10), columns=INDICATORS)
+    df["Bank"] = np.arange(n) // 5
+    df["Year"] = 2020 + np.arange(n) % 5
+    return df
+
+
+def _peer_index(rng, n):
+    index = PeerIndex(np.arange(n), None, _indicators(rng, n))
+    # شجرة KD تُبنى عند أول استعلام، فلا تدخل في زمن الاستعلامات
+    index.nearest(0, ALL_PERIODS)
+    return index
+
+
+def _cvxpy_problem(rng, n):
+    from .portfolio import PortfolioProblem
+
+    r, lo, hi = _assets(rng, n)
+    cov = np.identity(n) * DEFAULT_VARIANCE
+    problem = PortfolioProblem(n, structure="diagonal")
+    problem.solve(r, lo, hi, cov=cov)
+    return problem, r, lo, hi, cov
+
+
+KERNELS = [
+    Kernel("scoring", "rows", (100, 10_000, 1_000_000), (100, 10_000, 1_000_000, 10_000_000),
+           _indicators, lambda X: score_batch(X)),
+    Kernel("adjustment_duration", "rows", (100, 10_000, 1_000_000), (100, 10_000, 1_000_000, 10_000_000),
+           lambda rng, n: (rng.random(n) * 500, rng.random(n) * 10),
+           lambda args: adjustment_duration(args[0], args[1], SHOCK_IMPACT[SHOCK_TYPES[0]])),
+    Kernel("running_stats", "rows", (100, 10_000, 1_000_000), (100, 10_000, 1_000_000, 10_000_000),
+           lambda rng, n: rng.random(n) * 10, lambda s: RunningStats().update(s)),
+    Kernel("monte_carlo", "scenarios", (100, 10_000, 1_000_000), (100, 10_000, 1_000_000, 10_000_000),
+           lambda rng, n: n,
+           lambda n: monte_carlo_adjustment(100.0, 6.0, SHOCK_TYPES[0], n_scenarios=n, seed=0)),
+    Kernel("trajectories", "banks", (100, 1000, 10_000), (100, 1000, 10_000, 100_000),
+           lambda rng, n: (rng.random(n) * 500, rng.random(n) * 10),
+           lambda args: simulate_trajectories(args[0], args[1], SHOCK_TYPES[0], horizon=3 * 365, max_points=500,
+                                              seed=0)),
+    Kernel("metric_screen", "rows", (100, 10_000, 100_000), (100, 10_000, 1_000_000),
+           _metrics, lambda df: metric_screen(df)),
+    Kernel("bootstrap", "rows", (100, 10_000), (100, 10_000, 100_000),
+           _metrics, lambda df: bootstrap_pair(df, "M3", n_resamples=200, n_permutations=200, seed=0)),
+    Kernel("panel_regression", "rows", (100, 10_000, 1_000_000), (100, 10_000, 1_000_000, 10_000_000),
+           _panel, lambda df: panel_regression(df, "ROA", INDICATORS, "Bank")),
+    Kernel("peer_index", "rows", (100, 10_000, 1_000_000), (100, 10_000, 1_000_000, 10_000_000),
+           lambda rng, n: (np.arange(n) % max(n // 5, 1), np.arange(n) // max(n // 5, 1), _indicators(rng, n)),
+           lambda args: PeerIndex(*args)),
+    Kernel("peer_queries", "entities", (100, 10_000, 1_000_000), (100, 10_000, 1_000_000, 10_000_000),
+           _peer_index, lambda index: [(index.rank(i, ALL_PERIODS), index.nearest(i, ALL_PERIODS)) for i in range(100)]),
+    Kernel("screening", "rows", (100, 10_000, 1_000_000), (100, 10_000, 1_000_000, 10_000_000),
+           _screening_panel, lambda df: screen_frame(df, "Bank", "Year")),
+    Kernel("allocation_proportional", "units", (10, 1000, 10_000), (10, 1000, 10_000, 1_000_000),
+           lambda rng, n: rng.random(n) * 10,
+           lambda g: allocate_capital(g, 1000.0, 0.3, method=METHOD_PROPORTIONAL)),
+    Kernel("allocation_min_duration", "units", (10, 1000, 10_000), (10, 1000, 10_000, 1_000_000),
+           lambda rng, n: rng.random(n) * 10,
+           lambda g: allocate_capital(g, 1000.0, 0.3, method=METHOD_MIN_DURATION)),
+    Kernel("sensitivity", "entities", (10, 1000), (10, 1000, 10_000),
+           _indicators, lambda X: weight_sensitivity(X, 500, seed=0)),
+    Kernel("heuristic_weights", "assets", (10, 1000, 10_000), (10, 1000, 10_000, 1_000_000),
+           _assets, lambda args: heuristic_weights(args[0], args[1], args[2])),
+    Kernel("frontier_closed_form", "assets", (10, 100, 1000), (10, 100, 1000, 10_000),
+           lambda rng, n: _assets(rng, n) + (np.identity(n) * DEFAULT_VARIANCE,),
+           lambda args: efficient_frontier(args[0], args[3], args[1], args[2], default_lambdas(200))),
+    Kernel("frontier_critical_line", "assets", (10, 100, 300), (10, 100, 300, 1000),
+           lambda rng, n: _assets(rng, n) + (_dense_covariance(rng, n),),
+           lambda args: efficient_frontier(args[0], args[3], args[1], args[2], default_lambdas(200))),
+    Kernel("covariance_ledoit_wolf", "assets", (10, 100, 1000), (10, 100, 1000, 10_000),
+           lambda rng, n: rng.normal(size=(250, n)) * 0.01,
+           lambda x: estimate_covariance(x, METHOD_LEDOIT_WOLF)),
+    Kernel("cvxpy_solve", "assets", (10, 100, 1000), (10, 100, 1000, 10_000),
+           _cvxpy_problem, lambda args: args[0].solve(args[1], args[2], args[3], cov=args[4])),
+]
+
+
+def measure(kernel, size, min_time=MIN_TIME, max_repeat=20, memory=True, seed=0):
+    """يقيس زمن نواة واحدة لحجم معين (أفضل تكرار والوسيط) وذروة الذاكرة في تشغيل منفصل عبر tracemalloc."""
+    data = kernel.setup(np.random.default_rng(seed), int(size))
+    # تشغيل تمهيدي خارج القياس: الاستيرادات المؤجلة (scipy، cvxpy) وبناء المسائل لا تُحسب في الزمن
+    kernel.run(data)
+    times = []
+    started = time.perf_counter()
+    while len(times) < max_repeat and (not times or time.perf_counter() - started < min_time):
+        t0 = time.perf_counter()
+        kernel.run(data)
+        times.append(time.perf_counter() - t0)
+
+    peak_mb = None
+    if memory:
+        # التتبع يبطئ التنفيذ، لذلك يُقاس في تشغيل مستقل لا يدخل في الزمن
+        tracemalloc.start()
+        try:
+            kernel.run(data)
+            peak_mb = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        finally:
+            tracemalloc.stop()
+
+    best = min(times)
+    return Measurement(kernel.name, int(size), kernel.unit, best, float(np.median(times)), len(times),
+                       size / best if best > 0 else float("inf"), peak_mb)
+
+
+def run_suite(kernels=None, profile="quick", sizes=None, memory=True, min_time=MIN_TIME, progress=None):
+    """يشغل الأنوية المختارة عبر الأحجام؛ النوى التي تنقصها مكتبة اختيارية (مثل cvxpy) تُتجاوز."""
+    selected = [k for k in KERNELS if kernels is None or k.name in kernels]
+    results, skipped = [], {}
+    for kernel in selected:
+        for size in (sizes or (kernel.full if profile == "full" else kernel.quick)):
+            try:
+                result = measure(kernel, size, min_time=min_time, memory=memory)
+            except ImportError as exc:
+                skipped[kernel.name] = str(exc)
+                break
+            results.append(result)
+            if progress:
+                progress(result)
+    return results, skipped
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def save_baseline(path, results):
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump({"environment": environment(), "results": [r._asdict() for r in results]}, fh, indent=2)
+
+
+def load_baseline(path):
+    with open(path, encoding="utf-8") as fh:
+        return {(r["kernel"], int(r["size"])): r for r in json.load(fh)["results"]}
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """نسبة الزمن الحالي إلى خط الأساس لكل (نواة، حجم) مشترك؛ regression إذا تجاوزت tolerance."""
+    rows = []
+    for r in results:
+        base = baseline.get((r.kernel, r.size))
+        if base is None:
+            continue
+        ratio = r.seconds / base["seconds"] if base["seconds"] > 0 else float("inf")
+        rows.append({"kernel": r.kernel, "size": r.size, "baseline_s": base["seconds"], "current_s": r.seconds,
+                     "ratio": ratio, "regression": ratio > tolerance})
+    return pd.DataFrame(rows, columns=["kernel", "size", "baseline_s", "current_s", "ratio", "regression"])
+
+
+def _format(result):
+    peak = "-" if result.peak_mb is None else f"{result.peak_mb:.1f} MB"
+    return (f"{result.kernel:<26} {result.size:>12,} {result.unit:<9} {result.seconds * 1e3:>11.3f} ms "
+            f"{result.throughput:>14,.0f}/s {peak:>13}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the governance engine kernels.")
+    parser.add_argument("--kernels", nargs="+", choices=[k.name for k in KERNELS], default=None)
+    parser.add_argument("--profile", choices=["quick", "full"], default="quick",
+                        help="full adds the largest sizes (up to 1e7 rows / 1e6 units)")
+    parser.add_argument("--sizes", type=float, nargs="+", default=None, help="override the sizes of every kernel")
+    parser.add_argument("--min-time", type=float, default=MIN_TIME)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak-memory run")
+    parser.add_argument("--save", help="write the results as a JSON baseline")
+    parser.add_argument("--baseline", help="compare against a JSON baseline; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    print(f"{'kernel':<26} {'size':>12} {'unit':<9} {'best':>14} {'throughput':>16} {'peak':>13}")
+    results, skipped = run_suite(
+        args.kernels, args.profile, sizes=[int(s) for s in args.sizes] if args.sizes else None,
+        memory=not args.no_memory, min_time=args.min_time, progress=lambda r: print(_format(r), flush=True),
+    )
+    for name, reason in skipped.items():
+        print(f"skipped {name}: {reason}")
+    if args.save:
+        save_baseline(args.save, results)
+        print(f"baseline written to {args.save}")
+    if args.baseline:
+        report = compare(results, load_baseline(args.baseline), args.tolerance)
+        print(report.to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+        regressions = report[report["regression"]]
+        if len(regressions):
+            print(f"{len(regressions)} regression(s) above {args.tolerance:.2f}x")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
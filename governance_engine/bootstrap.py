@@ -0,0 +1,164 @@
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .analysis import SCORE_COL, STRENGTH_LEVELS, STRENGTH_NONE
+
+DEFAULT_RESAMPLES = 1000
+DEFAULT_PERMUTATIONS = 1000
+DEFAULT_CONFIDENCE = 0.95
+# عدد عناصر مصفوفة الفهارس في الدفعة الواحدة (دفعة × صفوف)، لتبقى الذاكرة محدودة مع 100 ألف صف
+CHUNK_ELEMENTS = 2_000_000
+
+BootstrapResult = namedtuple(
+    "BootstrapResult",
+    ["n", "n_resamples", "n_permutations", "confidence", "table", "p_value", "corr_samples", "strength_probs",
+     "elapsed"],
+)
+
+
+def _batch_sizes(total, n):
+    per_chunk = max(1, CHUNK_ELEMENTS // max(n, 1))
+    return [min(per_chunk, total - start) for start in range(0, total, per_chunk)]
+
+
+def _pair_stats(xs, ys):
+    """الارتباط والميل لكل صف من مصفوفتي (عينات × صفوف)، من المجاميع مباشرة بتمريرة واحدة لكل مجموع."""
+    n = xs.shape[1]
+    sx, sy = xs.sum(axis=1), ys.sum(axis=1)
+    sxx = np.einsum("ij,ij->i", xs, xs) - sx * sx / n
+    syy = np.einsum("ij,ij->i", ys, ys) - sy * sy / n
+    sxy = np.einsum("ij,ij->i", xs, ys) - sx * sy / n
+    with np.errstate(invalid="ignore", divide="ignore"):
+        corr = np.where((sxx > 0) & (syy > 0), sxy / np.sqrt(sxx * syy), np.nan)
+        slope = np.where(sxx > 0, sxy / sxx, np.nan)
+    return corr, slope
+
+
+def _bootstrap_chunk(x, y, size, seed):
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(x), size=(size, len(x)), dtype=np.int32 if len(x) < 2 ** 31 else np.int64)
+    return _pair_stats(x[idx], y[idx])
+
+
+def _permutation_chunk(x, y, size, seed):
+    # مجاميع x و y ومربعاتها ثابتة تحت التبديل، فلا يتغير إلا Σxy ويُحسب بضرب مصفوفة في متجه
+    rng = np.random.default_rng(seed)
+    perms = rng.permuted(np.tile(np.arange(len(y), dtype=np.int32), (size, 1)), axis=1)
+    sxy = y[perms] @ x
+    return sxy / np.sqrt((x @ x) * (y @ y))
+
+
+def _run_chunks(func, x, y, sizes, seeds, workers, deadline=None):
+    """ينفذ الدفعات بالترتيب؛ عند تجاوز deadline تتوقف الدفعات المتبقية بعد اكتمال دفعة واحدة على الأقل."""
+    def expired(done):
+        return deadline is not None and done and time.perf_counter() > deadline
+
+    results = []
+    if workers <= 1 or len(sizes) <= 1:
+        for size, seed in zip(sizes, seeds):
+            if expired(results):
+                break
+            results.append(func(x, y, size, seed))
+        return results
+    with ProcessPoolExecutor(max_workers=min(workers, len(sizes))) as pool:
+        futures = [pool.submit(func, x, y, size, seed) for size, seed in zip(sizes, seeds)]
+        for future in futures:
+            if expired(results):
+                for pending in futures:
+                    pending.cancel()
+                break
+            results.append(future.result())
+    return results
+
+
+def strength_distribution(corr_samples):
+    """نسبة العينات التي تقع في كل مستوى من مستويات قوة العلاقة (على القيمة المطلقة)."""
+    values = np.abs(np.asarray(corr_samples, dtype=np.float64))
+    values = values[np.isfinite(values)]
+    labels = [label for _, label in STRENGTH_LEVELS] + [STRENGTH_NONE]
+    if len(values) == 0:
+        return dict.fromkeys(labels, np.nan)
+    thresholds = np.array([t for t, _ in STRENGTH_LEVELS])
+    # المستويات مرتبة تنازليًا: عدد الحدود التي لم تبلغها القيمة يعطي ترتيب المستوى
+    level = (values[:, None] < thresholds[None, :]).sum(axis=1)
+    counts = np.bincount(level, minlength=len(labels))
+    return dict(zip(labels, counts / len(values)))
+
+
+def bootstrap_pair(df_clean, metric, score_col=SCORE_COL, n_resamples=DEFAULT_RESAMPLES,
+                   n_permutations=DEFAULT_PERMUTATIONS, confidence=DEFAULT_CONFIDENCE, seed=None, workers=1,
+                   time_budget=None):
+    """فترات ثقة Bootstrap لمعامل الارتباط والميل و R²، وقيمة احتمالية باختبار التبديل.
+
+    كل دفعة من العينات تُسحب كمصفوفة فهارس (عينات × صفوف) وتُحسب إحصاءاتها معًا بدل ملاءمة
+    نموذج لكل عينة. الدفعات مستقلة ببذور مشتقة من seed، فالنتيجة لا تتغير بعدد العمليات
+    workers (1 = تنفيذ تسلسلي، None = كل الأنوية). time_budget بالثواني يوقف الدفعات المتبقية
+    عند انتهاء الوقت (نصفه للـ Bootstrap ونصفه للتبديل)، ويعيد العدد الفعلي المنفذ من العينات.
+    """
+    started = time.perf_counter()
+    x = pd.to_numeric(df_clean[score_col], errors="coerce").to_numpy(dtype=np.float64)
+    y = pd.to_numeric(df_clean[metric], errors="coerce").to_numpy(dtype=np.float64)
+    valid = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[valid], y[valid]
+    n = len(x)
+    if n < 3:
+        raise ValueError("need at least three complete rows")
+    if not 0 < confidence < 1:
+        raise ValueError("confidence must be between 0 and 1")
+    # التوسيط المسبق يحفظ دقة المجاميع ولا يغير الارتباط أو الميل
+    x = x - x.mean()
+    y = y - y.mean()
+    workers = os.cpu_count() if workers is None else int(workers)
+
+    corr, slope = _pair_stats(x[None, :], y[None, :])
+    corr, slope = float(corr[0]), float(slope[0])
+
+    seq = np.random.SeedSequence(seed)
+    boot_seq, perm_seq = seq.spawn(2)
+    boot_sizes = _batch_sizes(int(n_resamples), n)
+    boot_deadline = None if time_budget is None else started + time_budget / 2
+    boot = _run_chunks(_bootstrap_chunk, x, y, boot_sizes, boot_seq.spawn(len(boot_sizes)), workers, boot_deadline)
+    boot_corr = np.concatenate([b[0] for b in boot]) if boot else np.empty(0)
+    boot_slope = np.concatenate([b[1] for b in boot]) if boot else np.empty(0)
+
+    p_value = np.nan
+    perm_corr = np.empty(0)
+    if n_permutations and np.isfinite(corr):
+        perm_sizes = _batch_sizes(int(n_permutations), n)
+        perm_corr = np.concatenate(
+            _run_chunks(_permutation_chunk, x, y, perm_sizes, perm_seq.spawn(len(perm_sizes)), workers,
+                        None if time_budget is None else started + time_budget))
+        p_value = float((1 + (np.abs(perm_corr) >= abs(corr) - 1e-12).sum()) / (len(perm_corr) + 1))
+
+    alpha = (1 - confidence) / 2
+    rows = []
+    for name, estimate, samples in (("corr", corr, boot_corr), ("slope", slope, boot_slope),
+                                    ("r2", corr ** 2, boot_corr ** 2)):
+        finite = samples[np.isfinite(samples)]
+        low, high = np.quantile(finite, [alpha, 1 - alpha]) if len(finite) else (np.nan, np.nan)
+        rows.append({
+            "statistic": name,
+            "estimate": estimate,
+            "std_err": finite.std(ddof=1) if len(finite) > 1 else np.nan,
+            "ci_low": low,
+            "ci_high": high,
+            # الارتباط والميل و R² في الانحدار البسيط تشترك في فرضية العدم نفسها
+            "p_value": p_value,
+        })
+
+    return BootstrapResult(
+        n=n,
+        n_resamples=len(boot_corr),
+        n_permutations=len(perm_corr),
+        confidence=confidence,
+        table=pd.DataFrame(rows),
+        p_value=p_value,
+        corr_samples=boot_corr,
+        strength_probs=strength_distribution(boot_corr),
+        elapsed=time.perf_counter() - started,
+    )
@@ -0,0 +1,373 @@
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "GOVERNANCE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "governance_cache")
+)
+DEFAULT_CACHE_MAX_BYTES = int(os.environ.get("GOVERNANCE_CACHE_MAX_MB", "1024")) * 1024 * 1024
+# حد حجم النتائج المشتقة المحفوظة في الذاكرة (مشتركة بين كل الجلسات)
+DEFAULT_RESULT_MAX_BYTES = int(os.environ.get("GOVERNANCE_RESULT_CACHE_MAX_MB", "512")) * 1024 * 1024
+# مدة بقاء مجموعة بيانات مشتركة في الذاكرة بعد أن تتوقف كل الجلسات عن استخدامها
+DEFAULT_IDLE_SECONDS = float(os.environ.get("GOVERNANCE_SHARED_IDLE_SECONDS", "600"))
+
+SharedStats = namedtuple("SharedStats", ["datasets", "memory_bytes", "sessions", "files", "disk_bytes"])
+
+
+def content_hash(data):
+    """بصمة محتوى الملف المرفوع (تتغير فقط إذا تغيرت البيانات)."""
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def make_key(*parts):
+    return hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=20).hexdigest()
+
+
+def nbytes(value, depth=3):
+    """تقدير حجم قيمة محفوظة: الجداول والمصفوفات بحجم بياناتها، والحاويات والكائنات بمجموع محتوياتها.
+
+    لا يتبع الكائنات أعمق من depth مستويات، وما بعدها يُقدّر بـ sys.getsizeof.
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage())
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (str, bytes, bytearray, memoryview)) or depth <= 0:
+        return sys.getsizeof(value)
+    if isinstance(value, dict):
+        return sum(nbytes(k, depth - 1) + nbytes(v, depth - 1) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(nbytes(v, depth - 1) for v in value)
+    if hasattr(value, "__dict__"):
+        return sys.getsizeof(value) + sum(nbytes(v, depth - 1) for v in vars(value).values())
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """ذاكرة مؤقتة في الذاكرة للنتائج المشتقة مع حد أقصى لعدد العناصر ولحجمها الكلي بالبايت.
+
+    يُقدّر حجم كل عنصر بـ nbytes عند حفظه، ويُخلى الأقدم استخدامًا حتى يعود المجموع تحت max_bytes؛
+    والعنصر الأكبر من max_bytes وحده يُعاد دون حفظ. max_bytes=None يلغي حد الحجم.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=DEFAULT_RESULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data = OrderedDict()
+        self._sizes = {}
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        size = nbytes(value) if self.max_bytes is not None else 0
+        with self._lock:
+            self._pop(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return value
+            self._data[key] = value
+            self._sizes[key] = size
+            self.total_bytes += size
+            while len(self._data) > self.max_entries or (self.max_bytes is not None
+                                                         and self.total_bytes > self.max_bytes):
+                self._pop(next(iter(self._data)))
+        return value
+
+    def _pop(self, key):
+        if key in self._data:
+            del self._data[key]
+            self.total_bytes -= self._sizes.pop(key)
+
+    def get_or_compute(self, key, func, *args, **kwargs):
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = self.put(key, func(*args, **kwargs))
+        return value
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.total_bytes = 0
+
+
+class FrameCache:
+    """يحفظ الجداول المقروءة بصيغة Parquet على القرص مع إخلاء LRU حسب الحجم."""
+
+    SUFFIX = ".parquet"
+    # كل get يعيد جدولًا جديدًا مقروءًا من القرص، لا نسخة مشتركة بين الجلسات
+    shared = False
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # بصمة -> حدث ينتهي بانتهاء كتابتها: جلسات تكتب نفس المحتوى معًا تنتظر الكاتب الأول
+        self._writing = {}
+        os.makedirs(directory, exist_ok=True)
+        # استرجاع الملفات الموجودة من تشغيل سابق بترتيب آخر استخدام
+        existing = []
+        for fname in os.listdir(directory):
+            if fname.endswith(self.SUFFIX):
+                path = os.path.join(directory, fname)
+                stat = os.stat(path)
+                existing.append((stat.st_mtime, fname[: -len(self.SUFFIX)], stat.st_size))
+        for _, key, size in sorted(existing):
+            self._entries[key] = size
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}{self.SUFFIX}")
+
+    def _read(self, path):
+        return pd.read_parquet(path, memory_map=True)
+
+    def _write(self, df, path):
+        df.to_parquet(path, index=False)
+
+    @property
+    def total_bytes(self):
+        return sum(self._entries.values())
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            path = self._path(key)
+            try:
+                df = self._read(path)
+            except (OSError, ValueError):
+                self._entries.pop(key, None)
+                return None
+            os.utime(path)
+            self._entries.move_to_end(key)
+            return df
+
+    def put(self, key, df):
+        with self._lock:
+            # نفس البصمة تعني نفس المحتوى: الجلسة الثانية لا تعيد كتابة الملف
+            if key in self._entries and os.path.exists(self._path(key)):
+                return True
+            pending = self._writing.get(key)
+            if pending is None:
+                self._writing[key] = threading.Event()
+        if pending is not None:
+            pending.wait()
+            return key in self._entries
+
+        path = self._path(key)
+        # اسم مؤقت فريد لكل كتابة: الجلسات خيوط في عملية واحدة، فلا يكفي رقم العملية
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{key}.", suffix=".tmp", dir=self.directory)
+        os.close(fd)
+        try:
+            try:
+                self._write(df, tmp_path)
+            except (ValueError, TypeError, ImportError, OSError):
+                # أعمدة غير قابلة للتحويل إلى Arrow: نتجاوز الحفظ بدل إفشال التحليل
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                return False
+            os.replace(tmp_path, path)
+            with self._lock:
+                self._entries[key] = os.path.getsize(path)
+                self._entries.move_to_end(key)
+                self._evict()
+            return True
+        finally:
+            with self._lock:
+                self._writing.pop(key).set()
+
+    def _evictable(self, key):
+        return True
+
+    def _evict(self):
+        for key in list(self._entries):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if not self._evictable(key):
+                continue
+            del self._entries[key]
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SharedFrameCache(FrameCache):
+    """جداول مشتركة بين كل جلسات عملية الخادم: جدول pandas واحد لكل محتوى مهما كان عدد المستخدمين.
+
+    يُحفظ الجدول على القرص بصيغة Arrow IPC غير مضغوطة ويُقرأ مرة واحدة في العملية. الأعمدة الرقمية بلا قيم
+    ناقصة تبقى عروضًا فوق الملف المفتوح بـ memory-map، أما الأعمدة النصية والرقمية ذات القيم الناقصة فتُنسخ
+    مرة واحدة إلى ذاكرة العملية عند التحويل إلى pandas. المشاركة إذن داخل العملية الواحدة لا بين عمليات
+    الخادم. كل get يعيد نسخة سطحية من الجدول نفسه؛ ومع Copy-on-Write في pandas تنسخ الجلسة العمود الذي
+    تعدّله فقط دون أن يتأثر غيرها.
+
+    كل جلسة (holder) تسجل المجموعات التي تستخدمها، وعند sweep تُحذف الجلسات المنتهية وتُغلق من الذاكرة
+    المجموعات التي لا تستخدمها أي جلسة منذ idle_seconds، وتبقى ملفاتها على القرص لإعادة فتحها بسرعة.
+    لا يُحذف من القرص ملف مجموعة مفتوحة أو مستخدمة عند تجاوز max_bytes.
+    """
+
+    SUFFIX = ".arrow"
+    shared = True
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MAX_BYTES,
+                 idle_seconds=DEFAULT_IDLE_SECONDS):
+        super().__init__(directory, max_bytes)
+        self.idle_seconds = idle_seconds
+        self._mapped = {}
+        self._last_used = {}
+        self._holders = {}
+
+    def _read(self, path):
+        import pyarrow as pa
+
+        table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        # split_blocks يبقي الأعمدة الرقمية بلا قيم ناقصة فوق ذاكرة الملف بدل تجميعها في كتلة جديدة
+        frame = table.to_pandas(split_blocks=True)
+        return frame, nbytes(frame)
+
+    def _write(self, df, path):
+        import pyarrow as pa
+
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+    def _evictable(self, key):
+        return key not in self._mapped
+
+    def get(self, key, holder=None):
+        with self._lock:
+            if key not in self._mapped:
+                if key not in self._entries:
+                    return None
+                path = self._path(key)
+                try:
+                    self._mapped[key] = self._read(path)
+                except (OSError, ValueError):
+                    self._entries.pop(key, None)
+                    return None
+                os.utime(path)
+            self._entries.move_to_end(key)
+            self._last_used[key] = time.monotonic()
+            if holder is not None:
+                self._holders.setdefault(holder, set()).add(key)
+            return self._mapped[key][0].copy(deep=False)
+
+    def session(self, holder):
+        return SessionFrames(self, holder)
+
+    def release(self, holder, keep=()):
+        """تبقى للجلسة المجموعات في keep فقط (كلها تُترك إذا كانت keep فارغة)."""
+        with self._lock:
+            kept = self._holders.pop(holder, set()) & set(keep)
+            if kept:
+                self._holders[holder] = kept
+
+    def refcount(self, key):
+        with self._lock:
+            return sum(key in keys for keys in self._holders.values())
+
+    def sweep(self, is_active=None):
+        """يحذف الجلسات التي لم تعد نشطة حسب is_active(holder) ويغلق المجموعات الخاملة، ويعيد عدد ما أُغلق."""
+        now = time.monotonic()
+        with self._lock:
+            if is_active is not None:
+                for holder in [h for h in self._holders if not is_active(h)]:
+                    del self._holders[holder]
+            held = set().union(*self._holders.values())
+            idle = [key for key in self._mapped
+                    if key not in held and now - self._last_used.get(key, 0.0) >= self.idle_seconds]
+            for key in idle:
+                del self._mapped[key]
+                self._last_used.pop(key, None)
+            self._evict()
+        return len(idle)
+
+    def stats(self):
+        with self._lock:
+            return SharedStats(len(self._mapped), sum(nbytes for _, nbytes in self._mapped.values()),
+                               len(self._holders), len(self._entries), self.total_bytes)
+
+
+class SessionFrames:
+    """واجهة get/put لجلسة واحدة فوق SharedFrameCache، تسجل المجموعات التي استخدمها التشغيل الحالي.
+
+    close في نهاية التشغيل يترك ما لم يُستخدم فيه، فيتبع عدد المراجع ما تعرضه كل جلسة فعلًا.
+    """
+
+    shared = True
+
+    def __init__(self, cache, holder):
+        self.cache = cache
+        self.holder = holder
+        self.touched = set()
+
+    def get(self, key):
+        self.touched.add(key)
+        return self.cache.get(key, self.holder)
+
+    def put(self, key, df):
+        return self.cache.put(key, df)
+
+    def __contains__(self, key):
+        return key in self.cache
+
+    def close(self):
+        self.cache.release(self.holder, self.touched)
+
+
+def reload_upload(key, frame_cache):
+    """(البصمة، الجدول) لمحتوى قرأته read_upload سابقًا، دون الملف نفسه؛ None إذا أُخلي من الذاكرة."""
+    df = frame_cache.get(key) if frame_cache is not None else None
+    return None if df is None else (key, df)
+
+
+def read_upload(data, name, frame_cache=None):
+    """يعيد (البصمة، الجدول) ويتجنب إعادة قراءة نفس الملف إذا كان محفوظًا."""
+    key = content_hash(data)
+    cached = reload_upload(key, frame_cache)
+    if cached is not None:
+        return cached
+    # ingest يستورد content_hash من هذه الوحدة، فالاستيراد هنا لا في رأس الملف
+    from .ingest import parse_table
+
+    df = parse_table(data, name)
+    if frame_cache is not None and frame_cache.put(key, df) and frame_cache.shared:
+        # الجلسة التي رفعت الملف أولًا تستخدم النسخة المشتركة أيضًا بدل نسختها الخاصة
+        shared = frame_cache.get(key)
+        if shared is not None:
+            df = shared
+    return key, df
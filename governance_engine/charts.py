@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+# أقصى عدد نقاط يُرسل إلى المتصفح في رسم واحد، مهما كبر حجم البيانات
+MAX_CHART_POINTS = 5000
+DENSITY_BINS = 80
+
+METHOD_RANDOM = "random"
+METHOD_LTTB = "lttb"
+METHOD_DENSITY = "density"
+
+
+def histogram_frame(values, bins=40, value_range=None, name="value"):
+    """مدرج تكراري محسوب مسبقًا: جدول (مركز المجال، العدد) بحجم ثابت بدل إرسال كل القيم إلى px.histogram."""
+    values = np.asarray(values, dtype=np.float64).ravel()
+    values = values[np.isfinite(values)]
+    if value_range is None:
+        value_range = (values.min(), values.max()) if values.size else (0.0, 1.0)
+        if value_range[0] == value_range[1]:
+            value_range = (value_range[0] - 0.5, value_range[1] + 0.5)
+    counts, edges = np.histogram(values, bins=bins, range=value_range)
+    return pd.DataFrame({name: (edges[:-1] + edges[1:]) / 2, "count": counts})
+
+
+def random_indices(n, max_points=MAX_CHART_POINTS, seed=0):
+    if n <= max_points:
+        return np.arange(n)
+    return np.sort(np.random.default_rng(seed).choice(n, size=max_points, replace=False))
+
+
+def lttb_indices(x, y, max_points=MAX_CHART_POINTS):
+    """Largest-Triangle-Three-Buckets: يختار من كل مجموعة متتالية النقطة التي تحفظ شكل المنحنى.
+
+    x يجب أن تكون مرتبة تصاعديًا. تُحفظ أول نقطة وآخر نقطة دائمًا.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n <= max_points or max_points < 3:
+        return np.arange(n)
+    # حدود المجموعات بين النقطة الأولى والأخيرة
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    # متوسطات كل مجموعة مسبقًا من المجاميع التراكمية
+    cx = np.concatenate([[0.0], np.cumsum(x)])
+    cy = np.concatenate([[0.0], np.cumsum(y)])
+    sizes = np.maximum(edges[1:] - edges[:-1], 1)
+    mean_x = (cx[edges[1:]] - cx[edges[:-1]]) / sizes
+    mean_y = (cy[edges[1:]] - cy[edges[:-1]]) / sizes
+    mean_x = np.append(mean_x, x[-1])
+    mean_y = np.append(mean_y, y[-1])
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    prev = 0
+    for b in range(max_points - 2):
+        lo, hi = edges[b], max(edges[b + 1], edges[b] + 1)
+        ax, ay = x[prev], y[prev]
+        area = np.abs((ax - mean_x[b + 1]) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (mean_y[b + 1] - ay))
+        prev = lo + int(np.argmax(area))
+        selected[b + 1] = prev
+    return selected
+
+
+def downsample(df, x, y, max_points=MAX_CHART_POINTS, method=METHOD_RANDOM, seed=0):
+    """يعيد جدولًا بعدد نقاط لا يتجاوز max_points للرسم: عينة عشوائية أو LTTB بعد الترتيب حسب x."""
+    if len(df) <= max_points:
+        return df
+    if method == METHOD_LTTB:
+        ordered = df.sort_values(x, kind="stable")
+        return ordered.iloc[lttb_indices(ordered[x].to_numpy(), ordered[y].to_numpy(), max_points)]
+    if method == METHOD_RANDOM:
+        return df.iloc[random_indices(len(df), max_points, seed)]
+    raise ValueError(f"unknown downsampling method {method!r}")
+
+
+def density_frame(x, y, bins=DENSITY_BINS):
+    """شبكة كثافة ثنائية (مراكز الخلايا غير الفارغة وعددها) بدل رسم كل النقاط."""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.isfinite(x) & np.isfinite(y)
+    counts, x_edges, y_edges = np.histogram2d(x[valid], y[valid], bins=bins)
+    xi, yi = np.nonzero(counts)
+    return pd.DataFrame({
+        "x": (x_edges[xi] + x_edges[xi + 1]) / 2,
+        "y": (y_edges[yi] + y_edges[yi + 1]) / 2,
+        "count": counts[xi, yi].astype(np.int64),
+    })
@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+
+METHOD_SAMPLE = "sample"
+METHOD_LEDOIT_WOLF = "ledoit_wolf"
+METHOD_EWMA = "ewma"
+METHODS = (METHOD_SAMPLE, METHOD_LEDOIT_WOLF, METHOD_EWMA)
+
+# معامل التناقص المعتمد في RiskMetrics للبيانات اليومية
+DEFAULT_EWMA_DECAY = 0.94
+PSD_EPS = 1e-10
+
+
+def returns_matrix(data):
+    """مصفوفة (فترات × أصول) من الأعمدة الرقمية فقط، بعد حذف الفترات الناقصة."""
+    if isinstance(data, pd.DataFrame):
+        numeric = data.apply(pd.to_numeric, errors="coerce").dropna(axis=1, how="all")
+        return numeric.dropna().to_numpy(dtype=np.float64), list(numeric.columns)
+    values = np.asarray(data, dtype=np.float64)
+    if values.ndim != 2:
+        raise ValueError("returns must be a 2-D (periods x assets) array")
+    values = values[~np.isnan(values).any(axis=1)]
+    return values, list(range(values.shape[1]))
+
+
+def nearest_psd(cov, eps=PSD_EPS):
+    """أقرب مصفوفة متماثلة شبه موجبة بقص القيم الذاتية، حتى لا يفشل cp.quad_form."""
+    cov = np.asarray(cov, dtype=np.float64)
+    cov = (cov + cov.T) / 2
+    vals, vecs = np.linalg.eigh(cov)
+    if vals.min() >= eps:
+        return cov
+    fixed = (vecs * np.clip(vals, eps, None)) @ vecs.T
+    return (fixed + fixed.T) / 2
+
+
+class IncrementalCovariance:
+    """يحدّث مقدرات التغاير (العينة، Ledoit-Wolf، EWMA) عند وصول فترات جديدة دون إعادة المرور على السجل.
+
+    تُحفظ المجاميع الخام حتى العزم الرابع المشترك، فتُحسب مقدرات العينة وLedoit-Wolf بدقة
+    كما لو حُسبت على كل البيانات دفعة واحدة. ذاكرة الحالة O(n²).
+    """
+
+    def __init__(self, n_assets, decay=DEFAULT_EWMA_DECAY):
+        n = int(n_assets)
+        self.n = n
+        self.decay = float(decay)
+        self.count = 0
+        self._s = np.zeros(n)              # Σ x
+        self._d = np.zeros(n)              # Σ x²
+        self._c = np.zeros((n, n))         # Σ xᵢ xⱼ
+        self._b = np.zeros((n, n))         # Σ xᵢ² xⱼ
+        self._a = np.zeros((n, n))         # Σ xᵢ² xⱼ²
+        self._ew_w = 0.0
+        self._ew_x = np.zeros(n)
+        self._ew_xx = np.zeros((n, n))
+
+    def update(self, returns):
+        x, _ = returns_matrix(returns)
+        if x.shape[1] != self.n:
+            raise ValueError(f"expected {self.n} assets, got {x.shape[1]}")
+        t = x.shape[0]
+        if t == 0:
+            return self
+        sq = x * x
+        self.count += t
+        self._s += x.sum(axis=0)
+        self._d += sq.sum(axis=0)
+        self._c += x.T @ x
+        self._b += sq.T @ x
+        self._a += sq.T @ sq
+
+        # EWMA: أوزان متناقصة أسيًا للفترات الجديدة، والحالة السابقة تتناقص بـ decay^t
+        w = self.decay ** np.arange(t - 1, -1, -1)
+        shrink = self.decay ** t
+        self._ew_w = shrink * self._ew_w + w.sum()
+        self._ew_x = shrink * self._ew_x + w @ x
+        self._ew_xx = shrink * self._ew_xx + (x * w[:, None]).T @ x
+        return self
+
+    @property
+    def mean(self):
+        return self._s / self.count
+
+    def _centered_moment(self):
+        # Σₜ (xₜ - m)(xₜ - m)ᵀ
+        m = self.mean
+        return self._c - self.count * np.outer(m, m)
+
+    def sample(self, psd=True):
+        if self.count < 2:
+            raise ValueError("need at least two periods")
+        cov = self._centered_moment() / (self.count - 1)
+        return nearest_psd(cov) if psd else cov
+
+    def ledoit_wolf(self, psd=True):
+        """انكماش Ledoit-Wolf (2004) نحو مصفوفة هوية مقيّسة؛ يعيد (التغاير، شدة الانكماش)."""
+        if self.count < 2:
+            raise ValueError("need at least two periods")
+        t, n = self.count, self.n
+        m = self.mean
+        s = self._centered_moment() / t
+        mu = np.trace(s) / n
+        target = mu * np.eye(n)
+        delta = ((s - target) ** 2).sum() / n
+
+        # Σₜ (xₜᵢ - mᵢ)² (xₜⱼ - mⱼ)² من المجاميع الخام
+        p, q = m[:, None], m[None, :]
+        fourth = (
+            self._a
+            - 2 * q * self._b
+            - 2 * p * self._b.T
+            + (q ** 2) * self._d[:, None]
+            + (p ** 2) * self._d[None, :]
+            + 4 * p * q * self._c
+            - 2 * p * q ** 2 * self._s[:, None]
+            - 2 * p ** 2 * q * self._s[None, :]
+            + t * p ** 2 * q ** 2
+        )
+        beta_bar = max((fourth / t - s ** 2).sum() / (n * t), 0.0)
+        beta = min(beta_bar, delta)
+        shrinkage = beta / delta if delta > 0 else 0.0
+        cov = shrinkage * target + (1 - shrinkage) * s
+        return (nearest_psd(cov) if psd else cov), shrinkage
+
+    def ewma(self, psd=True):
+        if self._ew_w <= 0:
+            raise ValueError("need at least one period")
+        mean = self._ew_x / self._ew_w
+        cov = self._ew_xx / self._ew_w - np.outer(mean, mean)
+        return nearest_psd(cov) if psd else cov
+
+    def estimate(self, method=METHOD_LEDOIT_WOLF):
+        if method == METHOD_SAMPLE:
+            return self.sample()
+        if method == METHOD_LEDOIT_WOLF:
+            return self.ledoit_wolf()[0]
+        if method == METHOD_EWMA:
+            return self.ewma()
+        raise ValueError(f"unknown covariance method {method!r}; expected one of {METHODS}")
+
+
+def estimate_covariance(returns, method=METHOD_LEDOIT_WOLF, decay=DEFAULT_EWMA_DECAY):
+    """يعيد (مصفوفة التغاير، أسماء الأصول) من سجل العوائد."""
+    x, names = returns_matrix(returns)
+    inc = IncrementalCovariance(x.shape[1], decay=decay).update(x)
+    return inc.estimate(method), names
@@ -0,0 +1,241 @@
+from collections import namedtuple
+
+import numpy as np
+
+from .portfolio import PortfolioProblem, covariance_structure
+
+DEFAULT_RISK_FREE_RATE = 0.02
+_BISECTION_STEPS = 100
+# تسامح شروط KKT (نسبةً إلى مقياس التدرج) عند التحقق من مسار الخط الحرج
+_KKT_TOL = 1e-7
+
+Frontier = namedtuple(
+    "Frontier", ["lambdas", "weights", "returns", "risks", "sharpe", "max_sharpe", "method"]
+)
+
+
+def default_lambdas(points=200, low=1e-3, high=1e3):
+    return np.geomspace(low, high, int(points))
+
+
+def _check_bounds(lower, upper):
+    if lower.sum() > 1 + 1e-9 or upper.sum() < 1 - 1e-9 or np.any(lower > upper):
+        raise ValueError("infeasible bounds: need sum(lower) <= 1 <= sum(upper) and lower <= upper")
+
+
+def diagonal_frontier_weights(returns, variances, lower, upper, lambdas):
+    """حل مغلق لكل قيم λ دفعة واحدة عندما يكون التغاير قطريًا.
+
+    شروط KKT تعطي wᵢ = clip((rᵢ - ν) / (2λσᵢ²), الحد الأدنى، الحد الأقصى)، ويُحدد ν
+    بالتنصيف بحيث Σw = 1، مع تنفيذ التنصيف لكل قيم λ معًا كمصفوفة (λ × أصول).
+    """
+    r = np.asarray(returns, dtype=np.float64)
+    v = np.asarray(variances, dtype=np.float64)
+    lo = np.asarray(lower, dtype=np.float64)
+    hi = np.asarray(upper, dtype=np.float64)
+    lam = np.asarray(lambdas, dtype=np.float64)
+    if np.any(v <= 0):
+        raise ValueError("the closed-form frontier needs strictly positive variances")
+    if np.any(lam <= 0):
+        raise ValueError("lambdas must be positive")
+    _check_bounds(lo, hi)
+
+    scale = 2 * lam[:, None] * v[None, :]
+    # عند ν_low كل الأوزان عند حدها الأقصى، وعند ν_high كلها عند حدها الأدنى
+    nu_low = (r[None, :] - scale * hi[None, :]).min(axis=1)
+    nu_high = (r[None, :] - scale * lo[None, :]).max(axis=1)
+    for _ in range(_BISECTION_STEPS):
+        nu = (nu_low + nu_high) / 2
+        total = np.clip((r[None, :] - nu[:, None]) / scale, lo, hi).sum(axis=1)
+        too_much = total > 1
+        nu_low = np.where(too_much, nu, nu_low)
+        nu_high = np.where(too_much, nu_high, nu)
+    nu = (nu_low + nu_high) / 2
+    return np.clip((r[None, :] - nu[:, None]) / scale, lo, hi)
+
+
+def _corner(r, lo, hi):
+    """حل λ → 0 (أعلى عائد): كل أصل عند حده الأدنى، ثم يُملأ الباقي بترتيب العائد حتى الحد الأقصى."""
+    w = lo.copy()
+    room = 1.0 - lo.sum()
+    free = np.zeros(len(r), dtype=bool)
+    for k in np.argsort(-r, kind="stable"):
+        if room <= 0:
+            break
+        add = min(hi[k] - lo[k], room)
+        w[k] += add
+        room -= add
+        free[k] = 0 < add < hi[k] - lo[k]
+    return w, free
+
+
+def _critical_line(r, cov, lo, hi, t_min):
+    """مقاطع مسار الحل w(t) = t·A + B للمعامل t = 1/(2λ)، من t = ∞ نزولًا حتى t_min.
+
+    مع مجموعة أصول حرة F ثابتة، شروط KKT نظام خطي في t:
+    Σ_FF w_F + ν = t r_F - Σ_FB w_B و Σ w = 1، فالأوزان خطية في t داخل المقطع. ينتهي المقطع عند
+    أكبر t يصل فيه وزن حر إلى حده، أو يغيّر فيه تدرج أصل مقيد إشارته فيتحرر. يعيد قائمة
+    (t_low، t_high، A، B)، ويرمي ValueError عند مصفوفة شاذة أو مسار لا ينتهي.
+    """
+    n = len(r)
+    w, free = _corner(r, lo, hi)
+    movable = hi > lo
+    segments = []
+    t_cur = np.inf
+    for _ in range(4 * n + 8):
+        F = np.flatnonzero(free)
+        A = np.zeros(n)
+        B = w.copy()
+        if len(F) == 0:
+            # رأس: الأوزان ثابتة حتى يتساوى تدرجا أصل عند حده الأقصى وآخر عند حده الأدنى فيتحرران معًا
+            c = cov @ w
+            upper = np.flatnonzero(movable & (w >= hi))
+            lower = np.flatnonzero(movable & (w <= lo))
+            dr = r[upper][:, None] - r[lower][None, :]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                cross = np.where(dr > 0, (c[upper][:, None] - c[lower][None, :]) / dr, -np.inf)
+            cross[cross >= t_cur] = -np.inf
+            t_next = max(float(cross.max()) if cross.size else -np.inf, 0.0)
+            segments.append((t_next, t_cur, A, B))
+            if t_next <= t_min:
+                break
+            u, l = np.unravel_index(np.argmax(cross), cross.shape)
+            free[[upper[u], lower[l]]] = True
+            t_cur = t_next
+            continue
+
+        bound = np.flatnonzero(~free)
+        k = len(F)
+        K = np.zeros((k + 1, k + 1))
+        K[:k, :k] = cov[np.ix_(F, F)]
+        K[:k, k] = K[k, :k] = 1.0
+        rhs = np.zeros((k + 1, 2))
+        rhs[:k, 0] = r[F]
+        rhs[:k, 1] = -cov[np.ix_(F, bound)] @ w[bound]
+        rhs[k, 1] = 1.0 - w[bound].sum()
+        try:
+            sol = np.linalg.solve(K, rhs)
+        except np.linalg.LinAlgError as exc:
+            raise ValueError("singular covariance block on the critical line") from exc
+        A[F], B[F] = sol[:k, 0], sol[:k, 1]
+        # تدرج الأصول المقيدة g(t) = t·gA + gB: سالب عند الحد الأدنى وموجب عند الأقصى ما دام المقطع صالحًا
+        gA = r - sol[k, 0] - cov @ A
+        gB = -sol[k, 1] - cov @ B
+
+        events = np.full(n, -np.inf)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            hit = np.where(A[F] > 0, (lo[F] - B[F]) / A[F], np.where(A[F] < 0, (hi[F] - B[F]) / A[F], -np.inf))
+            at_lower = bound[(w[bound] <= lo[bound]) & movable[bound] & (gA[bound] < 0)]
+            at_upper = bound[(w[bound] >= hi[bound]) & movable[bound] & (gA[bound] > 0)]
+            enter = np.concatenate([at_lower, at_upper])
+            events[enter] = -gB[enter] / gA[enter]
+        events[F] = hit
+        events[events >= t_cur] = -np.inf
+        t_next = max(float(events.max()), 0.0)
+        segments.append((t_next, t_cur, A, B))
+        if t_next <= t_min:
+            break
+        w = np.clip(t_next * A + B, lo, hi)
+        # كل الأحداث عند t_next نفسها (تقريبًا) تُطبق معًا
+        now = np.flatnonzero(events >= t_next - 1e-12 * max(1.0, t_next))
+        leaving = now[free[now]]
+        w[leaving] = np.where(A[leaving] > 0, lo[leaving], hi[leaving])
+        free[now] = ~free[now]
+        t_cur = t_next
+    else:
+        raise ValueError("critical line did not converge")
+    return segments
+
+
+def _kkt_ok(r, cov, lo, hi, t, weights):
+    """شروط KKT لكل صف: مجموع 1، ضمن الحدود، وتدرج t·r - Σw أكبر عند الأصول غير المقيدة من الأدنى."""
+    scale = t[:, None] * np.abs(r).max() + np.abs(cov).max() + 1.0
+    tol = _KKT_TOL * scale
+    if np.any(np.abs(weights.sum(axis=1) - 1) > 1e-7) or np.any(weights < lo - 1e-9) or np.any(weights > hi + 1e-9):
+        return False
+    G = t[:, None] * r[None, :] - weights @ cov
+    below_upper = weights < hi - 1e-9
+    above_lower = weights > lo + 1e-9
+    # ν بين أكبر تدرج للأصول غير المقيدة بالحد الأقصى وأصغر تدرج للأصول غير المقيدة بالحد الأدنى
+    nu_low = np.where(below_upper, G, -np.inf).max(axis=1)
+    nu_high = np.where(above_lower, G, np.inf).min(axis=1)
+    return bool(np.all(nu_low <= nu_high + tol[:, 0]))
+
+
+def parametric_frontier_weights(returns, cov, lower, upper, lambdas):
+    """الحد الكفء لتغاير كثيف بخوارزمية الخط الحرج: الأوزان خطية مجزأة في 1/λ.
+
+    تُحل المسألة عند نقاط الانكسار فقط (عددها من رتبة عدد الأصول، كل منها نظام خطي بحجم الأصول الحرة)،
+    وتُحسب أوزان كل قيم λ بالاستيفاء الخطي داخل مقطعها؛ فكلفة المسح لا تتبع عدد قيم λ. يرمي ValueError
+    عند حالة متدهورة (عوائد متساوية عند الحدود، تغاير شاذ) أو إذا لم تتحقق شروط KKT في النتيجة.
+    """
+    r = np.asarray(returns, dtype=np.float64)
+    cov = np.asarray(cov, dtype=np.float64)
+    cov = (cov + cov.T) / 2
+    lo = np.asarray(lower, dtype=np.float64)
+    hi = np.asarray(upper, dtype=np.float64)
+    lam = np.asarray(lambdas, dtype=np.float64)
+    if np.any(lam <= 0):
+        raise ValueError("lambdas must be positive")
+    _check_bounds(lo, hi)
+
+    t = 1.0 / (2.0 * lam)
+    segments = _critical_line(r, cov, lo, hi, t.min())
+    lows = np.array([seg[0] for seg in segments])
+    A = np.array([seg[2] for seg in segments])
+    B = np.array([seg[3] for seg in segments])
+    # المقاطع مرتبة تنازليًا في t: المقطع j يغطي (lows[j], lows[j-1]]
+    idx = np.minimum((lows[None, :] >= t[:, None]).sum(axis=1), len(segments) - 1)
+    weights = np.clip(t[:, None] * A[idx] + B[idx], lo, hi)
+    if not _kkt_ok(r, cov, lo, hi, t, weights):
+        raise ValueError("critical line failed the KKT check")
+    return weights
+
+
+def solver_frontier_weights(returns, cov, lower, upper, lambdas, problem=None, solver=None):
+    """نفس المسح عبر مسألة CVXPY واحدة معلّمة يُعاد حلها مع warm_start لكل قيمة λ."""
+    n = len(returns)
+    if problem is None:
+        problem = PortfolioProblem(n, solver, covariance_structure(cov))
+    weights = np.full((len(lambdas), n), np.nan)
+    for i, lam in enumerate(lambdas):
+        result = problem.solve(returns, lower, upper, lam, cov)
+        if result.weights is not None:
+            weights[i] = result.weights
+    return weights
+
+
+def efficient_frontier(returns, cov, lower, upper, lambdas=None, risk_free_rate=DEFAULT_RISK_FREE_RATE,
+                       problem=None, solver=None):
+    """الحد الكفء (عائد/مخاطرة) لمجموعة قيم λ مع نقطة أعلى مؤشر شارب ومسار الأوزان."""
+    r = np.asarray(returns, dtype=np.float64)
+    cov = np.asarray(cov, dtype=np.float64)
+    lo = np.asarray(lower, dtype=np.float64)
+    hi = np.asarray(upper, dtype=np.float64)
+    lambdas = default_lambdas() if lambdas is None else np.asarray(lambdas, dtype=np.float64)
+
+    variances = np.diag(cov)
+    diagonal = covariance_structure(cov) == "diagonal"
+    weights = None
+    if diagonal and np.all(variances > 0) and np.all(lambdas > 0):
+        weights = diagonal_frontier_weights(r, variances, lo, hi, lambdas)
+        method = "closed_form"
+    elif not diagonal and np.all(lambdas > 0):
+        try:
+            weights = parametric_frontier_weights(r, cov, lo, hi, lambdas)
+            method = "critical_line"
+        except ValueError:
+            # حالة متدهورة: يُعاد المسح بالمحلل لكل قيمة λ
+            weights = None
+    if weights is None:
+        weights = solver_frontier_weights(r, cov, lo, hi, lambdas, problem=problem, solver=solver)
+        method = "solver"
+
+    port_returns = weights @ r
+    # مع التغاير القطري يكفي Σ wᵢ² σᵢ² بدل الضرب في المصفوفة الكاملة
+    variance = (weights ** 2) @ variances if diagonal else np.einsum("li,ij,lj->l", weights, cov, weights)
+    risks = np.sqrt(np.maximum(variance, 0.0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.where(risks > 0, (port_returns - risk_free_rate) / risks, np.nan)
+    max_sharpe = int(np.nanargmax(sharpe)) if np.any(np.isfinite(sharpe)) else None
+    return Frontier(lambdas, weights, port_returns, risks, sharpe, max_sharpe, method)
@@ -0,0 +1,167 @@
+import argparse
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from .scoring import compute_scores
+from .simulation import FAST_DAYS, SHOCK_IMPACT, SHOCK_TYPES, SLOW_DAYS, adjustment_duration
+
+DEFAULT_BLOCK_ROWS = 2_000_000
+SCORE_COL = "Governance_Score"
+
+GridResult = namedtuple("GridResult", ["rows", "parts", "elapsed", "summary", "frame"])
+
+# مصفوفة درجات الحوكمة المشتركة داخل كل عملية عاملة
+_shared = {}
+
+
+def bank_scores(banks, id_col="Bank"):
+    """يعيد (المعرّفات، درجات الحوكمة) من جدول البنوك؛ تُحسب الدرجة من المؤشرات الفرعية إن لم تكن موجودة."""
+    ids = banks[id_col].astype(str).to_numpy() if id_col in banks.columns else np.arange(len(banks)).astype(str)
+    if SCORE_COL in banks.columns:
+        scores = pd.to_numeric(banks[SCORE_COL], errors="coerce").to_numpy(dtype=np.float64)
+    else:
+        scores = compute_scores(banks)
+    return ids, scores
+
+
+def _attach(shm_name, n):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _shared["shm"] = shm
+    _shared["scores"] = np.ndarray((n,), dtype=np.float64, buffer=shm.buf)
+
+
+def _block_frame(ids, scores, shock_types, capital_grid, coef_grid):
+    impacts = np.array([SHOCK_IMPACT[s] for s in shock_types])
+    # بث الأبعاد: بنك × صدمة × رأس مال × معامل
+    g = scores[:, None, None, None]
+    impact = impacts[None, :, None, None] * coef_grid[None, None, None, :]
+    capital = capital_grid[None, None, :, None]
+    duration = adjustment_duration(capital, g, impact)
+
+    shape = duration.shape
+    bank_idx, shock_idx, cap_idx, coef_idx = np.indices(shape).reshape(4, -1)
+    duration = duration.ravel()
+    return pd.DataFrame({
+        "Bank": ids[bank_idx],
+        SCORE_COL: scores[bank_idx],
+        "shock_type": np.asarray(shock_types, dtype=object)[shock_idx],
+        "capital": capital_grid[cap_idx],
+        "shock_coef": coef_grid[coef_idx],
+        "impact": impact.reshape(shape[1], shape[3])[shock_idx, coef_idx],
+        "duration": duration,
+        "speed": np.select([duration <= FAST_DAYS, duration <= SLOW_DAYS], [0, 1], 2).astype(np.int8),
+    })
+
+
+def _summarize(frame):
+    grouped = frame.groupby(["Bank", "shock_type"], sort=False)["duration"]
+    summary = grouped.agg(["mean", "max"])
+    summary["share_slow"] = (frame["duration"] > SLOW_DAYS).groupby([frame["Bank"], frame["shock_type"]], sort=False).mean()
+    return summary
+
+
+def _run_block(part, start, stop, ids, shock_types, capital_grid, coef_grid, sink, fmt, scores=None):
+    if scores is None:
+        scores = _shared["scores"]
+    frame = _block_frame(ids, scores[start:stop], shock_types, capital_grid, coef_grid)
+    summary = _summarize(frame)
+    if sink is None:
+        return part, len(frame), summary, frame
+    path = os.path.join(sink, f"part-{part:05d}.{fmt}")
+    if fmt == "parquet":
+        frame.to_parquet(path, index=False)
+    else:
+        frame.to_csv(path, index=False)
+    return part, len(frame), summary, None
+
+
+def run_scenario_grid(banks, capital_grid, coef_grid, shock_types=None, id_col="Bank", sink=None, fmt="parquet",
+                      workers=None, block_rows=DEFAULT_BLOCK_ROWS, progress=None):
+    """يشغّل شبكة السيناريوهات (بنك × صدمة × رأس مال × معامل) موزعة على عمليات متوازية.
+
+    تُوضع درجات الحوكمة في ذاكرة مشتركة تقرؤها كل العمليات دون نسخ، وتكتب كل عملية
+    جزءها في ملف مستقل داخل مجلد sink (Parquet أو CSV). إذا كان sink فارغًا تُعاد النتائج
+    كاملة في الذاكرة. progress دالة اختيارية تُستدعى بـ (الأجزاء المنجزة، إجمالي الأجزاء).
+    """
+    started = time.perf_counter()
+    shock_types = list(SHOCK_TYPES if shock_types is None else shock_types)
+    capital_grid = np.asarray(capital_grid, dtype=np.float64).ravel()
+    coef_grid = np.asarray(coef_grid, dtype=np.float64).ravel()
+    if fmt not in ("parquet", "csv"):
+        raise ValueError("fmt must be 'parquet' or 'csv'")
+    ids, scores = bank_scores(banks, id_col) if isinstance(banks, pd.DataFrame) else (
+        np.arange(len(banks)).astype(str), np.asarray(banks, dtype=np.float64))
+    if sink is not None:
+        os.makedirs(sink, exist_ok=True)
+
+    per_bank = len(shock_types) * len(capital_grid) * len(coef_grid)
+    banks_per_block = max(1, int(block_rows) // max(per_bank, 1))
+    blocks = [(i, start, min(start + banks_per_block, len(scores)))
+              for i, start in enumerate(range(0, len(scores), banks_per_block))]
+    workers = os.cpu_count() if workers is None else int(workers)
+
+    results = []
+    if workers <= 1 or len(blocks) <= 1:
+        for part, start, stop in blocks:
+            results.append(_run_block(part, start, stop, ids[start:stop], shock_types, capital_grid, coef_grid,
+                                      sink, fmt, scores=scores))
+            if progress:
+                progress(len(results), len(blocks))
+    else:
+        shm = shared_memory.SharedMemory(create=True, size=max(scores.nbytes, 1))
+        try:
+            np.ndarray(scores.shape, dtype=np.float64, buffer=shm.buf)[:] = scores
+            with ProcessPoolExecutor(max_workers=workers, initializer=_attach,
+                                     initargs=(shm.name, len(scores))) as pool:
+                futures = [pool.submit(_run_block, part, start, stop, ids[start:stop], shock_types,
+                                       capital_grid, coef_grid, sink, fmt)
+                           for part, start, stop in blocks]
+                for future in as_completed(futures):
+                    results.append(future.result())
+                    if progress:
+                        progress(len(results), len(blocks))
+        finally:
+            shm.close()
+            shm.unlink()
+
+    results.sort(key=lambda r: r[0])
+    summary = pd.concat([r[2] for r in results]) if results else pd.DataFrame()
+    frame = pd.concat([r[3] for r in results], ignore_index=True) if sink is None and results else None
+    return GridResult(
+        rows=sum(r[1] for r in results), parts=len(results), elapsed=time.perf_counter() - started,
+        summary=summary, frame=frame,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the bank x shock x capital x coefficient scenario grid.")
+    parser.add_argument("banks", help="CSV/XLSX with a Bank column and Governance_Score or the sub-indicators")
+    parser.add_argument("sink", help="output directory for part files")
+    parser.add_argument("--capital", type=float, nargs=3, default=(50.0, 500.0, 10), metavar=("MIN", "MAX", "N"))
+    parser.add_argument("--coef", type=float, nargs=3, default=(0.5, 1.5, 11), metavar=("MIN", "MAX", "N"))
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--id-col", default="Bank")
+    args = parser.parse_args(argv)
+
+    banks = pd.read_excel(args.banks) if args.banks.endswith("xlsx") else pd.read_csv(args.banks)
+    capital_grid = np.linspace(args.capital[0], args.capital[1], int(args.capital[2]))
+    coef_grid = np.linspace(args.coef[0], args.coef[1], int(args.coef[2]))
+
+    def report(done, total):
+        print(f"\r{done}/{total} blocks", end="", flush=True)
+
+    result = run_scenario_grid(banks, capital_grid, coef_grid, id_col=args.id_col, sink=args.sink,
+                               fmt=args.format, workers=args.workers, progress=report)
+    print(f"\n{result.rows:,} rows in {result.elapsed:.2f}s ({result.rows / result.elapsed:,.0f} rows/s)")
+    result.summary.to_csv(os.path.join(args.sink, "summary.csv"))
+
+
+if __name__ == "__main__":
+    main()
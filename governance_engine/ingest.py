@@ -0,0 +1,150 @@
+import importlib.util
+import io
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .cache import content_hash
+from .scoring import INDICATORS
+
+# نسخة المخطط ضمن مفتاح الحفظ: أي تغيير في قواعد التحقق يُبطل النسخ المحفوظة القديمة
+SCHEMA_VERSION = "ingest-v2"
+SCORE_RANGE = (0.0, 10.0)
+RANGE_COLUMNS = INDICATORS + ["Governance_Score"]
+# أقصى عدد منازل عشرية يُقبل معه تحويل العمود إلى float32 دون فقدان القيم الأصلية
+MAX_DECIMALS = 4
+
+ISSUE_MISSING = "missing"
+ISSUE_NON_NUMERIC = "non_numeric"
+ISSUE_OUT_OF_RANGE = "out_of_range"
+
+IngestResult = namedtuple("IngestResult", ["key", "frame", "issues", "missing_columns", "bad_rows", "downcast"])
+
+
+def _excel_engine():
+    # calamine أسرع بكثير من openpyxl في قراءة ملفات xlsx الكبيرة، ويُستخدم إن كان مثبتًا
+    return "calamine" if importlib.util.find_spec("python_calamine") is not None else None
+
+
+def parse_table(data, name):
+    """يقرأ ملف CSV أو xlsx مرفوعًا إلى جدول؛ القارئ الوحيد للملفات المرفوعة (ingest و read_upload في cache)."""
+    buffer = io.BytesIO(data)
+    if str(name).endswith("xlsx"):
+        return pd.read_excel(buffer, engine=_excel_engine())
+    return pd.read_csv(buffer)
+
+
+def _numeric_object_columns(df):
+    """أعمدة نصية كل قيمها غير الفارغة أرقام، فتُحوّل مرة واحدة بدل to_numeric عند كل استخدام."""
+    columns = {}
+    for col in df.columns[df.dtypes == object]:
+        converted = pd.to_numeric(df[col], errors="coerce")
+        if converted.notna().sum() and converted.notna().sum() == df[col].notna().sum():
+            columns[col] = converted
+    return columns
+
+
+def _float32_safe(values):
+    """العمود آمن للتحويل إلى float32 إذا كانت قيمه بعدد منازل عشرية محدود يمكن استرجاعه بالتقريب.
+
+    مثل مبالغ مالية بمنزلتين عشريتين: float32 يحفظ 2²³ خطوة على الأقل، فلا تضيع أي قيمة أصلية.
+    """
+    finite = values[np.isfinite(values)]
+    if finite.size == 0:
+        return True
+    for decimals in range(MAX_DECIMALS + 1):
+        scaled = finite * 10.0 ** decimals
+        if np.all(np.abs(scaled - np.round(scaled)) <= 1e-6 * np.maximum(np.abs(scaled), 1.0)):
+            return bool(np.abs(scaled).max() < 2 ** 23)
+    return False
+
+
+def validate_frame(df, required=INDICATORS, ranges=None):
+    """يتحقق من المخطط مرة واحدة ويعيد (الجدول المنمّط، تقرير المشكلات، الأعمدة الناقصة، الأعمدة المحوّلة إلى float32).
+
+    أعمدة المؤشرات تُحوّل إلى أرقام، وتُسجل لكل خلية فارغة أو غير رقمية أو خارج المدى [0، 10]
+    مشكلة في التقرير (الصف، العمود، القيمة، نوع المشكلة) دون حذف الصف. الأعمدة العشرية الأخرى تُخفّض
+    إلى float32 فقط إذا بقيت قيمها الأصلية قابلة للاسترجاع (انظر _float32_safe). أعمدة المؤشرات والدرجة
+    (مفاتيح ranges) تبقى float64: الدرجة تُحسب من قيم float32 نفسها لا من القيم المسترجعة، فتنزل
+    الدرجات الواقعة على حدود التصنيف (5 و 8) تحت الحد بفرق التقريب.
+    """
+    ranges = {c: SCORE_RANGE for c in RANGE_COLUMNS} if ranges is None else dict(ranges)
+    frame = df.copy()
+    frame.columns = [str(c).strip() if isinstance(c, str) else c for c in frame.columns]
+    missing_columns = [c for c in required if c not in frame.columns]
+
+    for col, converted in _numeric_object_columns(frame).items():
+        frame[col] = converted
+
+    issues = []
+    for col, (low, high) in ranges.items():
+        if col not in frame.columns:
+            continue
+        raw = frame[col]
+        values = pd.to_numeric(raw, errors="coerce")
+        non_numeric = (values.isna() & raw.notna()).to_numpy()
+        missing = raw.isna().to_numpy()
+        with np.errstate(invalid="ignore"):
+            out_of_range = ((values < low) | (values > high)).to_numpy()
+        for mask, issue in ((missing, ISSUE_MISSING), (non_numeric, ISSUE_NON_NUMERIC),
+                            (out_of_range, ISSUE_OUT_OF_RANGE)):
+            rows = np.flatnonzero(mask)
+            if rows.size:
+                issues.append(pd.DataFrame({
+                    "row": frame.index.to_numpy()[rows],
+                    "column": col,
+                    "value": raw.to_numpy()[rows].astype(str),
+                    "issue": issue,
+                }))
+        frame[col] = values
+
+    downcast = []
+    for col in frame.columns[frame.dtypes == np.float64]:
+        if col not in ranges and _float32_safe(frame[col].to_numpy()):
+            frame[col] = frame[col].astype(np.float32)
+            downcast.append(col)
+
+    issues = (pd.concat(issues, ignore_index=True).sort_values(["row", "column"], kind="stable")
+              .reset_index(drop=True) if issues else
+              pd.DataFrame({"row": pd.Series(dtype=np.int64), "column": pd.Series(dtype=object),
+                            "value": pd.Series(dtype=object), "issue": pd.Series(dtype=object)}))
+    return frame, issues, missing_columns, downcast
+
+
+def reload_ingested(key, frame_cache, required=INDICATORS):
+    """نتيجة ingest_upload لمحتوى بصمته key من الذاكرة المؤقتة دون الملف نفسه؛ None إذا أُخلي منها."""
+    if frame_cache is None:
+        return None
+    frame_key = f"{key}-{SCHEMA_VERSION}"
+    frame = frame_cache.get(frame_key)
+    issues = frame_cache.get(f"{frame_key}-issues") if frame is not None else None
+    if frame is None or issues is None:
+        return None
+    missing_columns = [c for c in required if c not in frame.columns]
+    downcast = list(frame.columns[frame.dtypes == np.float32])
+    return IngestResult(key, frame, issues, missing_columns, int(issues["row"].nunique()), downcast)
+
+
+def ingest_upload(data, name, frame_cache=None, required=INDICATORS):
+    """قراءة الملف المرفوع مرة واحدة مع التحقق، وحفظ نسخة Parquet منمّطة يُعاد تحميلها بـ memory-map.
+
+    الاستدعاءات اللاحقة لنفس المحتوى تقرأ الجدول وتقرير المشكلات من Parquet مباشرة دون
+    المرور على Excel أو إعادة التحقق.
+    """
+    key = content_hash(data)
+    frame_key = f"{key}-{SCHEMA_VERSION}"
+    issues_key = f"{frame_key}-issues"
+    cached = reload_ingested(key, frame_cache, required)
+    if cached is not None:
+        return cached
+
+    frame, issues, missing_columns, downcast = validate_frame(parse_table(data, name), required)
+    if frame_cache is not None and frame_cache.put(frame_key, frame):
+        frame_cache.put(issues_key, issues)
+        if frame_cache.shared:
+            # الجلسة التي رفعت الملف أولًا تستخدم النسخة المشتركة أيضًا بدل نسختها الخاصة
+            shared_frame, shared_issues = frame_cache.get(frame_key), frame_cache.get(issues_key)
+            if shared_frame is not None and shared_issues is not None:
+                frame, issues = shared_frame, shared_issues
+    return IngestResult(key, frame, issues, missing_columns, int(issues["row"].nunique()), downcast)
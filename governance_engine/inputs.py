@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+# أعمدة جداول الإدخال المجمّع، مع أسماء إنجليزية مقبولة في ملفات CSV
+UNIT_NAME, UNIT_GOV = "الوحدة", "مستوى الحوكمة"
+ASSET_NAME, ASSET_RETURN, ASSET_MAX, ASSET_MIN = "الاستثمار", "العائد (%)", "الحد الأقصى (درهم)", "الحد الأدنى (درهم)"
+
+UNIT_ALIASES = {"unit": UNIT_NAME, "name": UNIT_NAME, "governance": UNIT_GOV, "governance_score": UNIT_GOV}
+ASSET_ALIASES = {
+    "asset": ASSET_NAME, "name": ASSET_NAME,
+    "return": ASSET_RETURN, "return_pct": ASSET_RETURN,
+    "max": ASSET_MAX, "max_alloc": ASSET_MAX,
+    "min": ASSET_MIN, "min_alloc": ASSET_MIN,
+}
+
+
+def _rename(df, aliases):
+    return df.rename(columns={c: aliases[str(c).strip().lower()] for c in df.columns
+                              if str(c).strip().lower() in aliases})
+
+
+def default_units(n, governance=6.0):
+    return pd.DataFrame({UNIT_NAME: [f"وحدة {i+1}" for i in range(n)], UNIT_GOV: np.full(n, governance)})
+
+
+def default_assets(n, total_capital):
+    return pd.DataFrame({
+        ASSET_NAME: [f"استثمار {i+1}" for i in range(n)],
+        ASSET_RETURN: np.zeros(n),
+        ASSET_MAX: np.full(n, float(total_capital)),
+        ASSET_MIN: np.zeros(n),
+    })
+
+
+def units_from_frame(df):
+    """يعيد (أسماء الوحدات، مصفوفة الحوكمة) من جدول الوحدات بعد حذف الصفوف غير الصالحة."""
+    df = _rename(df, UNIT_ALIASES)
+    if UNIT_GOV not in df.columns:
+        raise KeyError(f"missing column {UNIT_GOV!r}")
+    g = pd.to_numeric(df[UNIT_GOV], errors="coerce")
+    valid = g.notna().to_numpy()
+    g = g.to_numpy(dtype=np.float64)[valid].clip(0.0, 10.0)
+    names = df[UNIT_NAME].astype(str).to_numpy()[valid] if UNIT_NAME in df.columns else np.array(
+        [f"وحدة {i+1}" for i in range(int(valid.sum()))])
+    return list(names), g
+
+
+def assets_from_frame(df, total_capital):
+    """يعيد (الأسماء، العوائد، الحدود القصوى، الحدود الدنيا) كنسب من رأس المال الإجمالي."""
+    df = _rename(df, ASSET_ALIASES)
+    if ASSET_RETURN not in df.columns:
+        raise KeyError(f"missing column {ASSET_RETURN!r}")
+    r = pd.to_numeric(df[ASSET_RETURN], errors="coerce")
+    valid = r.notna().to_numpy()
+    n = int(valid.sum())
+
+    def bound(col, default):
+        if col not in df.columns:
+            return np.full(n, default)
+        values = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64)[valid]
+        return np.where(np.isnan(values), default, values).clip(0.0, total_capital)
+
+    names = df[ASSET_NAME].astype(str).to_numpy()[valid] if ASSET_NAME in df.columns else np.array(
+        [f"استثمار {i+1}" for i in range(n)])
+    r = r.to_numpy(dtype=np.float64)[valid] / 100
+    return list(names), r, bound(ASSET_MAX, total_capital) / total_capital, bound(ASSET_MIN, 0.0) / total_capital
@@ -0,0 +1,122 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+DEMEAN_TOL = 1e-10
+DEMEAN_MAX_ITER = 500
+
+PanelResult = namedtuple(
+    "PanelResult",
+    ["coefficients", "n_obs", "n_entities", "n_clusters", "r2_within", "dropped", "effects", "iterations"],
+)
+
+
+def _codes(values):
+    codes, uniques = pd.factorize(pd.Series(values), sort=False)
+    return codes, len(uniques)
+
+
+def group_demean(values, codes, n_groups):
+    """يطرح متوسط كل مجموعة من الأعمدة باستخدام bincount (ذاكرة خطية في عدد الصفوف)."""
+    counts = np.bincount(codes, minlength=n_groups).astype(np.float64)
+    out = np.empty_like(values)
+    for j in range(values.shape[1]):
+        means = np.bincount(codes, weights=values[:, j], minlength=n_groups) / counts
+        out[:, j] = values[:, j] - means[codes]
+    return out
+
+
+def within_transform(values, group_codes, tol=DEMEAN_TOL, max_iter=DEMEAN_MAX_ITER):
+    """تحويل داخلي لأثر ثابت واحد أو أكثر؛ مع أكثر من أثر يُستخدم الإسقاط المتناوب حتى التقارب."""
+    values = np.asarray(values, dtype=np.float64)
+    if len(group_codes) == 1:
+        codes, n_groups = group_codes[0]
+        return group_demean(values, codes, n_groups), 1
+    scale = max(np.abs(values).max(), 1.0)
+    for iteration in range(1, max_iter + 1):
+        previous = values
+        for codes, n_groups in group_codes:
+            values = group_demean(values, codes, n_groups)
+        if np.abs(values - previous).max() <= tol * scale:
+            return values, iteration
+    return values, max_iter
+
+
+def cluster_covariance(X, resid, cluster_codes, n_clusters, xtx_inv):
+    """مصفوفة تغاير المعاملات المتينة للتجميع (Liang-Zeger) مع تصحيح العينات الصغيرة."""
+    n, k = X.shape
+    scores = X * resid[:, None]
+    summed = np.empty((n_clusters, k))
+    for j in range(k):
+        summed[:, j] = np.bincount(cluster_codes, weights=scores[:, j], minlength=n_clusters)
+    meat = summed.T @ summed
+    correction = (n_clusters / max(n_clusters - 1, 1)) * ((n - 1) / max(n - k, 1))
+    return correction * xtx_inv @ meat @ xtx_inv
+
+
+def panel_regression(df, y, x_cols, entity_col, time_col=None, time_effects=False, cluster_col=None):
+    """انحدار بيانات البانل بآثار ثابتة للمؤسسة (وللسنة اختياريًا) وأخطاء معيارية مجمّعة.
+
+    تُزال الآثار الثابتة بالتحويل الداخلي (طرح متوسطات المجموعات) بدل المتغيرات الوهمية،
+    فتبقى الذاكرة خطية في عدد الصفوف مهما كثرت المؤسسات. التجميع افتراضيًا حسب المؤسسة.
+    """
+    # scipy.stats بطيء الاستيراد (أكثر من ثانية)، فيُحمّل عند أول تقدير فقط
+    from scipy import stats
+
+    x_cols = list(x_cols)
+    cluster_col = entity_col if cluster_col is None else cluster_col
+    keys = list(dict.fromkeys([entity_col, cluster_col] + ([time_col] if time_effects and time_col else [])))
+    data = df[keys].copy()
+    numeric = df[[y] + x_cols].apply(pd.to_numeric, errors="coerce")
+    data = pd.concat([data, numeric], axis=1).dropna()
+    if data.empty:
+        raise ValueError("no complete rows for the selected variables")
+
+    effects = [_codes(data[entity_col].to_numpy())]
+    if time_effects and time_col:
+        effects.append(_codes(data[time_col].to_numpy()))
+    demeaned, iterations = within_transform(data[[y] + x_cols].to_numpy(dtype=np.float64), effects)
+    y_w, X_w = demeaned[:, 0], demeaned[:, 1:]
+
+    # المتغيرات الثابتة داخل كل مؤسسة تختفي بعد التحويل، فتُستبعد بدل أن تجعل المصفوفة منفردة
+    keep = X_w.std(axis=0) > 1e-12 * np.maximum(np.abs(data[x_cols].to_numpy()).max(axis=0), 1.0)
+    dropped = [c for c, k in zip(x_cols, keep) if not k]
+    kept = [c for c, k in zip(x_cols, keep) if k]
+    if not kept:
+        raise ValueError("all regressors are constant within entities")
+    X_w = X_w[:, keep]
+
+    xtx_inv = np.linalg.pinv(X_w.T @ X_w)
+    beta = xtx_inv @ (X_w.T @ y_w)
+    resid = y_w - X_w @ beta
+
+    cluster_codes, n_clusters = _codes(data[cluster_col].to_numpy())
+    cov = cluster_covariance(X_w, resid, cluster_codes, n_clusters, xtx_inv)
+    se = np.sqrt(np.clip(np.diag(cov), 0.0, None))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t_stat = beta / se
+    dof = max(n_clusters - 1, 1)
+    p_value = 2 * stats.t.sf(np.abs(t_stat), dof)
+    ci = stats.t.ppf(0.975, dof) * se
+
+    sst = (y_w ** 2).sum()
+    coefficients = pd.DataFrame({
+        "variable": kept,
+        "coef": beta,
+        "std_err": se,
+        "t": t_stat,
+        "p_value": p_value,
+        "ci_low": beta - ci,
+        "ci_high": beta + ci,
+    })
+    return PanelResult(
+        coefficients=coefficients,
+        n_obs=len(data),
+        n_entities=effects[0][1],
+        n_clusters=n_clusters,
+        r2_within=float(1 - (resid ** 2).sum() / sst) if sst > 0 else float("nan"),
+        dropped=dropped,
+        effects="entity+time" if len(effects) > 1 else "entity",
+        iterations=iterations,
+    )
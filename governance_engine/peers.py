@@ -0,0 +1,191 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .scoring import BAND_LABELS, INDICATORS, as_matrix, compute_scores, rating_bands
+from .store import _period_label, period_value
+
+DEFAULT_PEERS = 10
+# الفترة المستخدمة عندما لا يوجد عمود فترة: كل الصفوف نظراء لبعضها
+ALL_PERIODS = "الكل"
+
+PeerRank = namedtuple("PeerRank", ["entity", "period", "score", "rank", "peers", "percentile"])
+
+
+def _chronological(labels):
+    """ترتيب الفترات زمنيًا حسب period_value، والتسميات غير المفهومة في النهاية بترتيبها الأبجدي."""
+    def key(label):
+        try:
+            return (0, period_value(label), label)
+        except (TypeError, ValueError):
+            return (1, 0.0, label)
+    return sorted(labels, key=key)
+
+
+class PeerIndex:
+    """فهرس ترتيب النظراء: يُبنى مرة واحدة لكل مجموعة بيانات ثم يُستعلم منه مباشرة.
+
+    الدرجات مرتبة داخل كل فترة في مصفوفة واحدة (فترة ثم درجة) مع حدود كل فترة، فالمئين والترتيب
+    لأي درجة بحث ثنائي O(log n) دون إعادة ترتيب الجدول. للبحث عن أقرب النظراء حسب المؤشرات الفرعية
+    الخمسة تُبنى شجرة KD لكل فترة عند أول استعلام عنها وتبقى محفوظة في الفهرس.
+    """
+
+    def __init__(self, entities, periods, values, weights=None):
+        values = as_matrix(values)
+        entities = pd.Series(entities).astype(str).to_numpy()
+        periods = np.full(len(values), ALL_PERIODS, dtype=object) if periods is None else np.asarray(periods)
+        if not len(entities) == len(periods) == len(values):
+            raise ValueError("entities, periods and values must have the same length")
+        valid = ~np.isnan(values).any(axis=1)
+        self.values = values[valid]
+        self.entities = entities[valid]
+        self.scores = compute_scores(self.values, weights)
+
+        # التسمية تُحسب لكل قيمة مختلفة فقط؛ قيم مثل 2024 و "2024" تصبح فترة واحدة
+        codes, uniques = pd.factorize(periods[valid])
+        if (codes < 0).any():
+            raise ValueError("periods must not contain missing values")
+        labels = [_period_label(u) for u in uniques]
+        self.periods = _chronological(list(dict.fromkeys(labels)))
+        self._period_index = {p: i for i, p in enumerate(self.periods)}
+        remap = np.array([self._period_index[label] for label in labels], dtype=np.int64)
+        self.period_codes = remap[codes]
+
+        # صفوف مرتبة حسب (الفترة، الدرجة) وحدود كل فترة فيها
+        self._order = np.lexsort((self.scores, self.period_codes))
+        self._sorted = self.scores[self._order]
+        self._bounds = np.searchsorted(self.period_codes[self._order], np.arange(len(self.periods) + 1))
+
+        # البحث عن صف (مؤسسة، فترة): مفاتيح صحيحة مرتبة بدل قاموس بحجم البيانات
+        entity_codes, entity_uniques = pd.factorize(self.entities)
+        self._entity_index = pd.Index(entity_uniques)
+        # جدول التجزئة في pandas يُبنى عند أول بحث؛ يُبنى هنا حتى لا يدفع الاستعلام الأول كلفته
+        self._entity_index.get_indexer(entity_uniques[:1])
+        keys = entity_codes.astype(np.int64) * len(self.periods) + self.period_codes
+        self._key_order = np.argsort(keys, kind="stable")
+        self._keys = keys[self._key_order]
+        self._trees = {}
+
+    @classmethod
+    def from_frame(cls, df, entity_col, period_col=None, weights=None):
+        """الفهرس من جدول فيه عمود المؤسسة والمؤشرات الفرعية الخمسة، مع عمود فترة اختياري."""
+        missing = [c for c in [entity_col, period_col, *INDICATORS] if c is not None and c not in df.columns]
+        if missing:
+            raise KeyError(f"missing columns: {missing}")
+        values = df[INDICATORS].apply(pd.to_numeric, errors="coerce")
+        keep = df[entity_col].notna() & (df[period_col].notna() if period_col is not None else True)
+        return cls(df.loc[keep, entity_col], df.loc[keep, period_col] if period_col is not None else None,
+                   values[keep], weights)
+
+    def __len__(self):
+        return len(self.scores)
+
+    def _span(self, period):
+        if period not in self._period_index:
+            raise KeyError(f"unknown period {period!r}")
+        p = self._period_index[period]
+        return self._bounds[p], self._bounds[p + 1]
+
+    def _row(self, entity, period):
+        e = self._entity_index.get_indexer([str(entity)])[0]
+        p = self._period_index.get(_period_label(period), -1)
+        key = e * len(self.periods) + p
+        i = np.searchsorted(self._keys, key)
+        if e < 0 or p < 0 or i == len(self._keys) or self._keys[i] != key:
+            raise KeyError(f"no observation for entity {entity!r} in period {period!r}")
+        return int(self._key_order[i])
+
+    def peers(self, period):
+        start, stop = self._span(_period_label(period))
+        return int(stop - start)
+
+    def entities_in(self, period):
+        """المؤسسات في الفترة من الأعلى درجة إلى الأدنى."""
+        start, stop = self._span(_period_label(period))
+        return self.entities[self._order[start:stop][::-1]]
+
+    def percentile(self, score, period):
+        """نسبة النظراء في الفترة الذين درجتهم أقل من score أو تساويها (0-100)، لقيمة أو مصفوفة درجات."""
+        start, stop = self._span(_period_label(period))
+        below = np.searchsorted(self._sorted[start:stop], score, side="right")
+        return below / max(stop - start, 1) * 100
+
+    def rank(self, entity, period):
+        """ترتيب المؤسسة بين نظرائها في الفترة (1 = الأعلى، والمتعادلون يتشاركون الترتيب) ومئينها."""
+        period = _period_label(period)
+        row = self._row(entity, period)
+        start, stop = self._span(period)
+        segment = self._sorted[start:stop]
+        score = self.scores[row]
+        above = len(segment) - np.searchsorted(segment, score, side="right")
+        return PeerRank(str(entity), period, float(score), int(above) + 1, len(segment),
+                        float(np.searchsorted(segment, score, side="right") / len(segment) * 100))
+
+    def ranks(self):
+        """ترتيب كل المشاهدات ومئيناتها دفعة واحدة: بحث ثنائي متجه داخل كل فترة."""
+        rank = np.empty(len(self), dtype=np.int64)
+        percentile = np.empty(len(self))
+        for p in range(len(self.periods)):
+            start, stop = self._bounds[p], self._bounds[p + 1]
+            rows = self._order[start:stop]
+            below = np.searchsorted(self._sorted[start:stop], self.scores[rows], side="right")
+            rank[rows] = (stop - start) - below + 1
+            percentile[rows] = below / max(stop - start, 1) * 100
+        return pd.DataFrame({
+            "entity": self.entities,
+            "period": np.asarray(self.periods, dtype=object)[self.period_codes],
+            "score": self.scores,
+            "rank": rank,
+            "percentile": percentile,
+        })
+
+    def top(self, period, k=DEFAULT_PEERS):
+        """أعلى k مؤسسة في الفترة، من آخر الشريحة المرتبة مباشرة."""
+        start, stop = self._span(_period_label(period))
+        rows = self._order[max(stop - int(k), start):stop][::-1]
+        return self._frame(rows, period)
+
+    def _frame(self, rows, period, distance=None):
+        segment = self._sorted[slice(*self._span(_period_label(period)))]
+        scores = self.scores[rows]
+        columns = {
+            "entity": self.entities[rows],
+            "score": scores,
+            "rank": len(segment) - np.searchsorted(segment, scores, side="right") + 1,
+            "band": np.asarray(BAND_LABELS, dtype=object)[rating_bands(scores)],
+        }
+        if distance is not None:
+            columns["distance"] = distance
+        # جدول واحد من قاموس الأعمدة: إضافة الأعمدة واحدًا بعد الآخر أبطأ من الاستعلام نفسه
+        columns.update(zip(INDICATORS, self.values[rows].T))
+        return pd.DataFrame(columns)
+
+    def _tree(self, period):
+        if period not in self._trees:
+            from scipy.spatial import cKDTree
+
+            start, stop = self._span(period)
+            rows = self._order[start:stop]
+            self._trees[period] = (cKDTree(self.values[rows], balanced_tree=False), rows)
+        return self._trees[period]
+
+    def nearest(self, entity, period, k=DEFAULT_PEERS):
+        """أقرب k نظيرًا للمؤسسة في الفترة حسب المسافة الإقليدية بين المؤشرات الفرعية الخمسة."""
+        period = _period_label(period)
+        row = self._row(entity, period)
+        return self.nearest_profile(self.values[row], period, k, exclude=row)
+
+    def nearest_profile(self, profile, period, k=DEFAULT_PEERS, exclude=None):
+        """أقرب k مؤسسة في الفترة لملف مؤشرات معطى (خمس قيم)، مع استبعاد صف exclude إن حُدد."""
+        period = _period_label(period)
+        tree, rows = self._tree(period)
+        k = min(int(k) + (exclude is not None), len(rows))
+        if k == 0:
+            return self._frame(np.empty(0, dtype=np.int64), period, np.empty(0))
+        distance, idx = tree.query(as_matrix(profile)[0], k=k)
+        found = rows[np.atleast_1d(idx)]
+        distance = np.atleast_1d(distance)
+        keep = found != exclude
+        return self._frame(found[keep][:k - (exclude is not None)], period,
+                           distance[keep][:k - (exclude is not None)])
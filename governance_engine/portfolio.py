@@ -0,0 +1,134 @@
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+DEFAULT_VARIANCE = 0.02
+DEFAULT_LAMBDA = 0.1
+PREFERRED_SOLVERS = ("OSQP", "CLARABEL", "ECOS", "SCS")
+
+SolveResult = namedtuple("SolveResult", ["weights", "status", "objective", "solve_time"])
+
+
+def available_solvers():
+    import cvxpy as cp
+
+    installed = set(cp.installed_solvers())
+    return [s for s in PREFERRED_SOLVERS if s in installed]
+
+
+def default_covariance(n):
+    # تغاير افتراضي ثابت لكل أصل
+    return np.identity(int(n)) * DEFAULT_VARIANCE
+
+
+def heuristic_weights(returns, lower, upper):
+    """التوزيع التقريبي في التبويب 6: أوزان متناسبة مع العائد ضمن الحدود، ثم يوزَّع الباقي على المساحة المتبقية."""
+    r = np.asarray(returns, dtype=np.float64)
+    max_c = np.asarray(upper, dtype=np.float64)
+    min_c = np.asarray(lower, dtype=np.float64)
+
+    base = r / r.sum()
+    w = np.maximum(base, min_c)
+    w = np.minimum(w, max_c)
+
+    unused = 1.0 - w.sum()
+    if unused > 0:
+        room = max_c - w
+        room[room < 0] = 0
+        share = room / room.sum() if room.sum() > 0 else 0
+        w += unused * share
+
+    if w.sum() > 1:
+        w = w / w.sum()
+    return w
+
+
+def covariance_structure(cov):
+    """"diagonal" إذا كانت المصفوفة قطرية (تكفي عندها مسألة أخف بكثير)، وإلا "dense"."""
+    cov = np.asarray(cov)
+    return "diagonal" if not np.any(cov - np.diag(np.diag(cov))) else "dense"
+
+
+def covariance_factor(cov):
+    """عامل F بحيث Σ = Fᵀ F، يسمح بكتابة المخاطرة كـ ‖F w‖² فتبقى المسألة قابلة للتمعلم (DPP)."""
+    cov = np.asarray(cov, dtype=np.float64)
+    cov = (cov + cov.T) / 2
+    vals, vecs = np.linalg.eigh(cov)
+    # قص القيم الذاتية السالبة الناتجة عن أخطاء التقريب حتى تبقى المصفوفة شبه موجبة
+    return (vecs * np.sqrt(np.clip(vals, 0.0, None))).T
+
+
+class PortfolioProblem:
+    """مسألة متوسط-تباين تُبنى مرة واحدة لكل عدد أصول ويُعاد حلها بتغيير المعاملات فقط.
+
+    العوائد والحدود ومعامل المخاطرة وعامل التغاير كلها cp.Parameter، لذلك يدفع CVXPY كلفة
+    التحويل القانوني مرة واحدة، وتستخدم الحلول اللاحقة warm_start.
+    """
+
+    def __init__(self, n, solver=None, structure="dense"):
+        import cvxpy as cp
+
+        if structure not in ("dense", "diagonal"):
+            raise ValueError("structure must be 'dense' or 'diagonal'")
+        self.n = int(n)
+        self.solver = solver
+        self.structure = structure
+        self.returns = cp.Parameter(self.n, name="returns")
+        self.lower = cp.Parameter(self.n, name="lower")
+        self.upper = cp.Parameter(self.n, name="upper")
+        self.risk_aversion = cp.Parameter(nonneg=True, name="risk_aversion")
+        if structure == "diagonal":
+            self.factor = cp.Parameter(self.n, nonneg=True, name="cov_factor")
+        else:
+            self.factor = cp.Parameter((self.n, self.n), name="cov_factor")
+        self.weights = cp.Variable(self.n, name="weights")
+        # متغير مساعد y = F w حتى لا يُضرب معامل المخاطرة في تعبير يحتوي معاملًا آخر
+        self._y = cp.Variable(self.n, name="factor_exposure")
+
+        self.risk = cp.sum_squares(self._y)
+        objective = cp.Maximize(self.returns @ self.weights - self.risk_aversion * self.risk)
+        constraints = [
+            self._y == (cp.multiply(self.factor, self.weights) if structure == "diagonal"
+                        else self.factor @ self.weights),
+            cp.sum(self.weights) == 1,
+            self.weights >= self.lower,
+            self.weights <= self.upper,
+        ]
+        self.problem = cp.Problem(objective, constraints)
+        self._cov = None
+        self._lock = threading.Lock()
+        self.solves = 0
+
+    def set_covariance(self, cov):
+        cov = default_covariance(self.n) if cov is None else np.asarray(cov, dtype=np.float64)
+        if self._cov is None or cov.shape != self._cov.shape or not np.array_equal(cov, self._cov):
+            if self.structure == "diagonal":
+                if covariance_structure(cov) != "diagonal":
+                    raise ValueError("a diagonal PortfolioProblem needs a diagonal covariance")
+                self.factor.value = np.sqrt(np.clip(np.diag(cov), 0.0, None))
+            else:
+                self.factor.value = covariance_factor(cov)
+            self._cov = cov.copy()
+
+    def solve(self, returns, lower, upper, risk_aversion=DEFAULT_LAMBDA, cov=None, solver=None):
+        with self._lock:
+            self.returns.value = np.asarray(returns, dtype=np.float64)
+            self.lower.value = np.asarray(lower, dtype=np.float64)
+            self.upper.value = np.asarray(upper, dtype=np.float64)
+            self.risk_aversion.value = float(risk_aversion)
+            self.set_covariance(cov)
+
+            started = time.perf_counter()
+            try:
+                self.problem.solve(solver=solver or self.solver, warm_start=True)
+            except Exception:  # cvxpy.error.SolverError وأخطاء المحللات الأخرى
+                return SolveResult(None, "solver_error", None, time.perf_counter() - started)
+            elapsed = time.perf_counter() - started
+            self.solves += 1
+
+            w = self.weights.value
+            if self.problem.status != "optimal" or w is None or np.any(np.isnan(w)):
+                return SolveResult(None, self.problem.status, None, elapsed)
+            return SolveResult(np.array(w), self.problem.status, float(self.problem.value), elapsed)
@@ -0,0 +1,162 @@
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import namedtuple
+from contextlib import contextmanager
+
+import pandas as pd
+
+# تفعيل التشخيص افتراضيًا من متغير البيئة، ومسار اختياري لملف السجلات (سطر JSON لكل مرحلة)
+PROFILE_ENABLED = os.environ.get("GOVERNANCE_PROFILE", "").strip().lower() in ("1", "true", "yes", "on")
+PROFILE_LOG_PATH = os.environ.get("GOVERNANCE_PROFILE_LOG") or None
+
+STAGE_READ = "read"
+STAGE_SCORE = "score"
+STAGE_FIT = "fit"
+STAGE_SOLVE = "solve"
+STAGE_RENDER = "render"
+STAGE_TOTAL = "total"
+STAGES = [STAGE_READ, STAGE_SCORE, STAGE_FIT, STAGE_SOLVE, STAGE_RENDER, STAGE_TOTAL]
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+
+StageRecord = namedtuple("StageRecord", ["run_id", "timestamp", "tab", "stage", "seconds", "peak_mb", "status"])
+
+logger = logging.getLogger("governance.profile")
+# reset_peak متاح منذ Python 3.9؛ قبلها تكون الذروة المسجلة هي الذروة منذ بدء التتبع
+_reset_peak = getattr(tracemalloc, "reset_peak", None)
+_log_lock = threading.Lock()
+# tracemalloc عام على مستوى العملية، وجلسات Streamlit تعمل في خيوط العملية نفسها: يبقى التتبع
+# قائمًا ما دام هناك Profiler مفتوح (وتختلط ذروات الجلسات المتزامنة)
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+
+
+def _acquire_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracing_users += 1
+
+
+def _release_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+class Profiler:
+    """يسجل زمن كل مرحلة (قراءة، حساب الدرجات، تقدير، حل، رسم) في كل تبويب خلال تشغيل واحد للتطبيق.
+
+    عند التعطيل تكون stage و tab بلا أثر تقريبًا. مع memory=True تُسجل أيضًا ذروة الذاكرة
+    لكل مرحلة عبر tracemalloc؛ المراحل المتداخلة (مثل total حول fit) تأخذ ذروة ما بداخلها.
+    """
+
+    def __init__(self, enabled=PROFILE_ENABLED, memory=True, run_id=None):
+        self.enabled = bool(enabled)
+        self.memory = self.enabled and bool(memory)
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.records = []
+        self._tab = None
+        self._peaks = []
+        self._tracing = False
+        if self.memory:
+            _acquire_tracing()
+            self._tracing = True
+
+    @contextmanager
+    def tab(self, name):
+        """يحدد التبويب الذي تُنسب إليه المراحل داخله، ويسجل زمنه الكلي كمرحلة total."""
+        if not self.enabled:
+            yield self
+            return
+        previous, self._tab = self._tab, name
+        try:
+            with self.stage(STAGE_TOTAL):
+                yield self
+        finally:
+            self._tab = previous
+
+    @contextmanager
+    def stage(self, stage, tab=None):
+        if not self.enabled:
+            yield
+            return
+        if self.memory:
+            if self._peaks:
+                # قبل تصفير الذروة تُحفظ ذروة المرحلة الخارجية حتى الآن
+                self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+            if _reset_peak is not None:
+                _reset_peak()
+            self._peaks.append(0)
+        status = STATUS_ERROR
+        t0 = time.perf_counter()
+        try:
+            yield
+            status = STATUS_OK
+        finally:
+            seconds = time.perf_counter() - t0
+            peak_mb = None
+            if self.memory:
+                peak = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+                peak_mb = peak / 1024 ** 2
+            self.records.append(StageRecord(self.run_id, time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                            tab or self._tab or "", stage, seconds, peak_mb, status))
+
+    def frame(self):
+        return records_frame(self.records)
+
+    def close(self, log_path=PROFILE_LOG_PATH):
+        """ينهي التتبع ويصدر سجلات هذا التشغيل (مرة واحدة) إلى logger وإلى ملف JSON lines إن حُدد."""
+        if self._tracing:
+            _release_tracing()
+            self._tracing = False
+        records, self.records = self.records, []
+        if records:
+            export_records(records, log_path)
+        return records
+
+
+def records_frame(records):
+    return pd.DataFrame([r._asdict() for r in records], columns=StageRecord._fields)
+
+
+def to_jsonl(records):
+    return "".join(json.dumps(r._asdict(), ensure_ascii=False) + "\n" for r in records)
+
+
+def export_records(records, path=None):
+    """سجل منظم لكل مرحلة: رسالة JSON عبر logging ("governance.profile")، وإلحاق بملف JSON lines إن حُدد المسار."""
+    if logger.isEnabledFor(logging.INFO):
+        for r in records:
+            logger.info(json.dumps(r._asdict(), ensure_ascii=False))
+    if path:
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with _log_lock, open(path, "a", encoding="utf-8") as fh:
+            fh.write(to_jsonl(records))
+
+
+def stage_summary(records):
+    """جدول تبويب × مرحلة: وسيط الزمن وأقصاه وأقصى ذروة ذاكرة عبر التشغيلات المسجلة."""
+    df = records_frame(records)
+    if df.empty:
+        return pd.DataFrame(columns=["tab", "stage", "runs", "median_s", "max_s", "peak_mb"])
+    df["peak_mb"] = pd.to_numeric(df["peak_mb"])
+    summary = df.groupby(["tab", "stage"], sort=False).agg(
+        runs=("run_id", "nunique"), median_s=("seconds", "median"), max_s=("seconds", "max"),
+        peak_mb=("peak_mb", "max"),
+    ).reset_index()
+    order = {s: i for i, s in enumerate(STAGES)}
+    return summary.sort_values(["tab", "stage"], key=lambda c: c.map(order) if c.name == "stage" else c,
+                               kind="stable").reset_index(drop=True)
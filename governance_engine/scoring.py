@@ -0,0 +1,87 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# المؤشرات الفرعية بنفس ترتيب الأعمدة المطلوبة في ملفات التقييم
+INDICATORS = ["Transparency", "Board_Independence", "Audit_Committee", "Risk_Committee", "Shareholder_Rights"]
+WEIGHTS = np.array([0.25, 0.25, 0.2, 0.15, 0.15])
+
+# أنظمة الأوزان المعتمدة، بنفس ترتيب INDICATORS؛ تُقبل أسماؤها في أي معامل weights
+DEFAULT_SCHEME = "الافتراضي"
+WEIGHT_SCHEMES = {
+    DEFAULT_SCHEME: WEIGHTS,
+    "متساوي": np.full(len(INDICATORS), 1 / len(INDICATORS)),
+    "تركيز رقابي": np.array([0.15, 0.2, 0.3, 0.25, 0.1]),
+    "تركيز على المساهمين": np.array([0.3, 0.15, 0.15, 0.1, 0.3]),
+}
+
+# حدود التصنيف: مرتفع >= 8، متوسط >= 5، منخفض أقل من ذلك
+HIGH_THRESHOLD = 8.0
+MEDIUM_THRESHOLD = 5.0
+BAND_LOW, BAND_MEDIUM, BAND_HIGH = 0, 1, 2
+BAND_LABELS = ("منخفض", "متوسط", "مرتفع")
+
+ScoreResult = namedtuple("ScoreResult", ["scores", "bands"])
+
+
+def as_matrix(data, dtype=np.float64):
+    """يحوّل DataFrame أو مصفوفة إلى مصفوفة (صفوف × 5) من المؤشرات الفرعية."""
+    if isinstance(data, pd.DataFrame):
+        missing = [col for col in INDICATORS if col not in data.columns]
+        if missing:
+            raise KeyError(f"missing governance columns: {missing}")
+        values = data[INDICATORS].to_numpy(dtype=dtype)
+    else:
+        values = np.asarray(data, dtype=dtype)
+        if values.ndim == 1:
+            values = values.reshape(1, -1)
+    if values.ndim != 2 or values.shape[1] != len(INDICATORS):
+        raise ValueError(f"expected a (n, {len(INDICATORS)}) matrix, got shape {values.shape}")
+    return values
+
+
+def _weights(weights):
+    if weights is None:
+        return WEIGHTS
+    if isinstance(weights, str):
+        if weights not in WEIGHT_SCHEMES:
+            raise KeyError(f"unknown weight scheme {weights!r}; expected one of {list(WEIGHT_SCHEMES)}")
+        return WEIGHT_SCHEMES[weights]
+    w = np.asarray(weights, dtype=np.float64)
+    if w.shape != (len(INDICATORS),):
+        raise ValueError(f"expected {len(INDICATORS)} weights, got shape {w.shape}")
+    return w
+
+
+def register_weight_scheme(name, weights):
+    """يضيف نظام أوزان إلى السجل بعد التحقق من أنه غير سالب ومجموعه 1."""
+    w = _weights(np.asarray(weights, dtype=np.float64))
+    if np.any(w < 0) or not np.isclose(w.sum(), 1.0):
+        raise ValueError("weights must be non-negative and sum to 1")
+    WEIGHT_SCHEMES[str(name)] = w.copy()
+    return WEIGHT_SCHEMES[str(name)]
+
+
+def compute_scores(data, weights=None):
+    """مؤشر الحوكمة الكلي (متوسط مرجّح) لكل صف في استدعاء واحد."""
+    return as_matrix(data) @ _weights(weights)
+
+
+def rating_bands(scores):
+    """يعيد رمز التصنيف لكل درجة: 0 منخفض، 1 متوسط، 2 مرتفع."""
+    scores = np.asarray(scores)
+    bands = np.full(scores.shape, BAND_LOW, dtype=np.int8)
+    bands[scores >= MEDIUM_THRESHOLD] = BAND_MEDIUM
+    bands[scores >= HIGH_THRESHOLD] = BAND_HIGH
+    return bands
+
+
+def score_batch(data, weights=None):
+    scores = compute_scores(data, weights)
+    return ScoreResult(scores, rating_bands(scores))
+
+
+def contributions(data, weights=None):
+    """المساهمة النسبية (%) لكل مؤشر فرعي في المؤشر الكلي."""
+    return as_matrix(data) * _weights(weights) * 10
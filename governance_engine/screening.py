@@ -0,0 +1,172 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .ingest import ISSUE_MISSING, ISSUE_NON_NUMERIC, ISSUE_OUT_OF_RANGE
+from .scoring import INDICATORS
+from .store import period_value
+
+ISSUE_DUPLICATE = "duplicate"
+ISSUE_JUMP = "jump"
+ISSUE_ROBUST_Z = "robust_z"
+ISSUE_MAHALANOBIS = "mahalanobis"
+ISSUES = [ISSUE_MISSING, ISSUE_NON_NUMERIC, ISSUE_OUT_OF_RANGE, ISSUE_DUPLICATE, ISSUE_JUMP, ISSUE_ROBUST_Z,
+          ISSUE_MAHALANOBIS]
+# عمود المشكلات التي تخص الصف كله (القيم الشاذة متعددة المتغيرات)
+ALL_COLUMNS = "*"
+
+# أقصى تغير مقبول في مؤشر بين فترتين متتاليتين لنفس المؤسسة (نقاط على مقياس 0-10)
+DEFAULT_JUMP = 3.0
+# حد z المعدّل: 0.6745 × (x - الوسيط) / MAD. الحد التقليدي 3.5 (Iglewicz و Hoaglin) يعلّم مئات الخلايا
+# السليمة في ملف بملايين الصفوف، فالافتراضي أعلى منه
+DEFAULT_ROBUST_Z = 5.0
+# احتمال توزيع كاي تربيع الذي يحدد عتبة مسافة ماهالانوبيس (نحو 10 صفوف سليمة في كل مليون)
+DEFAULT_OUTLIER_P = 0.99999
+
+ScreenResult = namedtuple("ScreenResult", ["issues", "flagged", "summary"])
+
+
+def _issues(index, rows, column, values, issue):
+    return pd.DataFrame({"row": index[rows], "column": column, "value": np.asarray(values, dtype=object).astype(str),
+                         "issue": issue})
+
+
+def _period_numbers(periods):
+    """رقم الفترة بالسنوات لكل صف، محسوبًا مرة لكل قيمة مختلفة؛ NaN للفترات غير المفهومة."""
+    codes, uniques = pd.factorize(periods)
+    numbers = np.empty(len(uniques))
+    for i, label in enumerate(uniques):
+        try:
+            numbers[i] = period_value(label)
+        except (TypeError, ValueError):
+            numbers[i] = np.nan
+    return np.where(codes >= 0, numbers[np.maximum(codes, 0)], np.nan)
+
+
+def duplicate_rows(df, entity_col, period_col=None):
+    """كل الصفوف المكررة لنفس (المؤسسة، الفترة)، أو لنفس المؤسسة إن لم يوجد عمود فترة."""
+    keys = [entity_col] + ([period_col] if period_col is not None else [])
+    return df.duplicated(subset=keys, keep=False).to_numpy() & df[keys].notna().all(axis=1).to_numpy()
+
+
+def jump_mask(values, entities, periods, threshold=DEFAULT_JUMP):
+    """(صفوف × أعمدة) صحيح حيث تغيّر المؤشر عن المشاهدة السابقة لنفس المؤسسة بأكثر من threshold، مع القيمة السابقة.
+
+    ترتيب واحد حسب (المؤسسة، الفترة) ثم فرق متجه بين كل صف والذي قبله في نفس المؤسسة.
+    """
+    entity_codes = pd.factorize(entities)[0]
+    t = _period_numbers(periods)
+    order = np.lexsort((t, entity_codes))
+    ordered = values[order]
+    same = np.zeros(len(order), dtype=bool)
+    same[1:] = (entity_codes[order][1:] == entity_codes[order][:-1]) & (entity_codes[order][1:] >= 0) \
+        & np.isfinite(t[order][1:]) & np.isfinite(t[order][:-1])
+    previous = np.full(values.shape, np.nan)
+    previous[order[1:]] = ordered[:-1]
+    previous[order[~same]] = np.nan
+    with np.errstate(invalid="ignore"):
+        return np.abs(values - previous) > threshold, previous
+
+
+def robust_z(values):
+    """z المعدّل لكل عمود: 0.6745 × (x - الوسيط) / MAD، وعند MAD = 0 يُستخدم متوسط الانحراف المطلق × 1.2533."""
+    median = np.nanmedian(values, axis=0)
+    deviation = np.abs(values - median)
+    mad = np.nanmedian(deviation, axis=0)
+    scale = np.where(mad > 0, mad / 0.6745, 1.253314 * np.nanmean(deviation, axis=0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = (values - median) / scale
+    # عمود ثابت تمامًا: لا قيمة شاذة فيه
+    z[:, ~(scale > 0)] = 0.0
+    return z
+
+
+def mahalanobis(values, inliers=None):
+    """مربع مسافة ماهالانوبيس لكل صف كامل، بمتوسط وتغاير مقدرين من صفوف inliers فقط (NaN للصفوف الناقصة).
+
+    تقدير المتوسط والتغاير من الصفوف غير الشاذة أحاديًا يمنع القيم الشاذة من تضخيم التغاير وإخفاء نفسها.
+    """
+    complete = ~np.isnan(values).any(axis=1)
+    base = complete if inliers is None else complete & inliers
+    d2 = np.full(len(values), np.nan)
+    if base.sum() <= values.shape[1]:
+        return d2
+    center = values[base].mean(axis=0)
+    precision = np.linalg.pinv(np.cov(values[base], rowvar=False))
+    diff = values[complete] - center
+    d2[complete] = np.einsum("ij,jk,ik->i", diff, precision, diff)
+    return d2
+
+
+def screen_frame(df, entity_col=None, period_col=None, columns=None, base_issues=None, jump=DEFAULT_JUMP,
+                 z_threshold=DEFAULT_ROBUST_Z, outlier_p=DEFAULT_OUTLIER_P):
+    """فحص الجدول كله في تمريرة متجهة واحدة، ويعيد تقرير مشكلات بنفس صيغة validate_frame.
+
+    يُضاف إلى base_issues (مشكلات القيم الناقصة وغير الرقمية وخارج المدى من ingest) ما يلي:
+    الصفوف المكررة لنفس المؤسسة والفترة، والقفزات بين فترتين متتاليتين لنفس المؤسسة، والقيم
+    الشاذة أحاديًا (z المعدّل) ومتعددة المتغيرات (مسافة ماهالانوبيس فوق مئين كاي تربيع outlier_p).
+    القفزات بنقاط مقياس المؤشرات، و jump=None يلغي فحصها للأعمدة ذات المقاييس الأخرى.
+    flagged قناع بطول الجدول للصفوف التي لها مشكلة واحدة على الأقل.
+    """
+    columns = [c for c in (INDICATORS if columns is None else columns) if c in df.columns]
+    values = df[columns].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64) if columns \
+        else np.empty((len(df), 0))
+    index = df.index.to_numpy()
+    found = [] if base_issues is None or base_issues.empty else [base_issues]
+
+    if entity_col is not None and entity_col in df.columns:
+        dup = np.flatnonzero(duplicate_rows(df, entity_col, period_col))
+        if dup.size:
+            # التحويل إلى نص للصفوف المكررة فقط لا للعمود كله
+            labels = df[entity_col].iloc[dup].astype(str).to_numpy()
+            if period_col is not None:
+                labels = labels + " / " + df[period_col].iloc[dup].astype(str).to_numpy()
+            found.append(_issues(index, dup, entity_col, labels, ISSUE_DUPLICATE))
+        if jump is not None and period_col is not None and period_col in df.columns and columns:
+            jumps, previous = jump_mask(values, df[entity_col].to_numpy(), df[period_col].to_numpy(), jump)
+            for j, col in enumerate(columns):
+                rows = np.flatnonzero(jumps[:, j])
+                if rows.size:
+                    text = np.char.add(np.char.add(np.round(previous[rows, j], 2).astype(str), " → "),
+                                       np.round(values[rows, j], 2).astype(str))
+                    found.append(_issues(index, rows, col, text, ISSUE_JUMP))
+
+    inliers = None
+    if columns and len(df):
+        z = robust_z(values)
+        with np.errstate(invalid="ignore"):
+            extreme = np.abs(z) > z_threshold
+        for j, col in enumerate(columns):
+            rows = np.flatnonzero(extreme[:, j])
+            if rows.size:
+                found.append(_issues(index, rows, col, np.round(values[rows, j], 4), ISSUE_ROBUST_Z))
+        inliers = ~extreme.any(axis=1)
+
+    if len(columns) >= 2 and len(df):
+        from scipy.stats import chi2
+
+        d2 = mahalanobis(values, inliers)
+        with np.errstate(invalid="ignore"):
+            rows = np.flatnonzero(d2 > chi2.ppf(outlier_p, len(columns)))
+        if rows.size:
+            found.append(_issues(index, rows, ALL_COLUMNS, np.char.add("d²=", np.round(d2[rows], 1).astype(str)),
+                                 ISSUE_MAHALANOBIS))
+
+    if found:
+        issues = pd.concat(found, ignore_index=True).sort_values(["row", "column"], kind="stable").reset_index(drop=True)
+    else:
+        issues = pd.DataFrame({"row": pd.Series(dtype=np.int64), "column": pd.Series(dtype=object),
+                               "value": pd.Series(dtype=object), "issue": pd.Series(dtype=object)})
+    flagged = df.index.isin(issues["row"].unique())
+    return ScreenResult(issues, flagged, issue_summary(issues))
+
+
+def issue_summary(issues):
+    """التقرير المختصر: لكل نوع مشكلة وعمود عدد الخلايا وعدد الصفوف المتأثرة، بترتيب ISSUES."""
+    if issues.empty:
+        return pd.DataFrame(columns=["issue", "column", "cells", "rows"])
+    summary = issues.groupby(["issue", "column"], sort=False).agg(cells=("row", "size"), rows=("row", "nunique"))
+    order = {issue: i for i, issue in enumerate(ISSUES)}
+    return summary.reset_index().sort_values(["issue", "cells"], key=lambda c: c.map(order) if c.name == "issue"
+                                             else -c, kind="stable").reset_index(drop=True)
@@ -0,0 +1,151 @@
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .scoring import INDICATORS, _weights, as_matrix
+
+DEFAULT_SCHEMES = 2000
+DEFAULT_CONCENTRATION = 50.0
+DEFAULT_TOP_K = 10
+# حد عناصر مصفوفة الدرجات (أنظمة × مؤسسات) في الدفعة الواحدة
+CHUNK_ELEMENTS = 4_000_000
+# حد أزواج المؤسسات في حساب Kendall tau: كل الأزواج إذا كانت أقل، وإلا عينة عشوائية بهذا الحجم
+# (الخطأ المعياري للتقدير لا يتجاوز 1/sqrt(TAU_PAIRS) ≈ 0.003)
+TAU_PAIRS = 100_000
+
+SensitivityResult = namedtuple(
+    "SensitivityResult", ["schemes", "kendall_tau", "top_k_churn", "entities", "top_k", "base_weights"]
+)
+
+
+def sample_simplex(n_schemes, center=None, concentration=DEFAULT_CONCENTRATION, seed=None):
+    """أوزان عشوائية من المبسط (كل صف غير سالب ومجموعه 1) بتوزيع Dirichlet.
+
+    مع center تتمركز العينات حول الأوزان المعطاة، وكلما كبرت concentration قلّ الابتعاد عنها؛
+    بدونه يكون التوزيع منتظمًا على المبسط.
+    """
+    rng = np.random.default_rng(seed)
+    k = len(INDICATORS)
+    alpha = np.ones(k) if center is None else np.maximum(_weights(center) * concentration, 1e-3)
+    return rng.dirichlet(alpha, size=int(n_schemes))
+
+
+def _ranks(scores):
+    """رتبة كل مؤسسة (1 = الأعلى درجة) في كل صف من مصفوفة (أنظمة × مؤسسات)، مع كسر التعادل بترتيب المؤسسات."""
+    order = np.argsort(-scores, axis=1)
+    ordered = np.take_along_axis(scores, order, axis=1)
+    tied = (ordered[:, 1:] == ordered[:, :-1]).any(axis=1)
+    if tied.any():
+        # الترتيب المستقر أبطأ بعدة مرات، فلا يُستخدم إلا للصفوف التي فيها تعادل فعلًا
+        order[tied] = np.argsort(-scores[tied], axis=1, kind="stable")
+    ranks = np.empty(scores.shape, dtype=np.int32)
+    np.put_along_axis(ranks, order, np.arange(1, scores.shape[1] + 1, dtype=np.int32)[None, :], axis=1)
+    return ranks
+
+
+def _tau_pairs(n, max_pairs=TAU_PAIRS, seed=None):
+    """أزواج المؤسسات (i, j) لحساب Kendall tau: كلها إن لم تتجاوز max_pairs، وإلا عينة عشوائية منها."""
+    if n * (n - 1) // 2 <= max_pairs:
+        return np.triu_indices(n, 1)
+    rng = np.random.default_rng(seed)
+    i = rng.integers(0, n, max_pairs)
+    j = (i + rng.integers(1, n, max_pairs)) % n
+    # مرتبة حسب i لتقرأ الدفعات الرتب بترتيب الذاكرة تقريبًا
+    order = np.lexsort((j, i))
+    return i[order], j[order]
+
+
+def _kendall_tau(ranks, base_rank, pairs):
+    """Kendall tau لكل صف من رتب (أنظمة × مؤسسات) مقارنة بالرتب الأساسية، في تمريرة واحدة على الأزواج.
+
+    الرتب بلا تعادل، فـ tau = 1 - 2 × (الأزواج المعكوسة / عدد الأزواج)؛ دقيق مع كل الأزواج، وتقدير
+    غير متحيز مع عينة منها.
+    """
+    i, j = pairs
+    base_ahead = base_rank[i] < base_rank[j]
+    discordant = np.zeros(len(ranks), dtype=np.int64)
+    step = max(1, CHUNK_ELEMENTS // len(ranks))
+    for start in range(0, len(i), step):
+        pi, pj = i[start:start + step], j[start:start + step]
+        discordant += ((ranks[:, pi] < ranks[:, pj]) != base_ahead[start:start + step]).sum(axis=1)
+    return 1.0 - 2.0 * discordant / len(i)
+
+
+def weight_sensitivity(data, schemes=DEFAULT_SCHEMES, base_weights=None, ids=None, top_k=DEFAULT_TOP_K,
+                       concentration=DEFAULT_CONCENTRATION, seed=None, time_budget=None):
+    """ثبات ترتيب المؤسسات عند تغيير أوزان المؤشر الكلي.
+
+    schemes إما عدد الأنظمة المسحوبة حول base_weights أو مصفوفة (أنظمة × 5). درجات كل
+    دفعة من الأنظمة تُحسب بضرب مصفوفة واحد (أنظمة × مؤشرات) @ (مؤشرات × مؤسسات)، ولا
+    يُحفظ منها إلا مجاميع الرتب لكل مؤسسة، و Kendall tau ونسبة التغير في أعلى k لكل نظام
+    مقارنة بالترتيب الأساسي. Kendall tau دقيق حتى TAU_PAIRS زوجًا من المؤسسات (نحو 450 مؤسسة)،
+    وبعدها يُقدَّر من عينة ثابتة من الأزواج نفسها لكل الأنظمة.
+
+    time_budget بالثواني حد أمان فقط: يوقف الدفعات المتبقية بعد اكتمال دفعة واحدة على الأقل، وتُحسب
+    النتائج عندها من الأنظمة التي اكتملت فقط (عددها len(result.schemes)).
+    """
+    started = time.perf_counter()
+    X = as_matrix(data)
+    valid = ~np.isnan(X).any(axis=1)
+    X = X[valid]
+    ids = np.arange(len(valid)) if ids is None else np.asarray(ids)
+    ids = ids[valid]
+    n = X.shape[0]
+    if n < 2:
+        raise ValueError("need at least two entities with complete indicators")
+    base = _weights(base_weights)
+    if np.isscalar(schemes):
+        W = sample_simplex(int(schemes), center=base, concentration=concentration, seed=seed)
+    else:
+        W = np.atleast_2d(np.asarray(schemes, dtype=np.float64))
+        if W.shape[1] != len(INDICATORS):
+            raise ValueError(f"expected schemes of shape (m, {len(INDICATORS)}), got {W.shape}")
+    top_k = int(min(max(top_k, 1), n))
+
+    base_scores = X @ base
+    base_rank = _ranks(base_scores[None, :])[0]
+    base_top = base_rank <= top_k
+    pairs = _tau_pairs(n, seed=seed)
+
+    m = W.shape[0]
+    rank_sum = np.zeros(n)
+    rank_sq = np.zeros(n)
+    rank_min = np.full(n, n, dtype=np.int32)
+    rank_max = np.zeros(n, dtype=np.int32)
+    top_count = np.zeros(n, dtype=np.int64)
+    tau = np.empty(m)
+    churn = np.empty(m)
+
+    step = max(1, CHUNK_ELEMENTS // n)
+    done = 0
+    for start in range(0, m, step):
+        if done and time_budget is not None and time.perf_counter() - started > time_budget:
+            break
+        block = W[start:start + step]
+        # أنظمة × مؤسسات: كل ترتيب على صف متصل في الذاكرة
+        ranks = _ranks(block @ X.T)
+        rank_sum += ranks.sum(axis=0)
+        rank_sq += (ranks.astype(np.float64) ** 2).sum(axis=0)
+        np.minimum(rank_min, ranks.min(axis=0), out=rank_min)
+        np.maximum(rank_max, ranks.max(axis=0), out=rank_max)
+        in_top = ranks <= top_k
+        top_count += in_top.sum(axis=0)
+        churn[start:start + len(block)] = (~in_top[:, base_top]).sum(axis=1) / top_k
+        tau[start:start + len(block)] = _kendall_tau(ranks, base_rank, pairs)
+        done = start + len(block)
+
+    m = done
+    mean_rank = rank_sum / m
+    entities = pd.DataFrame({
+        "entity": ids,
+        "base_score": base_scores,
+        "base_rank": base_rank,
+        "mean_rank": mean_rank,
+        "rank_std": np.sqrt(np.clip(rank_sq / m - mean_rank ** 2, 0.0, None)),
+        "best_rank": rank_min,
+        "worst_rank": rank_max,
+        "top_k_share": top_count / m,
+    }).sort_values("base_rank").reset_index(drop=True)
+    return SensitivityResult(W[:m], tau[:m], churn[:m], entities, top_k, base)
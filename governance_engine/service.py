@@ -0,0 +1,620 @@
+import argparse
+import asyncio
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from urllib.parse import parse_qsl
+
+import numpy as np
+
+from .allocation import ALLOCATORS, METHOD_PROPORTIONAL
+from .cache import LRUCache, content_hash, make_key
+from .portfolio import DEFAULT_LAMBDA, PortfolioProblem, covariance_structure, default_covariance, heuristic_weights
+from .scoring import BAND_LABELS, INDICATORS, score_batch
+from .simulation import FAST_DAYS, SHOCK_IMPACT, SLOW_DAYS, adjustment_duration
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_ENTRIES = int(os.environ.get("GOVERNANCE_SERVICE_CACHE", "4096"))
+DEFAULT_CACHE_BYTES = int(os.environ.get("GOVERNANCE_SERVICE_CACHE_MB", "256")) * 1024 * 1024
+# الاستجابات الأكبر من هذا الحجم لا تُحفظ: طلب واحد كبير لا يُخلي كل الاستجابات الصغيرة المتكررة
+MAX_CACHED_RESPONSE_BYTES = 8 << 20
+# تكلفة optimize و simulate لا يحددها حجم الجسم (مسألة CVXPY كثيفة واحدة أو صدمة على جدول صغير قد تستغرق ثواني)،
+# فتُحسب دائمًا في خيط منفصل؛ score و allocate خفيفتان وتبقيان في حلقة الأحداث ما لم يتجاوز الجسم OFFLOAD_BYTES
+OFFLOAD_ENDPOINTS = ("simulate", "optimize")
+OFFLOAD_BYTES = 1 << 20
+MAX_BODY_BYTES = 256 << 20
+# حد زمني لكل (نقطة، حجم دفعة) في القياس: optimize بدفعات كبيرة يحل مئات مسائل CVXPY في كل طلب
+BENCH_MAX_SECONDS = 10.0
+# حد لعدد الصفوف المولدة لكل خلية: الأجسام تُجهز مسبقًا حتى لا يدخل توليدها في الزمن
+BENCH_MAX_ROWS = 2_000_000
+
+FORMAT_JSON = "application/json"
+FORMAT_JSONL = "application/x-ndjson"
+FORMAT_ARROW = "application/vnd.apache.arrow.stream"
+FORMATS = {"json": FORMAT_JSON, "jsonl": FORMAT_JSONL, "ndjson": FORMAT_JSONL, "arrow": FORMAT_ARROW}
+EXTENSIONS = {".json": FORMAT_JSON, ".jsonl": FORMAT_JSONL, ".ndjson": FORMAT_JSONL, ".arrow": FORMAT_ARROW}
+
+# مسار كل نقطة: score و simulate جداول (صف لكل كيان)، و allocate و optimize مسائل مستقلة (عنصر لكل مسألة)
+ROW_ENDPOINTS = ("score", "simulate")
+ITEM_ENDPOINTS = ("allocate", "optimize")
+ENDPOINTS = ROW_ENDPOINTS + ITEM_ENDPOINTS
+ID_COLUMN = "id"
+
+METHOD_CVXPY = "cvxpy"
+METHOD_HEURISTIC = "heuristic"
+
+BenchResult = namedtuple("BenchResult", ["endpoint", "batch", "requests", "concurrency", "seconds", "throughput",
+                                         "rows_per_s", "p50_ms", "p95_ms", "p99_ms", "errors"])
+
+
+class PayloadError(ValueError):
+    """طلب غير صالح (صيغة أو أعمدة أو قيم)، يُعاد للعميل بالحالة 400."""
+
+
+# --- الترميز: كل الصيغ تُحوَّل إلى أعمدة (اسم ← مصفوفة) أو قائمة عناصر ---
+
+def _media_type(value, default=FORMAT_JSON):
+    value = (value or "").split(";")[0].strip().lower()
+    if not value or value == "*/*":
+        return default
+    if value in FORMATS:
+        return FORMATS[value]
+    if value in (FORMAT_JSON, FORMAT_JSONL, FORMAT_ARROW):
+        return value
+    if value in ("application/jsonl", "application/json-lines", "text/jsonl"):
+        return FORMAT_JSONL
+    raise PayloadError(f"unsupported media type {value!r}")
+
+
+def decode_items(body, media_type):
+    """قائمة العناصر (قواميس) من JSON (عنصر أو قائمة) أو JSON lines (سطر لكل عنصر) أو Arrow (صف لكل عنصر)."""
+    try:
+        if media_type == FORMAT_ARROW:
+            import pyarrow as pa
+
+            return pa.ipc.open_stream(body).read_all().to_pylist()
+        if media_type == FORMAT_JSONL:
+            items = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            data = json.loads(body) if body else []
+            items = data if isinstance(data, list) else [data]
+    except (ValueError, OSError) as exc:  # pyarrow.ArrowInvalid مشتق من ValueError
+        raise PayloadError(f"cannot decode {media_type} body: {exc}") from exc
+    if not all(isinstance(item, dict) for item in items):
+        raise PayloadError("every item must be a JSON object")
+    return items
+
+
+def decode_columns(body, media_type):
+    """أعمدة الدفعة: Arrow يُقرأ عمودًا عمودًا دون المرور بقواميس الصفوف."""
+    if media_type == FORMAT_ARROW:
+        import pyarrow as pa
+
+        try:
+            table = pa.ipc.open_stream(body).read_all()
+        except (ValueError, OSError) as exc:
+            raise PayloadError(f"cannot decode {media_type} body: {exc}") from exc
+        return {name: table.column(name).to_numpy(zero_copy_only=False) for name in table.column_names}
+    items = decode_items(body, media_type)
+    # قوائم عادية: np.asarray(..., float) عليها أسرع من مصفوفات object، والقيم الناقصة تصبح NaN
+    names = dict.fromkeys(key for item in items for key in item)
+    return {name: [item.get(name) for item in items] for name in names}
+
+
+def _jsonable(value):
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    if isinstance(value, list):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, (np.floating, np.integer)):
+        return _jsonable(value.item())
+    return value
+
+
+def _column_values(column):
+    column = np.asarray(column)
+    if column.dtype.kind == "f" and not np.isfinite(column).all():
+        # NaN و inf ليست JSON صالحًا: تُستبدل بـ null للعمود كله دفعة واحدة
+        return np.where(np.isfinite(column), column, None).tolist()
+    return column.tolist()
+
+
+def _records(columns):
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*(_column_values(columns[name]) for name in names))]
+
+
+def encode(result, media_type):
+    """result: أعمدة (قاموس مصفوفات) أو قائمة عناصر. JSON يعيد قائمة، و JSON lines سطرًا لكل صف."""
+    if media_type == FORMAT_ARROW:
+        import pyarrow as pa
+
+        table = (pa.Table.from_pylist(result) if isinstance(result, list)
+                 else pa.table({name: np.asarray(col) for name, col in result.items()}))
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue()
+    records = [{k: _jsonable(v) for k, v in r.items()} for r in result] if isinstance(result, list) \
+        else _records(result)
+    if media_type == FORMAT_JSONL:
+        return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+    return json.dumps(records, ensure_ascii=False).encode("utf-8")
+
+
+# --- النوى: دفعة كاملة في استدعاء متجه واحد ---
+
+def _numeric(columns, name, default=None):
+    if name not in columns:
+        if default is None:
+            raise PayloadError(f"missing field {name!r}")
+        return np.full(_rows(columns), float(default))
+    try:
+        values = np.asarray(columns[name], dtype=np.float64)
+    except (TypeError, ValueError) as exc:
+        raise PayloadError(f"field {name!r} must be numeric") from exc
+    if np.isnan(values).any():
+        raise PayloadError(f"field {name!r} has missing values")
+    return values
+
+
+def _rows(columns):
+    return len(next(iter(columns.values()))) if columns else 0
+
+
+def _with_id(columns, result):
+    if ID_COLUMN in columns:
+        return {ID_COLUMN: columns[ID_COLUMN], **result}
+    return result
+
+
+def score_columns(columns, scheme=None):
+    """مؤشر الحوكمة والتصنيف لكل صف من المؤشرات الفرعية الخمسة."""
+    if not _rows(columns):
+        return {"Governance_Score": np.empty(0), "band": np.empty(0, dtype=np.int8), "rating": np.empty(0)}
+    try:
+        result = score_batch(np.column_stack([_numeric(columns, name) for name in INDICATORS]), scheme)
+    except KeyError as exc:
+        raise PayloadError(exc.args[0]) from exc
+    return _with_id(columns, {
+        "Governance_Score": result.scores,
+        "band": result.bands,
+        "rating": np.asarray(BAND_LABELS, dtype=object)[result.bands],
+    })
+
+
+def _impacts(columns):
+    """معامل الصدمة لكل صف: shock_impact إن وُجد، وإلا من shock_type (يمكن خلط الطريقتين في الدفعة)."""
+    n = _rows(columns)
+    try:
+        impacts = np.asarray(columns.get("shock_impact", np.full(n, np.nan)), dtype=np.float64).copy()
+    except (TypeError, ValueError) as exc:
+        raise PayloadError("field 'shock_impact' must be numeric") from exc
+    missing = np.isnan(impacts)
+    if missing.any():
+        if "shock_type" not in columns:
+            raise PayloadError("missing field 'shock_type' (or 'shock_impact')")
+        # البحث في القاموس لكل قيمة مختلفة فقط، ثم التوزيع على الصفوف
+        shocks = np.asarray(columns["shock_type"], dtype=object)[missing].astype(str)
+        names, inverse = np.unique(shocks, return_inverse=True)
+        impacts[missing] = np.array([SHOCK_IMPACT.get(name, np.nan) for name in names.tolist()])[inverse]
+    if np.isnan(impacts).any():
+        raise PayloadError(f"unknown shock_type; expected one of {list(SHOCK_IMPACT)}")
+    return impacts
+
+
+def simulate_columns(columns, scheme=None):
+    """زمن تعديل رأس المال (مقربًا كما في simulate_adjustment) وفئة السرعة لكل صف.
+
+    درجة الحوكمة من الحقل governance_score، أو تُحسب من المؤشرات الفرعية إن لم يوجد.
+    """
+    if not _rows(columns):
+        return {"duration": np.empty(0), "speed": np.empty(0, dtype=np.int8)}
+    if "governance_score" in columns:
+        g = _numeric(columns, "governance_score")
+    else:
+        g = score_columns(columns, scheme)["Governance_Score"]
+    duration = np.round(adjustment_duration(_numeric(columns, "capital"), g, _impacts(columns)), 2)
+    return _with_id(columns, {
+        "governance_score": g,
+        "duration": duration,
+        "speed": np.select([duration <= FAST_DAYS, duration <= SLOW_DAYS], [0, 1], 2).astype(np.int8),
+    })
+
+
+def _vector(item, name, default=None, n=None, ndim=1):
+    """حقل رقمي بعدد أبعاد ndim؛ مع n تُوسَّع القيمة المفردة إلى n قيمة."""
+    value = item.get(name, default)
+    if value is None:
+        raise PayloadError(f"missing field {name!r}")
+    try:
+        value = np.asarray(value, dtype=np.float64)
+    except (TypeError, ValueError) as exc:
+        raise PayloadError(f"field {name!r} must be numeric") from exc
+    if n is not None:
+        value = np.broadcast_to(value, (n,)) if value.ndim == 0 else value
+        if value.shape != (n,):
+            raise PayloadError(f"field {name!r} must have {n} values")
+    if value.ndim != ndim or value.size == 0:
+        raise PayloadError(f"field {name!r} must be a non-empty {'list' if ndim == 1 else 'matrix'} of numbers")
+    return value
+
+
+def _scalar(item, name, default=None):
+    value = item.get(name, default)
+    if value is None:
+        raise PayloadError(f"missing field {name!r}")
+    try:
+        return float(value)
+    except (TypeError, ValueError) as exc:
+        raise PayloadError(f"field {name!r} must be a number") from exc
+
+
+def allocate_item(item):
+    """مسألة توزيع واحدة (التبويب 5): governance لكل وحدة، total_capital، shock_type أو shock_impact."""
+    g = _vector(item, "governance")
+    if item.get("shock_impact") is not None:
+        impact = _scalar(item, "shock_impact")
+    elif isinstance(item.get("shock_type"), str) and item["shock_type"] in SHOCK_IMPACT:
+        impact = SHOCK_IMPACT[item["shock_type"]]
+    else:
+        raise PayloadError(f"unknown shock_type; expected one of {list(SHOCK_IMPACT)}")
+    method = item.get("method", METHOD_PROPORTIONAL)
+    if not isinstance(method, str) or method not in ALLOCATORS:
+        raise PayloadError(f"unknown method {method!r}; expected one of {list(ALLOCATORS)}")
+    max_alloc = None if item.get("max_alloc") is None else _scalar(item, "max_alloc")
+    result = ALLOCATORS[method](g, _scalar(item, "total_capital", 0.0), impact,
+                                min_gov=_scalar(item, "min_gov", 0.0), max_alloc=max_alloc)
+    return {"alloc": result.alloc, "duration": result.duration, "eligible": result.eligible.tolist(),
+            "unallocated": result.unallocated}
+
+
+class Optimizer:
+    """مسائل CVXPY المعلمية (التبويب 6) محفوظة لكل (عدد الأصول، المحلل، بنية التغاير)، كما في التطبيق."""
+
+    def __init__(self, max_problems=64):
+        self.problems = LRUCache(max_problems, max_bytes=None)
+
+    def problem(self, n, solver, structure):
+        return self.problems.get_or_compute((n, solver, structure), PortfolioProblem, n, solver, structure)
+
+    def solve(self, item):
+        r = _vector(item, "returns")
+        n = len(r)
+        lower = _vector(item, "lower", 0.0, n)
+        upper = _vector(item, "upper", 1.0, n)
+        method = item.get("method", METHOD_CVXPY)
+        if not isinstance(method, str):
+            raise PayloadError(f"unknown method {method!r}; expected {METHOD_CVXPY!r} or {METHOD_HEURISTIC!r}")
+        if method == METHOD_HEURISTIC:
+            return {"weights": heuristic_weights(r, lower, upper), "status": "heuristic", "objective": None}
+        if method != METHOD_CVXPY:
+            raise PayloadError(f"unknown method {method!r}; expected {METHOD_CVXPY!r} or {METHOD_HEURISTIC!r}")
+        cov = default_covariance(n) if item.get("cov") is None else _vector(item, "cov", ndim=2)
+        if cov.shape != (n, n):
+            raise PayloadError(f"field 'cov' must be a {n}x{n} matrix")
+        problem = self.problem(n, item.get("solver"), covariance_structure(cov))
+        solution = problem.solve(r, lower, upper, _scalar(item, "risk_aversion", DEFAULT_LAMBDA), cov)
+        return {"weights": solution.weights, "status": solution.status, "objective": solution.objective}
+
+
+# --- تطبيق ASGI ---
+
+class GovernanceService:
+    """خدمة HTTP غير متزامنة (ASGI) للنوى: POST /score و /simulate و /allocate و /optimize، و GET /health.
+
+    جسم الطلب دفعة: JSON (عنصر أو قائمة)، أو JSON lines، أو Arrow IPC stream حسب Content-Type،
+    والاستجابة بالصيغة المطلوبة في Accept (أو ?format=json|jsonl|arrow). الاستجابات المرمّزة محفوظة
+    في ذاكرة LRU بمفتاح (المسار، المعاملات، الصيغتان، بصمة الجسم)، فالطلب المكرر لا يعيد الحساب؛
+    حجمها الكلي محدود بـ cache_bytes، والاستجابة الأكبر من MAX_CACHED_RESPONSE_BYTES لا تُحفظ.
+    """
+
+    def __init__(self, cache_entries=DEFAULT_CACHE_ENTRIES, offload_bytes=OFFLOAD_BYTES,
+                 cache_bytes=DEFAULT_CACHE_BYTES, max_body_bytes=MAX_BODY_BYTES):
+        self.cache = LRUCache(cache_entries, cache_bytes)
+        self.offload_bytes = offload_bytes
+        self.max_body_bytes = max_body_bytes
+        self.optimizer = Optimizer()
+        self.requests = 0
+        self.errors = 0
+
+    def compute(self, endpoint, body, content_type, accept, params):
+        """يعيد (الحالة، نوع المحتوى، الجسم، هل خُدم من الذاكرة المؤقتة) لطلب واحد دون ASGI (يُستخدم أيضًا من CLI)."""
+        media_in = _media_type(content_type)
+        media_out = _media_type(params.get("format") or accept, default=media_in)
+        key = make_key(endpoint, sorted(params.items()), media_in, media_out, content_hash(body))
+        cached = self.cache.get(key)
+        if cached is not None:
+            return 200, media_out, cached, True
+
+        scheme = params.get("scheme")
+        try:
+            if endpoint == "score":
+                result = score_columns(decode_columns(body, media_in), scheme)
+            elif endpoint == "simulate":
+                result = simulate_columns(decode_columns(body, media_in), scheme)
+            elif endpoint == "allocate":
+                result = [allocate_item(item) for item in decode_items(body, media_in)]
+            else:
+                result = [self.optimizer.solve(item) for item in decode_items(body, media_in)]
+            payload = encode(result, media_out)
+        except TypeError as exc:
+            # قيم من نوع غير متوقع داخل عناصر الدفعة (قائمة بدل رقم، null ...): خطأ في الطلب لا في الخادم
+            raise PayloadError(f"invalid field type: {exc}") from exc
+        if len(payload) <= MAX_CACHED_RESPONSE_BYTES:
+            self.cache.put(key, payload)
+        return 200, media_out, payload, False
+
+    def health(self):
+        return {"status": "ok", "requests": self.requests, "errors": self.errors, "cache_entries": len(self.cache),
+                "cache_bytes": self.cache.total_bytes,
+                "cache_hits": self.cache.hits, "cache_misses": self.cache.misses}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+
+        self.requests += 1
+        endpoint = scope["path"].strip("/")
+        if endpoint == "health" and scope["method"] == "GET":
+            return await _respond(send, 200, FORMAT_JSON, json.dumps(self.health()).encode("utf-8"))
+        if endpoint not in ENDPOINTS:
+            return await self._error(send, 404, f"unknown endpoint {scope['path']!r}; expected one of {ENDPOINTS}")
+        if scope["method"] != "POST":
+            return await self._error(send, 405, "use POST")
+
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            size += len(chunks[-1])
+            if size > self.max_body_bytes:
+                return await self._error(send, 413, "request body too large")
+            if not message.get("more_body"):
+                break
+        body = b"".join(chunks)
+        params = dict(parse_qsl(scope.get("query_string", b"").decode("utf-8")))
+        args = (endpoint, body, headers.get("content-type"), headers.get("accept"), params)
+        try:
+            if endpoint in OFFLOAD_ENDPOINTS or len(body) > self.offload_bytes:
+                status, media, payload, hit = await asyncio.get_running_loop().run_in_executor(
+                    None, self.compute, *args)
+            else:
+                status, media, payload, hit = self.compute(*args)
+        except ValueError as exc:  # PayloadError وأخطاء التحقق في النوى
+            return await self._error(send, 400, str(exc))
+        except ImportError as exc:
+            # pyarrow أو cvxpy غير مثبتة
+            return await self._error(send, 501, str(exc))
+        await _respond(send, status, media, payload, hit)
+
+    async def _error(self, send, status, message):
+        self.errors += 1
+        await _respond(send, status, FORMAT_JSON, json.dumps({"error": message}, ensure_ascii=False).encode("utf-8"))
+
+
+async def _respond(send, status, media_type, payload, cache_hit=None):
+    headers = [(b"content-type", media_type.encode("latin-1")), (b"content-length", str(len(payload)).encode())]
+    if cache_hit is not None:
+        headers.append((b"x-cache", b"hit" if cache_hit else b"miss"))
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": payload})
+
+
+app = GovernanceService()
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, cache_entries=DEFAULT_CACHE_ENTRIES, max_body_bytes=MAX_BODY_BYTES):
+    import uvicorn
+
+    uvicorn.run(GovernanceService(cache_entries, max_body_bytes=max_body_bytes), host=host, port=int(port),
+                log_level="warning", access_log=False)
+
+
+# --- قياس زمن الاستجابة والإنتاجية على نسخة محلية ---
+
+def _sample_bodies(endpoint, batch, count, seed=0, media_type=FORMAT_JSON):
+    """أجسام مختلفة (حتى لا تُخدم من الذاكرة المؤقتة) بحجم دفعة batch لكل طلب، بالصيغة media_type."""
+    rng = np.random.default_rng(seed)
+    shocks = list(SHOCK_IMPACT)
+    bodies = []
+    for _ in range(count):
+        if endpoint in ROW_ENDPOINTS:
+            x = np.round(rng.random((batch, len(INDICATORS))) * 10, 3)
+            items = [dict(zip(INDICATORS, row)) for row in x.tolist()]
+            if endpoint == "simulate":
+                for item, cap in zip(items, np.round(rng.random(batch) * 500, 2).tolist()):
+                    item.update(capital=cap, shock_type=shocks[int(rng.integers(len(shocks)))])
+        elif endpoint == "allocate":
+            items = [{"governance": np.round(rng.random(10) * 10, 3).tolist(), "total_capital": 1000.0,
+                      "shock_type": shocks[0], "max_alloc": 200.0, "method": "min_duration"}
+                     for _ in range(batch)]
+        else:
+            items = [{"returns": np.round(rng.random(10) * 0.1 + 0.01, 4).tolist(), "upper": 0.5}
+                     for _ in range(batch)]
+        bodies.append(json.dumps(items).encode("utf-8") if media_type == FORMAT_JSON else encode(items, media_type))
+    return bodies
+
+
+async def _client(host, port, path, bodies, media_type, latencies, errors, deadline):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for body in bodies:
+            if time.perf_counter() > deadline:
+                break
+            request = (f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: {media_type}\r\n"
+                       f"Content-Length: {len(body)}\r\n\r\n").encode("latin-1") + body
+            t0 = time.perf_counter()
+            writer.write(request)
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - t0)
+            if not head.startswith(b"HTTP/1.1 200"):
+                errors.append(head.split(b"\r\n", 1)[0].decode("latin-1"))
+    finally:
+        writer.close()
+
+
+async def _load(host, port, path, bodies, media_type, concurrency, max_seconds=float("inf")):
+    latencies, errors = [], []
+    shards = [bodies[i::concurrency] for i in range(concurrency)]
+    started = time.perf_counter()
+    deadline = started + max_seconds
+    await asyncio.gather(*(_client(host, port, path, shard, media_type, latencies, errors, deadline)
+                           for shard in shards if shard))
+    return time.perf_counter() - started, latencies, errors
+
+
+def benchmark(host, port, endpoint, batch=1, requests=2000, concurrency=16, repeat_body=False,
+              max_seconds=BENCH_MAX_SECONDS, media_type=FORMAT_JSON):
+    """يرسل requests طلبًا بحجم دفعة batch عبر concurrency اتصالًا دائمًا (أو حتى max_seconds)،
+    ويعيد الإنتاجية ومئينات زمن الاستجابة."""
+    requests = max(min(requests, BENCH_MAX_ROWS // max(batch, 1)), concurrency)
+    bodies = _sample_bodies(endpoint, batch, 1 if repeat_body else requests, media_type=media_type)
+    bodies = bodies * requests if repeat_body else bodies
+    # تمهيد: أول استدعاء يحمّل المكتبات المؤجلة ويبني مسائل CVXPY
+    path = f"/{endpoint}"
+    asyncio.run(_load(host, port, path, bodies[:concurrency], media_type, concurrency))
+    seconds, latencies, errors = asyncio.run(_load(host, port, path, bodies, media_type, concurrency, max_seconds))
+    ms = np.percentile(np.asarray(latencies) * 1e3, [50, 95, 99])
+    return BenchResult(endpoint, batch, len(latencies), concurrency, seconds, len(latencies) / seconds,
+                       len(latencies) * batch / seconds, *ms, len(errors))
+
+
+def _free_port(host):
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def start_local(host=DEFAULT_HOST, port=None, timeout=30.0, args=()):
+    """يشغل الخدمة في عملية منفصلة (حتى لا يتنافس العميل والخادم على نفس المفسر) وينتظر جاهزيتها.
+
+    args خيارات إضافية لأمر serve، مثل ["--max-body-bytes", "1048576"].
+    """
+    port = port or _free_port(host)
+    process = subprocess.Popen([sys.executable, "-m", "governance_engine.service", "serve", "--host", host,
+                                "--port", str(port), *args])
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"service exited with code {process.returncode}")
+        try:
+            socket.create_connection((host, port), timeout=0.2).close()
+            return process, port
+        except OSError:
+            time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError("service did not start in time")
+
+
+def _format(result):
+    return (f"{result.endpoint:<9} {result.batch:>6} {result.concurrency:>5} {result.requests:>8,} "
+            f"{result.throughput:>10,.0f}/s {result.rows_per_s:>12,.0f}/s {result.p50_ms:>8.2f} "
+            f"{result.p95_ms:>8.2f} {result.p99_ms:>8.2f} {result.errors:>6}")
+
+
+# --- CLI ---
+
+def run_file(endpoint, path, out=None, params=None, service=None):
+    """ينفذ نقطة واحدة على ملف (json أو jsonl أو arrow حسب الامتداد) دون خادم، ويكتب النتيجة بصيغة out."""
+    media_in = EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if media_in is None:
+        raise PayloadError(f"unsupported input extension for {path!r}; expected one of {list(EXTENSIONS)}")
+    media_out = EXTENSIONS.get(os.path.splitext(out)[1].lower(), FORMAT_JSONL) if out else FORMAT_JSONL
+    with open(path, "rb") as fh:
+        body = fh.read()
+    _, _, payload, _ = (service or GovernanceService()).compute(endpoint, body, media_in, media_out, params or {})
+    if out:
+        with open(out, "wb") as fh:
+            fh.write(payload)
+    else:
+        sys.stdout.buffer.write(payload)
+    return payload
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve or run the governance kernels in batch.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p_serve = commands.add_parser("serve", help="run the HTTP service (needs uvicorn)")
+    p_serve.add_argument("--host", default=DEFAULT_HOST)
+    p_serve.add_argument("--port", type=int, default=DEFAULT_PORT)
+    p_serve.add_argument("--cache-entries", type=int, default=DEFAULT_CACHE_ENTRIES)
+    p_serve.add_argument("--max-body-bytes", type=int, default=MAX_BODY_BYTES)
+
+    for endpoint in ENDPOINTS:
+        p_run = commands.add_parser(endpoint, help=f"run /{endpoint} on a json, jsonl or arrow file")
+        p_run.add_argument("input")
+        p_run.add_argument("--out", help="output file (.json, .jsonl or .arrow); JSON lines on stdout by default")
+        if endpoint in ROW_ENDPOINTS:
+            p_run.add_argument("--scheme", help="weight scheme name")
+
+    p_bench = commands.add_parser("bench", help="latency/throughput against a local instance")
+    p_bench.add_argument("--url", help="host:port of a running service; a local one is started otherwise")
+    p_bench.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    p_bench.add_argument("--batch", type=int, nargs="+", default=[1, 100])
+    p_bench.add_argument("--requests", type=int, default=2000)
+    p_bench.add_argument("--concurrency", type=int, default=16)
+    p_bench.add_argument("--format", choices=["json", "jsonl", "arrow"], default="json",
+                         help="request and response payload format")
+    p_bench.add_argument("--max-seconds", type=float, default=BENCH_MAX_SECONDS, help="time cap per cell")
+    p_bench.add_argument("--repeat-body", action="store_true", help="send the same body (cache hits)")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        serve(args.host, args.port, args.cache_entries, args.max_body_bytes)
+        return 0
+    if args.command in ENDPOINTS:
+        params = {"scheme": args.scheme} if getattr(args, "scheme", None) else {}
+        try:
+            run_file(args.command, args.input, args.out, params)
+        except PayloadError as exc:
+            print(f"error: {exc}", file=sys.stderr)
+            return 2
+        return 0
+
+    process = None
+    if args.url:
+        host, port = args.url.rsplit(":", 1)
+    else:
+        host = DEFAULT_HOST
+        process, port = start_local(host)
+    try:
+        print(f"{'endpoint':<9} {'batch':>6} {'conc':>5} {'requests':>8} {'req/s':>12} {'rows/s':>14} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>6}", flush=True)
+        for endpoint in args.endpoints:
+            for batch in args.batch:
+                result = benchmark(host, int(port), endpoint, batch, args.requests, args.concurrency,
+                                   args.repeat_body, args.max_seconds, FORMATS[args.format])
+                print(_format(result), flush=True)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+from collections import namedtuple
+
+import numpy as np
+
+# معاملات الصدمة المعتمدة في التبويب 2
+SHOCK_IMPACT = {"انخفاض في السيولة": 0.3, "خسائر تشغيلية": 0.5, "تشديد رقابي": 0.4}
+SHOCK_TYPES = list(SHOCK_IMPACT)
+
+# حدود تفسير زمن التعديل (بالأيام)
+FAST_DAYS = 7
+SLOW_DAYS = 14
+
+DEFAULT_PERCENTILES = (50, 90, 95, 99)
+DEFAULT_CHUNK_SIZE = 1_000_000
+# مجالات لوغاريتمية دقيقة حول الزمن الأساسي لحساب المئينات دون الاحتفاظ بكل السيناريوهات
+_N_BINS = 16_384
+_BIN_SPAN = (1e-4, 1e4)
+
+MonteCarloResult = namedtuple(
+    "MonteCarloResult",
+    ["n", "mean", "std", "min", "max", "percentiles", "expected_shortfall", "prob_exceed",
+     "threshold", "bin_edges", "bin_counts", "samples"],
+)
+
+
+def adjustment_duration(capital, governance_score, impact):
+    """زمن تعديل رأس المال = (رأس المال × معامل الصدمة) / (مؤشر الحوكمة + 1)، مطبقًا على المصفوفات."""
+    return np.asarray(capital) * np.asarray(impact) / (np.asarray(governance_score) + 1)
+
+
+def simulate_adjustment(capital, governance_score, shock_type):
+    duration = adjustment_duration(capital, governance_score, SHOCK_IMPACT[shock_type])
+    return round(float(duration), 2)
+
+
+def _correlation_factor(k, correlation):
+    corr = np.asarray(correlation, dtype=np.float64)
+    if corr.ndim == 0:
+        corr = np.full((k, k), float(corr))
+        np.fill_diagonal(corr, 1.0)
+    if corr.shape != (k, k):
+        raise ValueError(f"correlation must be a scalar or a ({k}, {k}) matrix")
+    return np.linalg.cholesky(corr)
+
+
+def _draw_durations(rng, n, capital, governance_score, primary, impacts, chol,
+                    impact_vol, score_sd, contagion_prob):
+    k = len(impacts)
+    z = rng.standard_normal((n, k)) @ chol.T
+    # معاملات صدمة لوغاريتمية طبيعية متوسطها يساوي المعامل الثابت
+    factors = impacts * np.exp(impact_vol * z - 0.5 * impact_vol ** 2)
+
+    active = np.zeros((n, k), dtype=bool)
+    active[:, primary] = True
+    if contagion_prob > 0:
+        from scipy.special import ndtri
+
+        # الصدمات الأخرى تتزامن عندما يتجاوز متغيرها الكامن العتبة، فترتبط بالشدة نفسها
+        cutoff = ndtri(1.0 - contagion_prob)
+        others = np.ones(k, dtype=bool)
+        others[primary] = False
+        active[:, others] = z[:, others] > cutoff
+    total_impact = (factors * active).sum(axis=1)
+
+    g = np.full(n, float(governance_score))
+    if score_sd > 0:
+        g = np.clip(g + score_sd * rng.standard_normal(n), 0.0, 10.0)
+    return adjustment_duration(capital, g, total_impact)
+
+
+def _percentiles_from_hist(edges, counts, n, qs, vmin, vmax):
+    cum = np.cumsum(counts)
+    out = {}
+    for q in qs:
+        target = q / 100 * n
+        i = int(np.searchsorted(cum, target, side="left"))
+        i = min(i, len(counts) - 1)
+        prev = cum[i - 1] if i > 0 else 0
+        frac = (target - prev) / counts[i] if counts[i] else 0.0
+        value = edges[i] + frac * (edges[i + 1] - edges[i])
+        out[q] = float(np.clip(value, vmin, vmax))
+    return out
+
+
+def monte_carlo_adjustment(capital, governance_score, shock_type, n_scenarios=100_000,
+                           impact_vol=0.25, score_sd=0.5, correlation=0.5, contagion_prob=0.1,
+                           threshold=SLOW_DAYS, percentiles=DEFAULT_PERCENTILES,
+                           seed=None, chunk_size=DEFAULT_CHUNK_SIZE, return_samples=False):
+    """محاكاة مونت كارلو لزمن تعديل رأس المال مع صدمات عشوائية مترابطة وعدم يقين في مؤشر الحوكمة.
+
+    تُنفذ السيناريوهات على أجزاء بحجم chunk_size، وتُجمع النتائج في مدرج لوغاريتمي دقيق
+    فتبقى الذاكرة ثابتة مهما كبر عدد السيناريوهات. مع impact_vol=0 و score_sd=0
+    و contagion_prob=0 تطابق النتيجة simulate_adjustment.
+    """
+    if n_scenarios <= 0:
+        raise ValueError("n_scenarios must be positive")
+    rng = np.random.default_rng(seed)
+    impacts = np.array([SHOCK_IMPACT[s] for s in SHOCK_TYPES])
+    primary = SHOCK_TYPES.index(shock_type)
+    chol = _correlation_factor(len(impacts), correlation)
+
+    # الزمن الأساسي يحدد مقياس المجالات؛ الحدود الدنيا والعليا تُحسب بشكل منفصل
+    base = max(float(adjustment_duration(capital, 0.0, impacts.sum())), 1e-12)
+    edges = np.concatenate([[0.0], np.geomspace(base * _BIN_SPAN[0], base * _BIN_SPAN[1], _N_BINS - 1), [np.inf]])
+    counts = np.zeros(_N_BINS, dtype=np.int64)
+    sums = np.zeros(_N_BINS)
+
+    total, total_sq, exceed = 0.0, 0.0, 0
+    vmin, vmax = np.inf, -np.inf
+    samples = [] if return_samples else None
+
+    remaining = int(n_scenarios)
+    while remaining > 0:
+        n = min(remaining, int(chunk_size))
+        d = _draw_durations(rng, n, capital, governance_score, primary, impacts, chol,
+                            impact_vol, score_sd, contagion_prob)
+        idx = np.searchsorted(edges, d, side="right") - 1
+        counts += np.bincount(idx, minlength=_N_BINS)
+        sums += np.bincount(idx, weights=d, minlength=_N_BINS)
+        total += d.sum()
+        total_sq += (d * d).sum()
+        exceed += int((d > threshold).sum())
+        vmin, vmax = min(vmin, d.min()), max(vmax, d.max())
+        if samples is not None:
+            samples.append(d)
+        remaining -= n
+
+    n = int(n_scenarios)
+    mean = total / n
+    std = float(np.sqrt(max(total_sq / n - mean ** 2, 0.0)))
+    finite_edges = edges.copy()
+    finite_edges[-1] = max(vmax, edges[-2])
+    pct = _percentiles_from_hist(finite_edges, counts, n, percentiles, vmin, vmax)
+
+    # العجز المتوقع: متوسط الأزمنة الأسوأ من كل مئين (ذيل الخسارة)
+    es = {}
+    for q in percentiles:
+        var_q = pct[q]
+        i = int(np.searchsorted(edges, var_q, side="right") - 1)
+        tail_n = counts[i + 1:].sum()
+        tail_sum = sums[i + 1:].sum()
+        # الجزء المطلوب من المجال الذي يقع فيه المئين
+        need = n * (1 - q / 100) - tail_n
+        if need > 0 and counts[i]:
+            take = min(need, counts[i])
+            tail_sum += take * sums[i] / counts[i]
+            tail_n += take
+        es[q] = float(tail_sum / tail_n) if tail_n else var_q
+
+    return MonteCarloResult(
+        n=n, mean=float(mean), std=std, min=float(vmin), max=float(vmax),
+        percentiles=pct, expected_shortfall=es, prob_exceed=exceed / n, threshold=threshold,
+        bin_edges=finite_edges, bin_counts=counts,
+        samples=np.concatenate(samples) if samples is not None else None,
+    )
+
+
+def capital_path(capital, days, daily_decline=0.025, max_points=None):
+    """مسار رأس المال المتوقع يومًا بيوم حتى انتهاء مدة التعديل.
+
+    المسار خطي، فمع max_points تُؤخذ أيام متباعدة بانتظام (أولها وآخرها دائمًا) دون فقدان
+    أي شكل في الرسم، بدل صف لكل يوم عندما تكون المدة طويلة جدًا.
+    """
+    days = int(days)
+    if max_points is not None and days > max_points:
+        timeline = np.unique(np.linspace(1, days, int(max_points)).round().astype(np.int64))
+    else:
+        timeline = np.arange(1, days + 1)
+    return timeline, capital - timeline * capital * daily_decline
+
+
+def coarse_histogram(result, bins=60, upper=None):
+    """يجمع المدرج الدقيق لنتيجة المحاكاة في عدد قليل من المجالات للعرض."""
+    upper = result.percentiles.get(99, result.max) * 1.5 if upper is None else upper
+    lower = result.min
+    if upper <= lower:
+        upper = lower + 1.0
+    mids = (result.bin_edges[:-1] + result.bin_edges[1:]) / 2
+    counts, edges = np.histogram(np.clip(mids, lower, upper), bins=bins, range=(lower, upper),
+                                 weights=result.bin_counts)
+    return (edges[:-1] + edges[1:]) / 2, counts
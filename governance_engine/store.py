@@ -0,0 +1,335 @@
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .scoring import BAND_LABELS, INDICATORS, _weights, as_matrix, rating_bands, score_batch
+from .streaming import HIST_EDGES
+
+DEFAULT_STORE_PATH = os.environ.get(
+    "GOVERNANCE_STORE_PATH", os.path.join(os.path.expanduser("~"), ".governance", "governance_store.sqlite")
+)
+# أصل زمني ثابت للمجاميع التراكمية حتى لا تفقد Σt² دقتها مع السنوات الكبيرة
+T_ORIGIN = 2000.0
+
+AppendResult = namedtuple("AppendResult", ["inserted", "updated", "unchanged", "skipped", "entities", "periods"])
+
+_SUMS = ["n", "sum_t", "sum_tt", "sum_s", "sum_ss", "sum_ts"] + [f"band_{b}" for b in range(len(BAND_LABELS))]
+_QUOTED = ", ".join(f'"{c}"' for c in INDICATORS)
+_COLS = ", ".join(f'"{c}" REAL' for c in INDICATORS)
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS observations (
+    entity TEXT NOT NULL, period TEXT NOT NULL, t REAL NOT NULL, {_COLS},
+    score REAL NOT NULL, band INTEGER NOT NULL, weights TEXT, PRIMARY KEY (entity, period)
+);
+CREATE TABLE IF NOT EXISTS entity_stats (
+    entity TEXT PRIMARY KEY, {", ".join(f"{c} REAL NOT NULL DEFAULT 0" for c in _SUMS)},
+    first_t REAL, first_period TEXT, last_t REAL, last_period TEXT, last_score REAL
+);
+CREATE TABLE IF NOT EXISTS period_stats (
+    period TEXT PRIMARY KEY, t REAL NOT NULL, {", ".join(f"{c} REAL NOT NULL DEFAULT 0" for c in _SUMS)}
+);
+CREATE TABLE IF NOT EXISTS score_hist (bin INTEGER PRIMARY KEY, count INTEGER NOT NULL);
+"""
+
+
+# أعمدة أضيفت بعد الإصدار الأول من المخطط: تُضاف إلى القواعد القديمة عند فتحها
+_ADDED_COLUMNS = {"observations": [("weights", "TEXT")], "entity_stats": [("first_period", "TEXT")]}
+
+
+def weights_key(weights=None):
+    """تمثيل نصي ثابت للأوزان المستخدمة في حساب درجة الصف (اسم نظام أو خمس قيم)، يُحفظ معه في المخزن."""
+    return ",".join(repr(float(w)) for w in _weights(weights))
+
+
+def period_value(label):
+    """يحوّل تسمية الفترة إلى رقم عشري بالسنوات: 2024 ← 2024.0، و2024Q3 ← 2024.5، والتواريخ حسب بداية الفترة."""
+    try:
+        return float(label)
+    except (TypeError, ValueError):
+        pass
+    try:
+        start = pd.Period(str(label)).start_time
+    except (TypeError, ValueError):
+        start = pd.Timestamp(str(label))
+    return start.year + (start.dayofyear - 1) / (366 if start.is_leap_year else 365)
+
+
+def _period_label(value):
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _sums(keys, t, s, bands):
+    """مجاميع (n, Σt, Σt², Σs, Σs², Σts, عدد كل تصنيف) لكل مفتاح."""
+    frame = pd.DataFrame({"key": keys, "n": 1.0, "sum_t": t, "sum_tt": t * t, "sum_s": s, "sum_ss": s * s,
+                          "sum_ts": t * s})
+    for b in range(len(BAND_LABELS)):
+        frame[f"band_{b}"] = (bands == b).astype(np.float64)
+    return frame.groupby("key", sort=False)[_SUMS].sum()
+
+
+def _trend(n, sum_t, sum_tt, sum_s, sum_ts):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        denom = n * sum_tt - sum_t ** 2
+        return np.where(denom > 1e-12 * np.maximum(n * sum_tt, 1.0), (n * sum_ts - sum_t * sum_s) / denom, np.nan)
+
+
+def _mean_std(n, sum_s, sum_ss):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.where(n > 0, sum_s / n, np.nan)
+        var = np.where(n > 1, (sum_ss - n * mean ** 2) / (n - 1), np.nan)
+    return mean, np.sqrt(np.clip(var, 0.0, None))
+
+
+class GovernanceStore:
+    """مخزن دائم (SQLite) للمؤشرات الفرعية ودرجات الحوكمة لكل مؤسسة وفترة.
+
+    عند إضافة فترة جديدة تُحسب درجات الصفوف الجديدة أو المعدّلة فقط، وتُحدَّث المجاميع
+    التراكمية (المتوسط، التصنيفات، المدرج، اتجاه كل مؤسسة، متوسط كل فترة) بفروق هذه الصفوف،
+    فتُقرأ لوحات العرض من جداول صغيرة دون إعادة قراءة الملفات أو المرور على السجل كاملًا.
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # قاعدة في الذاكرة تحتاج اتصالًا واحدًا دائمًا، وإلا تضيع بإغلاقه
+        self._shared = sqlite3.connect(path, check_same_thread=False) if path == ":memory:" else None
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            self._migrate(conn)
+
+    @staticmethod
+    def _migrate(conn):
+        for table, columns in _ADDED_COLUMNS.items():
+            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            for name, kind in columns:
+                if name not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {kind}")
+        # الصفوف المحفوظة قبل تسجيل الأوزان حُسبت بالأوزان الافتراضية
+        conn.execute("UPDATE observations SET weights = ? WHERE weights IS NULL", (weights_key(),))
+        conn.execute(
+            "UPDATE entity_stats SET first_period = (SELECT o.period FROM observations o "
+            "WHERE o.entity = entity_stats.entity ORDER BY o.t LIMIT 1) WHERE first_period IS NULL")
+
+    def _connect(self):
+        if self._shared is not None:
+            return _Borrowed(self._shared)
+        return _Owned(sqlite3.connect(self.path, timeout=30))
+
+    def append(self, df, entity_col, period_col, weights=None):
+        """يضيف أو يحدّث صفوف (مؤسسة، فترة)؛ الصفوف المطابقة لما في المخزن تُتجاهل دون إعادة حساب.
+
+        تُحفظ مع كل صف الأوزان التي حُسبت بها درجته، فالصف المحفوظ بنظام أوزان آخر يُعاد حسابه ويُعدّ معدّلًا.
+        """
+        if entity_col not in df.columns or period_col not in df.columns:
+            raise KeyError(f"missing key columns: {[c for c in (entity_col, period_col) if c not in df.columns]}")
+        present = [c for c in INDICATORS if c in df.columns]
+        values = as_matrix(df[present].apply(pd.to_numeric, errors="coerce"))
+        complete = ~np.isnan(values).any(axis=1) & df[entity_col].notna().to_numpy() & df[period_col].notna().to_numpy()
+        skipped = int((~complete).sum())
+
+        batch = pd.DataFrame(values[complete], columns=INDICATORS)
+        batch.insert(0, "entity", df[entity_col].to_numpy()[complete].astype(str))
+        batch.insert(1, "period", [_period_label(p) for p in df[period_col].to_numpy()[complete]])
+        # التكرار داخل الدفعة نفسها: يُعتمد آخر صف لكل (مؤسسة، فترة)
+        batch = batch.drop_duplicates(["entity", "period"], keep="last").reset_index(drop=True)
+        if batch.empty:
+            return AppendResult(0, 0, 0, skipped, 0, 0)
+        periods = pd.unique(batch["period"])
+        t_of = {p: period_value(p) for p in periods}
+        batch.insert(2, "t", batch["period"].map(t_of).to_numpy(dtype=np.float64))
+        batch["weights"] = weights_key(weights)
+
+        with self._lock, self._connect() as conn:
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS incoming (entity TEXT, period TEXT)")
+            conn.execute("DELETE FROM incoming")
+            conn.executemany("INSERT INTO incoming VALUES (?, ?)", batch[["entity", "period"]].itertuples(False))
+            cols = ", ".join(f'o."{c}"' for c in INDICATORS)
+            old = pd.read_sql_query(
+                f"SELECT o.entity, o.period, o.t, {cols}, o.score, o.band, o.weights FROM observations o "
+                "JOIN incoming i ON o.entity = i.entity AND o.period = i.period", conn)
+
+            merged = batch.merge(old, on=["entity", "period"], how="left", suffixes=("", "_old"),
+                                 indicator=True)
+            exists = (merged["_merge"] == "both").to_numpy()
+            same = exists & np.isclose(merged[INDICATORS].to_numpy(),
+                                       merged[[f"{c}_old" for c in INDICATORS]].to_numpy(dtype=np.float64),
+                                       rtol=0.0, atol=1e-12).all(axis=1) \
+                & (merged["weights"] == merged["weights_old"]).to_numpy()
+            changed = ~same
+            new_rows = merged.loc[changed, batch.columns].reset_index(drop=True)
+            replaced = merged.loc[changed & exists]
+
+            if len(new_rows):
+                result = score_batch(new_rows[INDICATORS], weights)
+                new_rows["score"] = result.scores
+                new_rows["band"] = result.bands.astype(np.int64)
+                self._apply(conn, new_rows, replaced)
+                placeholders = ", ".join("?" * (len(INDICATORS) + 6))
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO observations (entity, period, t, {_QUOTED}, score, band, weights) "
+                    f"VALUES ({placeholders})",
+                    new_rows[["entity", "period", "t"] + INDICATORS + ["score", "band", "weights"]].itertuples(False),
+                )
+            conn.execute("DELETE FROM incoming")
+
+        return AppendResult(
+            inserted=int((changed & ~exists).sum()),
+            updated=int((changed & exists).sum()),
+            unchanged=int(same.sum()),
+            skipped=skipped,
+            entities=int(new_rows["entity"].nunique()) if len(new_rows) else 0,
+            periods=int(new_rows["period"].nunique()) if len(new_rows) else 0,
+        )
+
+    def _apply(self, conn, new_rows, replaced):
+        """يضيف مساهمة الصفوف الجديدة ويطرح مساهمة القيم القديمة التي حلّت محلها."""
+        t_new = new_rows["t"].to_numpy() - T_ORIGIN
+        s_new = new_rows["score"].to_numpy()
+        b_new = new_rows["band"].to_numpy()
+        t_old = replaced["t_old"].to_numpy(dtype=np.float64) - T_ORIGIN
+        s_old = replaced["score"].to_numpy(dtype=np.float64)
+        b_old = replaced["band"].to_numpy(dtype=np.int64)
+
+        for table, key, new_keys, old_keys in (
+            ("entity_stats", "entity", new_rows["entity"], replaced["entity"]),
+            ("period_stats", "period", new_rows["period"], replaced["period"]),
+        ):
+            delta = _sums(new_keys.to_numpy(), t_new, s_new, b_new)
+            if len(replaced):
+                delta = delta.sub(_sums(old_keys.to_numpy(), t_old, s_old, b_old), fill_value=0.0)
+            delta = delta.reset_index().rename(columns={"key": key})
+            cols = [key] + _SUMS
+            if table == "period_stats":
+                delta.insert(1, "t", delta[key].map(dict(zip(new_rows["period"], new_rows["t"]))))
+                cols.insert(1, "t")
+            updates = ", ".join(f"{c} = {table}.{c} + excluded.{c}" for c in _SUMS)
+            conn.executemany(
+                f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))}) "
+                f"ON CONFLICT({key}) DO UPDATE SET {updates}",
+                delta[cols].itertuples(False),
+            )
+
+        # أول وآخر فترة لكل مؤسسة؛ الاستبدال يحتفظ بالفترة نفسها فيكفي أخذ الأحدث من الدفعة
+        latest = new_rows.sort_values("t").groupby("entity", sort=False).agg(
+            first_t=("t", "first"), first_period=("period", "first"), last_t=("t", "last"),
+            last_period=("period", "last"), last_score=("score", "last"))
+        # كل التعبيرات في SET تُقيّم على قيم الصف قبل التحديث
+        conn.executemany(
+            "UPDATE entity_stats SET "
+            "first_period = CASE WHEN first_t IS NULL OR ? < first_t THEN ? ELSE first_period END, "
+            "first_t = MIN(COALESCE(first_t, ?), ?), "
+            "last_period = CASE WHEN last_t IS NULL OR ? >= last_t THEN ? ELSE last_period END, "
+            "last_score = CASE WHEN last_t IS NULL OR ? >= last_t THEN ? ELSE last_score END, "
+            "last_t = MAX(COALESCE(last_t, ?), ?) WHERE entity = ?",
+            [(f, fp, f, f, lt, lp, lt, ls, lt, lt, e) for e, f, fp, lt, lp, ls in latest.itertuples()],
+        )
+
+        edges = HIST_EDGES
+        bins = np.clip(np.searchsorted(edges, s_new, side="right") - 1, 0, len(edges) - 2)
+        hist = np.bincount(bins, minlength=len(edges) - 1).astype(np.int64)
+        if len(replaced):
+            old_bins = np.clip(np.searchsorted(edges, s_old, side="right") - 1, 0, len(edges) - 2)
+            hist -= np.bincount(old_bins, minlength=len(edges) - 1)
+        conn.executemany(
+            "INSERT INTO score_hist (bin, count) VALUES (?, ?) "
+            "ON CONFLICT(bin) DO UPDATE SET count = score_hist.count + excluded.count",
+            [(int(b), int(c)) for b, c in enumerate(hist) if c],
+        )
+
+    def _frame(self, query, params=()):
+        with self._connect() as conn:
+            return pd.read_sql_query(query, conn, params=params)
+
+    def entity_summary(self):
+        """لكل مؤسسة: عدد الفترات، المتوسط، الانحراف، الاتجاه (نقطة/سنة)، آخر فترة ودرجتها وتصنيفها."""
+        stats = self._frame("SELECT * FROM entity_stats ORDER BY entity")
+        mean, std = _mean_std(stats["n"], stats["sum_s"], stats["sum_ss"])
+        last = stats["last_score"].to_numpy(dtype=np.float64)
+        return pd.DataFrame({
+            "entity": stats["entity"],
+            "periods": stats["n"].astype(np.int64),
+            "mean": mean,
+            "std": std,
+            "trend": _trend(stats["n"], stats["sum_t"], stats["sum_tt"], stats["sum_s"], stats["sum_ts"]),
+            "first_period": stats["first_period"],
+            "last_period": stats["last_period"],
+            "last_score": last,
+            "last_band": [BAND_LABELS[b] for b in rating_bands(last)],
+        })
+
+    def period_summary(self):
+        """لكل فترة: عدد المؤسسات، المتوسط، الانحراف وعدد كل تصنيف، مرتبة زمنيًا."""
+        stats = self._frame("SELECT * FROM period_stats WHERE n > 0 ORDER BY t")
+        mean, std = _mean_std(stats["n"], stats["sum_s"], stats["sum_ss"])
+        frame = pd.DataFrame({"period": stats["period"], "t": stats["t"], "n": stats["n"].astype(np.int64),
+                              "mean": mean, "std": std})
+        for b, label in enumerate(BAND_LABELS):
+            frame[label] = stats[f"band_{b}"].astype(np.int64)
+        return frame
+
+    def overview(self):
+        """المجاميع الكلية للمخزن: العدد، المتوسط، الانحراف، التصنيفات والمدرج التكراري."""
+        totals = self._frame(f"SELECT {', '.join(f'COALESCE(SUM({c}), 0) AS {c}' for c in _SUMS)} FROM period_stats")
+        row = totals.iloc[0]
+        mean, std = _mean_std(row["n"], row["sum_s"], row["sum_ss"])
+        hist = self._frame("SELECT bin, count FROM score_hist")
+        counts = np.zeros(len(HIST_EDGES) - 1, dtype=np.int64)
+        counts[hist["bin"].to_numpy(dtype=np.int64)] = hist["count"].to_numpy(dtype=np.int64)
+        centers = (HIST_EDGES[:-1] + HIST_EDGES[1:]) / 2
+        return {
+            "count": int(row["n"]),
+            "mean": float(mean),
+            "std": float(std),
+            "bands": pd.DataFrame({"band": list(BAND_LABELS),
+                                   "count": [int(row[f"band_{b}"]) for b in range(len(BAND_LABELS))]}),
+            "histogram": pd.DataFrame({"Governance_Score": centers, "count": counts}),
+        }
+
+    def observations(self, entity=None):
+        query = "SELECT * FROM observations"
+        params = ()
+        if entity is not None:
+            query += " WHERE entity = ?"
+            params = (str(entity),)
+        frame = self._frame(query + " ORDER BY entity, t", params)
+        return frame.rename(columns={"score": "Governance_Score"})
+
+    def clear(self):
+        with self._lock, self._connect() as conn:
+            for table in ("observations", "entity_stats", "period_stats", "score_hist"):
+                conn.execute(f"DELETE FROM {table}")
+
+
+class _Owned:
+    """اتصال يُغلق بعد الاستخدام، مع تثبيت المعاملة أو التراجع عنها."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+        finally:
+            self.conn.close()
+
+
+class _Borrowed(_Owned):
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.commit()
+        else:
+            self.conn.rollback()
@@ -0,0 +1,130 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .scoring import BAND_LABELS, INDICATORS, compute_scores, rating_bands
+
+DEFAULT_CHUNKSIZE = 100_000
+# مجالات ثابتة للمدرج التكراري حتى يمكن جمع التكرارات عبر الأجزاء
+HIST_EDGES = np.linspace(0.0, 10.0, 41)
+
+StreamResult = namedtuple("StreamResult", ["stats", "preview"])
+
+
+class RunningStats:
+    """مجاميع تراكمية (المتوسط، التباين، التصنيفات، المدرج) بذاكرة ثابتة."""
+
+    def __init__(self, edges=HIST_EDGES):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.count = 0
+        self.missing = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self.band_counts = np.zeros(len(BAND_LABELS), dtype=np.int64)
+        self.hist_counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+
+    def update(self, scores):
+        scores = np.asarray(scores, dtype=np.float64).ravel()
+        valid = ~np.isnan(scores)
+        self.missing += int(scores.size - valid.sum())
+        scores = scores[valid]
+        n = scores.size
+        if n == 0:
+            return self
+
+        # دمج التباين بطريقة Chan لتفادي فقدان الدقة في الملفات الكبيرة
+        chunk_mean = scores.mean()
+        chunk_m2 = ((scores - chunk_mean) ** 2).sum()
+        total = self.count + n
+        delta = chunk_mean - self.mean
+        self.mean += delta * n / total
+        self._m2 += chunk_m2 + delta ** 2 * self.count * n / total
+        self.count = total
+
+        self.min = min(self.min, scores.min())
+        self.max = max(self.max, scores.max())
+        self.band_counts += np.bincount(rating_bands(scores), minlength=len(BAND_LABELS))
+        clipped = np.clip(scores, self.edges[0], self.edges[-1])
+        self.hist_counts += np.histogram(clipped, bins=self.edges)[0]
+        return self
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else float("nan")
+
+    @property
+    def std(self):
+        return float(np.sqrt(self.variance))
+
+    def histogram_frame(self):
+        centers = (self.edges[:-1] + self.edges[1:]) / 2
+        return pd.DataFrame({"Governance_Score": centers, "count": self.hist_counts})
+
+    def bands_frame(self):
+        return pd.DataFrame({"band": list(BAND_LABELS), "count": self.band_counts})
+
+
+def iter_csv_chunks(source, chunksize=DEFAULT_CHUNKSIZE):
+    yield from pd.read_csv(source, chunksize=chunksize)
+
+
+def iter_xlsx_chunks(source, chunksize=DEFAULT_CHUNKSIZE):
+    """قراءة ملف Excel صفًا بصف (وضع القراءة فقط في openpyxl) وإرجاعه على أجزاء."""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(c) if c is not None else f"col_{i}" for i, c in enumerate(header)]
+        buffer = []
+        for row in rows:
+            buffer.append(row)
+            if len(buffer) >= chunksize:
+                yield pd.DataFrame(buffer, columns=columns)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=columns)
+    finally:
+        wb.close()
+
+
+def iter_chunks(source, name, chunksize=DEFAULT_CHUNKSIZE):
+    if str(name).endswith("xlsx"):
+        return iter_xlsx_chunks(source, chunksize)
+    return iter_csv_chunks(source, chunksize)
+
+
+def stream_evaluate(source, name, chunksize=DEFAULT_CHUNKSIZE, preview_rows=1000, weights=None, seed=None):
+    """يحسب مؤشر الحوكمة جزءًا بجزء ويعيد المجاميع وعينة عشوائية للعرض."""
+    rng = np.random.default_rng(seed)
+    stats = RunningStats()
+    preview, preview_keys = None, np.empty(0)
+
+    for chunk in iter_chunks(source, name, chunksize):
+        missing = [col for col in INDICATORS if col not in chunk.columns]
+        if missing:
+            raise KeyError(f"missing governance columns: {missing}")
+        values = chunk[INDICATORS].apply(pd.to_numeric, errors="coerce")
+        scores = compute_scores(values, weights)
+        stats.update(scores)
+
+        # عينة bottom-k بمفاتيح عشوائية: عينة منتظمة بحجم ثابت مهما كبر الملف
+        chunk = chunk.assign(Governance_Score=scores)
+        keys = rng.random(len(chunk))
+        if preview is None:
+            merged, merged_keys = chunk, keys
+        else:
+            merged = pd.concat([preview, chunk], ignore_index=True)
+            merged_keys = np.concatenate([preview_keys, keys])
+        if len(merged) > preview_rows:
+            keep = np.argpartition(merged_keys, preview_rows)[:preview_rows]
+            merged, merged_keys = merged.iloc[keep].reset_index(drop=True), merged_keys[keep]
+        preview, preview_keys = merged, merged_keys
+
+    return StreamResult(stats, preview if preview is not None else pd.DataFrame(columns=INDICATORS))
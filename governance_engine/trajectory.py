@@ -0,0 +1,140 @@
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from .simulation import SHOCK_IMPACT, adjustment_duration
+
+DEFAULT_HORIZON = 365
+DEFAULT_DAILY_VOL = 0.005
+# نسبة الفجوة (رأس المال المفقود) التي تُسد خلال زمن التعديل المحسوب بمعادلة التبويب 2
+RECOVERY_SHARE = 0.99
+# يُعدّ البنك متعافيًا عندما يعود رأس المال إلى هذه النسبة من مستواه قبل الصدمة
+DEFAULT_RECOVERY_LEVEL = 0.99
+DEFAULT_PATH_PERCENTILES = (5, 50, 95)
+
+TrajectoryResult = namedtuple(
+    "TrajectoryResult",
+    ["days", "percentiles", "mean", "max_drawdown", "trough_day", "recovery_days", "banks", "n_scenarios"],
+)
+
+
+def _quantile(values, q):
+    """المئين q (بين 0 و 1) لكل صف دون استيفاء، فيبقى inf (لم يتعافَ) قيمة صالحة."""
+    ordered = np.sort(values, axis=1)
+    return ordered[:, max(int(np.ceil(q * ordered.shape[1])) - 1, 0)]
+
+
+def _record_days(horizon, max_points):
+    if max_points is not None and horizon + 1 > max_points:
+        return np.unique(np.linspace(0, horizon, int(max_points)).round().astype(np.int64))
+    return np.arange(horizon + 1)
+
+
+def simulate_trajectories(capital, governance_score, shock_type, horizon=DEFAULT_HORIZON, n_scenarios=1,
+                          impact_vol=0.0, score_sd=0.0, daily_vol=DEFAULT_DAILY_VOL, onset_days=1,
+                          recovery_level=DEFAULT_RECOVERY_LEVEL, percentiles=DEFAULT_PATH_PERCENTILES,
+                          max_points=None, seed=None):
+    """مسارات رأس المال يومًا بيوم بعد الصدمة لعدة بنوك وسيناريوهات معًا (مسارات × أيام).
+
+    رأس المال نسبة من مستواه قبل الصدمة (1 في اليوم 0). خسارة الصدمة (معامل الصدمة، مع تذبذب
+    لوغاريتمي طبيعي impact_vol) تتحقق بالتساوي خلال onset_days يومًا، ثم تُسد الفجوة يوميًا بنسبة
+    ثابتة تحددها الحوكمة: خلال زمن التعديل adjustment_duration يُسد RECOVERY_SHARE من الفجوة،
+    فكلما ارتفع مؤشر الحوكمة كان التعافي أسرع. daily_vol تذبذب يومي مضاعف لرأس المال.
+
+    الحلقة على الأيام فقط وكل خطوة متجهة على كل المسارات، ولا يُحفظ المسار الكامل: تُحدّث أقصى
+    نسبة تراجع وأدنى نقطة وزمن التعافي تراكميًا، وتُحسب المئينات عبر المسارات في الأيام المسجلة
+    فقط (max_points يحد عددها للرسم). capital و governance_score قيمة واحدة أو قيمة لكل بنك.
+    """
+    capital, governance_score = np.broadcast_arrays(np.atleast_1d(np.asarray(capital, dtype=np.float64)),
+                                                    np.atleast_1d(np.asarray(governance_score, dtype=np.float64)))
+    horizon = int(horizon)
+    n_scenarios = int(n_scenarios)
+    onset_days = max(int(onset_days), 1)
+    if horizon < 1 or n_scenarios < 1:
+        raise ValueError("horizon and n_scenarios must be positive")
+    n_banks = len(capital)
+    n = n_banks * n_scenarios
+    rng = np.random.default_rng(seed)
+
+    # المسارات مرتبة حسب البنك: سيناريوهات كل بنك متجاورة، فتُحسب ملخصات البنوك بإعادة التشكيل
+    bank = np.repeat(np.arange(n_banks), n_scenarios)
+    g = governance_score[bank]
+    if score_sd > 0:
+        g = np.clip(g + score_sd * rng.standard_normal(n), 0.0, 10.0)
+    impact = np.full(n, SHOCK_IMPACT[shock_type])
+    if impact_vol > 0:
+        # لا تتجاوز الخسارة رأس المال كله
+        impact = np.minimum(impact * np.exp(impact_vol * rng.standard_normal(n) - 0.5 * impact_vol ** 2), 1.0)
+    duration = adjustment_duration(capital[bank], g, impact)
+    # النسبة المتبقية من الفجوة بعد يوم واحد
+    keep = (1.0 - RECOVERY_SHARE) ** (1.0 / np.maximum(duration, 1e-9))
+    daily_loss = impact / onset_days
+
+    record = _record_days(horizon, max_points)
+    path_pct = np.empty((len(record), len(percentiles)))
+    path_mean = np.empty(len(record))
+    path_pct[0] = 1.0
+    path_mean[0] = 1.0
+    j = 1 if record[0] == 0 else 0
+
+    k = np.ones(n)
+    peak = np.ones(n)
+    max_dd = np.zeros(n)
+    trough = np.ones(n)
+    trough_day = np.zeros(n, dtype=np.int32)
+    fell_day = np.full(n, -1, dtype=np.int32)
+    recovered_day = np.full(n, -1, dtype=np.int32)
+    gap = np.empty(n)
+    for t in range(1, horizon + 1):
+        # الفجوة عن مستوى ما قبل الصدمة تتقلص بنسبة ثابتة، ثم تُطرح خسارة الصدمة خلال مدة حدوثها
+        np.subtract(1.0, k, out=gap)
+        gap *= keep
+        np.subtract(1.0, gap, out=k)
+        if t <= onset_days:
+            k -= daily_loss
+        if daily_vol > 0:
+            k *= 1.0 + daily_vol * rng.standard_normal(n)
+
+        np.maximum(peak, k, out=peak)
+        np.maximum(max_dd, 1.0 - k / peak, out=max_dd)
+        lower = k < trough
+        trough[lower] = k[lower]
+        trough_day[lower] = t
+        below = k < recovery_level
+        fell_day[below & (fell_day < 0)] = t
+        recovered_day[~below & (fell_day >= 0) & (recovered_day < 0)] = t
+
+        if j < len(record) and record[j] == t:
+            path_pct[j] = np.percentile(k, percentiles)
+            path_mean[j] = k.mean()
+            j += 1
+
+    # زمن التعافي من أول يوم دون المستوى حتى العودة إليه؛ صفر إذا لم ينزل، inf إذا لم يتعافَ ضمن الأفق
+    recovery_days = np.where(fell_day < 0, 0.0, (recovered_day - fell_day).astype(np.float64))
+    recovery_days[(fell_day >= 0) & (recovered_day < 0)] = np.inf
+
+    by_bank = (n_banks, n_scenarios)
+    dd = max_dd.reshape(by_bank)
+    rec = recovery_days.reshape(by_bank)
+    banks = pd.DataFrame({
+        "bank": np.arange(n_banks),
+        "capital": capital,
+        "governance": governance_score,
+        "duration": adjustment_duration(capital, governance_score, SHOCK_IMPACT[shock_type]),
+        "max_drawdown": dd.mean(axis=1),
+        "max_drawdown_p95": _quantile(dd, 0.95),
+        "recovery_median": _quantile(rec, 0.5),
+        "recovery_p95": _quantile(rec, 0.95),
+        "prob_recovered": np.isfinite(rec).mean(axis=1),
+    })
+    return TrajectoryResult(
+        days=record,
+        percentiles={q: path_pct[:, i] for i, q in enumerate(percentiles)},
+        mean=path_mean,
+        max_drawdown=max_dd,
+        trough_day=trough_day,
+        recovery_days=recovery_days,
+        banks=banks,
+        n_scenarios=n_scenarios,
+    )
@@ -1,11 +1,78 @@
+from collections import namedtuple
+
 import streamlit as st
 import numpy as np
 import pandas as pd
-import plotly.express as px
-import cvxpy as cp
-import scipy.stats as stats
-from sklearn.linear_model import LinearRegression
-from sklearn.metrics import mean_absolute_error, mean_squared_error
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from governance_engine import DEFAULT_SCHEME, INDICATORS, WEIGHT_SCHEMES, compute_scores, contributions
+from governance_engine.allocation import METHOD_MIN_DURATION, METHOD_PROPORTIONAL, allocate_capital
+from governance_engine.analysis import clean_and_analyze, metric_screen
+from governance_engine.bootstrap import bootstrap_pair
+from governance_engine.cache import LRUCache, SharedFrameCache, content_hash, make_key, read_upload, reload_upload
+from governance_engine.charts import (
+    MAX_CHART_POINTS,
+    METHOD_DENSITY,
+    METHOD_LTTB,
+    METHOD_RANDOM,
+    density_frame,
+    downsample,
+    histogram_frame,
+)
+from governance_engine.covariance import METHODS as COVARIANCE_METHODS, estimate_covariance
+from governance_engine.frontier import default_lambdas, efficient_frontier
+from governance_engine.ingest import ingest_upload, reload_ingested
+from governance_engine.inputs import (
+    ASSET_RETURN,
+    UNIT_GOV,
+    assets_from_frame,
+    default_assets,
+    default_units,
+    units_from_frame,
+)
+from governance_engine.panel import panel_regression
+from governance_engine.peers import DEFAULT_PEERS, PeerIndex
+from governance_engine.profiling import (
+    PROFILE_ENABLED,
+    STAGE_FIT,
+    STAGE_READ,
+    STAGE_RENDER,
+    STAGE_SCORE,
+    STAGE_SOLVE,
+    Profiler,
+    records_frame,
+    stage_summary,
+    to_jsonl,
+)
+from governance_engine.portfolio import (
+    DEFAULT_LAMBDA,
+    PortfolioProblem,
+    available_solvers,
+    covariance_structure,
+    default_covariance,
+    heuristic_weights,
+)
+from governance_engine.screening import DEFAULT_JUMP, screen_frame
+from governance_engine.sensitivity import weight_sensitivity
+from governance_engine.simulation import coarse_histogram, monte_carlo_adjustment, simulate_adjustment
+from governance_engine.store import GovernanceStore
+from governance_engine.streaming import HIST_EDGES, stream_evaluate
+from governance_engine.trajectory import simulate_trajectories
+
+STREAM_THRESHOLD_BYTES = 50 * 1024 * 1024
+# حد زمني لحساب Bootstrap في التبويب 3 حتى يبقى التفاعل سريعًا مع الملفات الكبيرة
+BOOTSTRAP_TIME_BUDGET = 5.0
+# حد أمان زمني لتحليل حساسية الأوزان في التبويب 4 (100 ألف مؤسسة × 1000 نظام نحو 10 ث على نواة واحدة)؛
+# عند بلوغه تُعرض نتائج الأنظمة التي اكتملت
+SENSITIVITY_TIME_BUDGET = 60.0
+# عدد التشغيلات الأخيرة المحفوظة في لوحة التشخيص لكل جلسة
+PROFILE_HISTORY_RUNS = 20
+# أكبر عدد مؤسسات في قائمة الاختيار؛ بعده يُكتب اسم المؤسسة بدل إرسال القائمة كلها إلى المتصفح
+MAX_SELECT_OPTIONS = 5000
+ISSUE_LABELS = {"missing": "قيمة ناقصة", "non_numeric": "قيمة غير رقمية", "out_of_range": "خارج المدى 0-10",
+                "duplicate": "مؤسسة وفترة مكررة", "jump": "قفزة بين فترتين", "robust_z": "قيمة شاذة (z المعدّل)",
+                "mahalanobis": "صف شاذ (ماهالانوبيس)"}
+PEER_COLUMNS = {"entity": "المؤسسة", "score": "الدرجة", "rank": "الترتيب", "band": "التصنيف", "distance": "المسافة"}
 
 st.set_page_config(page_title="منصة الحوكمة المتقدمة", layout="wide")
 
@@ -15,20 +82,214 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+
+# ذاكرة مؤقتة مشتركة بين إعادة التشغيل والجلسات: الجداول في ملفات Arrow مفتوحة بـ memory-map والنتائج المشتقة في الذاكرة
+@st.cache_resource
+def get_caches():
+    return SharedFrameCache(), LRUCache()
+
+
+shared_frames, result_cache = get_caches()
+
+
+def session_active(session_id):
+    from streamlit import runtime
+
+    return not runtime.exists() or runtime.get_instance().is_active_session(session_id)
+
+
+# كل جلسة تسجل الجداول المشتركة التي يستخدمها التشغيل الحالي (عدد المراجع لكل جدول)
+_run_ctx = get_script_run_ctx()
+frame_cache = shared_frames.session(_run_ctx.session_id if _run_ctx is not None else "local")
+
+
+def show_ingest_report(ingested, key):
+    """ملخص التحقق من الملف المرفوع: الأعمدة الناقصة والصفوف ذات القيم غير الصالحة."""
+    if ingested.missing_columns:
+        st.warning(f"⚠️ أعمدة مطلوبة غير موجودة: {', '.join(ingested.missing_columns)}")
+    if ingested.bad_rows:
+        with st.expander(f"🧾 تقرير جودة البيانات: {ingested.bad_rows:,} صف بقيم ناقصة أو غير صالحة"):
+            report = ingested.issues.assign(issue=ingested.issues["issue"].map(ISSUE_LABELS)).rename(
+                columns={"row": "الصف", "column": "العمود", "value": "القيمة", "issue": "المشكلة"})
+            st.dataframe(report.head(1000), hide_index=True)
+            st.download_button("⬇️ تنزيل التقرير (CSV)", report.to_csv(index=False).encode("utf-8-sig"),
+                               file_name="data_quality_report.csv", mime="text/csv", key=key)
+
+
+def screening_panel(df, ingested, key, columns, jump=DEFAULT_JUMP):
+    """فحص الشذوذ على الملف المرفوع مع خيار استبعاد الصفوف المُعلَّمة من التحليل.
+
+    يعيد الجدول المستخدم بعد الفحص ومفتاحه: مفتاح الملف نفسه، أو مفتاحًا جديدًا إذا استُبعدت صفوف،
+    حتى لا تختلط النتائج المحفوظة للجدولين.
+    """
+    with st.expander("🔎 فحص الشذوذ وجودة البيانات"):
+        st.caption("الصفوف المكررة والقفزات بين الفترات المتتالية لنفس المؤسسة والقيم الشاذة أحاديًا "
+                   "(z المعدّل) ومتعددة المتغيرات (مسافة ماهالانوبيس)، في تمريرة واحدة على الجدول كله.")
+        all_cols = ["(بدون)"] + df.columns.tolist()
+        key_cols = st.columns(2)
+        entity_col = key_cols[0].selectbox("🏦 عمود المؤسسة", all_cols, key=f"{key}_entity", persist_state="session")
+        period_col = key_cols[1].selectbox("📅 عمود الفترة", all_cols, key=f"{key}_period", persist_state="session")
+        entity_col = None if entity_col == "(بدون)" else entity_col
+        period_col = None if period_col == "(بدون)" or entity_col is None else period_col
+        if entity_col is not None and entity_col == period_col:
+            st.warning("⚠️ اختر عمودين مختلفين للمؤسسة والفترة.")
+            return df, ingested.key
+        columns = [c for c in columns if c not in (entity_col, period_col)]
+        with profiler.stage(STAGE_SCORE):
+            screened = result_cache.get_or_compute(
+                make_key(key, ingested.key, entity_col, period_col, tuple(columns), jump),
+                screen_frame, df, entity_col, period_col, columns, ingested.issues, jump,
+            )
+        flagged = int(screened.flagged.sum())
+        if not flagged:
+            st.success("✅ لم تُرصد مشكلات في البيانات.")
+            return df, ingested.key
+        st.metric("الصفوف المُعلَّمة", f"{flagged:,} من {len(df):,}")
+        summary = screened.summary.assign(
+            issue=screened.summary["issue"].map(ISSUE_LABELS),
+            column=screened.summary["column"].replace("*", "كل المؤشرات"),
+        )
+        st.dataframe(summary.rename(columns={"issue": "المشكلة", "column": "العمود", "cells": "عدد الخلايا",
+                                             "rows": "عدد الصفوف"}), hide_index=True)
+        report = screened.issues.assign(issue=screened.issues["issue"].map(ISSUE_LABELS)).rename(
+            columns={"row": "الصف", "column": "العمود", "value": "القيمة", "issue": "المشكلة"})
+        st.dataframe(report.head(1000), hide_index=True)
+        st.download_button("⬇️ تنزيل تقرير الفحص (CSV)", report.to_csv(index=False).encode("utf-8-sig"),
+                           file_name="screening_report.csv", mime="text/csv", key=f"{key}_download")
+        if st.checkbox("🚫 استبعاد الصفوف المُعلَّمة من التحليل", key=f"{key}_exclude", persist_state="session"):
+            st.info(f"ℹ️ تم استبعاد {flagged:,} صف من المتوسطات والانحدارات.")
+            return df[~screened.flagged], make_key(ingested.key, key, entity_col, period_col, tuple(columns), jump)
+    return df, ingested.key
+
+
+def plot(fig):
+    # تحويل الرسم إلى JSON وإرساله يُقاس كمرحلة render في التبويب الحالي
+    with profiler.stage(STAGE_RENDER):
+        st.plotly_chart(fig)
+
+
+# file: الملف في أداة الرفع (None بعد مغادرة التبويب)، و key بصمة محتواه في ذاكرة الجداول
+KeptUpload = namedtuple("KeptUpload", ["widget", "name", "size", "file_id", "key", "file"])
+
+
+def _kept_ref(key, uploaded):
+    return KeptUpload(key, uploaded.name, uploaded.size, uploaded.file_id, content_hash(uploaded.getvalue()), None)
+
+
+def _keep_upload(key):
+    uploaded = st.session_state[key]
+    st.session_state[f"{key}_kept"] = None if uploaded is None else _kept_ref(key, uploaded)
+
+
+def kept_upload(label, types, key):
+    """file_uploader يبقى ملفه متاحًا بعد الانتقال إلى تبويب آخر.
+
+    عناصر التبويب المخفي لا تُرسم فتفقد قيمتها. لا تُحفظ بايتات الملف في الجلسة، بل اسمه وبصمة محتواه فقط،
+    ويُعاد تحميل جدوله من ذاكرة الجداول المشتركة بالبصمة (open_upload) حتى يُزال.
+    """
+    kept = f"{key}_kept"
+    uploaded = st.file_uploader(label, type=types, key=key, on_change=_keep_upload, args=(key,))
+    ref = st.session_state.get(kept)
+    if uploaded is not None:
+        if ref is None or ref.file_id != uploaded.file_id:
+            ref = st.session_state[kept] = _kept_ref(key, uploaded)
+        uploaded.seek(0)
+        return ref._replace(file=uploaded)
+    if ref is not None:
+        cols = st.columns([5, 1])
+        cols[0].caption(f"📎 الملف المرفوع سابقًا: {ref.name}")
+        cols[1].button("✖️ إزالة", key=f"{key}_drop", on_click=st.session_state.pop, args=(kept, None))
+    return ref
+
+
+def open_upload(upload, load, reload):
+    """load(الملف) ما دام الملف في أداة الرفع، وإلا reload(البصمة) من الذاكرة المؤقتة.
+
+    إذا أُخلي المحتوى من الذاكرة يُنسى الملف ويُطلب رفعه من جديد، ويعاد None.
+    """
+    if upload.file is not None:
+        return load(upload.file)
+    value = reload(upload.key)
+    if value is None:
+        st.session_state.pop(f"{upload.widget}_kept", None)
+        st.warning(f"⚠️ لم يعد الملف «{upload.name}» محفوظًا، الرجاء رفعه من جديد.")
+    return value
+
+
+def kept_editor(table, key):
+    """data_editor تبقى تعديلاته بعد التنقل بين التبويبات: آخر جدول معدّل يصبح نقطة البداية عند العودة."""
+    edited = st.data_editor(st.session_state.get("kept_tables", {}).get(key, table), num_rows="dynamic", key=key)
+    st.session_state.setdefault("edited_tables", {})[key] = edited
+    return edited
+
+
+def keep_tables():
+    # عند تغيير التبويب: حالة التعديل تُفقد مع إخفاء الجدول، فيُحفظ الجدول المعدّل نفسه
+    st.session_state["kept_tables"] = dict(st.session_state.get("edited_tables", {}))
+
+
+def peer_panel(index, key):
+    """ترتيب مؤسسة بين نظرائها في فترة وأقرب النظراء لها، من فهرس مبني مسبقًا دون إعادة ترتيب الجدول."""
+    cols = st.columns(3)
+    period = cols[0].selectbox("📅 الفترة", index.periods[::-1], key=f"{key}_period", persist_state="session")
+    candidates = index.entities_in(period)
+    if len(candidates) <= MAX_SELECT_OPTIONS:
+        entity = cols[1].selectbox("🏦 المؤسسة", candidates, key=f"{key}_entity", persist_state="session")
+    else:
+        entity = cols[1].text_input(f"🏦 المؤسسة (من {len(candidates):,})", key=f"{key}_entity",
+                                    persist_state="session")
+    k = int(cols[2].number_input("عدد النظراء", 1, 100, DEFAULT_PEERS, key=f"{key}_k", persist_state="session"))
+    if not entity:
+        return
+    try:
+        with profiler.stage(STAGE_FIT):
+            rank = index.rank(entity, period)
+            nearest = index.nearest(entity, period, k)
+            top = index.top(period, k)
+    except KeyError:
+        st.warning("⚠️ لا توجد مشاهدة لهذه المؤسسة في الفترة المختارة.")
+        return
+
+    m1, m2, m3 = st.columns(3)
+    m1.metric("الدرجة", f"{rank.score:.2f}")
+    m2.metric("الترتيب بين النظراء", f"{rank.rank:,} من {rank.peers:,}")
+    m3.metric("المئين", f"{rank.percentile:.1f}")
+    st.markdown(f"##### 🤝 أقرب {len(nearest)} مؤسسة حسب المؤشرات الفرعية")
+    st.dataframe(nearest.rename(columns=PEER_COLUMNS).style.format(precision=2), hide_index=True)
+    st.markdown(f"##### 🏆 أعلى {len(top)} مؤسسة في {period}")
+    st.dataframe(top.rename(columns=PEER_COLUMNS).style.format(precision=2), hide_index=True)
+
+
+@st.cache_resource
+def get_store():
+    return GovernanceStore()
+
+
+store = get_store()
+
+
+@st.cache_resource
+def get_portfolio_problem(n, solver, structure):
+    return PortfolioProblem(n, solver, structure)
+
+# التشخيص: زمن كل مرحلة وذروة الذاكرة في كل تبويب، يُفعّل من الشريط الجانبي أو GOVERNANCE_PROFILE=1
+with st.sidebar:
+    st.subheader("🩺 التشخيص")
+    profiling_on = st.checkbox("قياس زمن المراحل والذاكرة", value=PROFILE_ENABLED, key="profiling")
+    profiling_memory = st.checkbox("تتبع الذاكرة (tracemalloc)", value=True, key="profiling_memory",
+                                   disabled=not profiling_on)
+
+if "profiler" in st.session_state:
+    # تشغيل سابق انقطع قبل نهايته: يُغلق حتى لا يبقى tracemalloc قيد التشغيل
+    st.session_state["profiler"].close()
+profiler = Profiler(profiling_on, profiling_memory)
+st.session_state["profiler"] = profiler
+
 st.title("📊 منصة محاكاة وتقييم الحوكمة المتقدمة في البنوك التشاركية")
 st.markdown("💡 هذه المنصة تفاعلية تساعد على قياس جودة الحوكمة في البنوك التشاركية، ومحاكاة تأثيرها على الأداء المالي وسرعة تعديل رأس المال. مناسبة للباحثين، الطلاب، والممارسين.")
 
-# تبويبات رئيسية
-tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
-    "1️⃣ إدخال مؤشرات الحوكمة",
-    "2️⃣ محاكاة تعديل رأس المال",
-    "3️⃣ تحليل الأداء المالي",
-    "4️⃣ تقييم جودة الحوكمة",
-    "5️⃣ تحسين رأس المال",
-    "6️⃣ تحسين العائد"
-])
-
-with tab1:
+
+def indicators_tab():
     st.subheader("1️⃣ إدخال مؤشرات الحوكمة")
     st.markdown("📝 في هذا القسم يمكنك إدخال درجات تقييم مكونات الحوكمة للبنك مثل الشفافية، الاستقلالية، والمخاطر. سيتم حساب مؤشر الحوكمة الكلي بناءً على هذه القيم لتُستخدم لاحقًا في التحليل والمحاكاة.")
     
@@ -45,20 +306,24 @@ with tab1:
         كل مؤشر يُقيَّم من 0 إلى 10، ويُحسب المؤشر النهائي كمتوسط مرجّح يعكس مستوى الحوكمة المؤسسية.
         """)
 
-    transparency = st.number_input("الشفافية والإفصاح", min_value=0.0, max_value=10.0, value=6.0, step=0.1, format="%.1f")
-    board_independence = st.number_input("استقلالية مجلس الإدارة", min_value=0.0, max_value=10.0, value=5.0, step=0.1, format="%.1f")
-    audit_committee = st.number_input("فاعلية لجنة المراجعة", min_value=0.0, max_value=10.0, value=7.0, step=0.1, format="%.1f")
-    risk_committee = st.number_input("دور لجنة المخاطر", min_value=0.0, max_value=10.0, value=4.0, step=0.1, format="%.1f")
-    shareholder_rights = st.number_input("حماية حقوق المساهمين", min_value=0.0, max_value=10.0, value=6.0, step=0.1, format="%.1f")
+    transparency = st.number_input("الشفافية والإفصاح", min_value=0.0, max_value=10.0, value=6.0, step=0.1, format="%.1f", key="transparency",
+                                   persist_state="session")
+    board_independence = st.number_input("استقلالية مجلس الإدارة", min_value=0.0, max_value=10.0, value=5.0, step=0.1, format="%.1f", key="board",
+                                         persist_state="session")
+    audit_committee = st.number_input("فاعلية لجنة المراجعة", min_value=0.0, max_value=10.0, value=7.0, step=0.1, format="%.1f", key="audit",
+                                      persist_state="session")
+    risk_committee = st.number_input("دور لجنة المخاطر", min_value=0.0, max_value=10.0, value=4.0, step=0.1, format="%.1f", key="risk",
+                                     persist_state="session")
+    shareholder_rights = st.number_input("حماية حقوق المساهمين", min_value=0.0, max_value=10.0, value=6.0, step=0.1, format="%.1f", key="shareholders",
+                                         persist_state="session")
+    weight_scheme = st.selectbox(
+        "⚖️ نظام الأوزان", list(WEIGHT_SCHEMES), key="weight_scheme", persist_state="session",
+        format_func=lambda name: f"{name} ({' / '.join(f'{w:.0%}' for w in WEIGHT_SCHEMES[name])})",
+    )
 
     if st.button("حساب مؤشر الحوكمة"):
-        weights = {
-            "transparency": 0.25,
-            "board": 0.25,
-            "audit": 0.2,
-            "risk": 0.15,
-            "shareholders": 0.15
-        }
+        # plotly يُحمّل عند أول رسم فقط، لا عند بدء التطبيق
+        import plotly.express as px
 
         governance_metrics = {
             "transparency": transparency,
@@ -68,7 +333,9 @@ with tab1:
             "shareholders": shareholder_rights
         }
 
-        governance_score = sum(governance_metrics[k] * weights[k] for k in governance_metrics)
+        metrics_row = list(governance_metrics.values())
+        with profiler.stage(STAGE_SCORE):
+            governance_score = float(compute_scores(metrics_row, weight_scheme)[0])
 
         st.session_state["governance_score"] = governance_score
 
@@ -113,10 +380,10 @@ with tab1:
         )
         
         # عرض الرسم البياني
-        st.plotly_chart(fig_bar)
+        plot(fig_bar)
         
         # حساب المساهمة النسبية (النسبة المئوية)
-        percentages = {k: governance_metrics[k] * weights[k] * 10 for k in governance_metrics}
+        percentages = dict(zip(governance_metrics, contributions(metrics_row, weight_scheme)[0]))
 
         labels_ar = {
             "transparency": "الشفافية",
@@ -172,7 +439,8 @@ with tab1:
                 "مؤشر الحوكمة منخفض، وهذا يشير إلى مخاطر على استدامة البنك ويستلزم إجراءات تحسين فورية."
             )
 
-with tab2:
+
+def adjustment_tab():
     st.subheader("2️⃣ محاكاة تعديل رأس المال")
     st.markdown("📊 في هذا القسم يمكنك محاكاة مدى سرعة استجابة البنك لتعديل رأس ماله عند حدوث صدمة مالية. تعتمد النتيجة على مستوى الحوكمة ونوع الصدمة وقيمة رأس المال.")
 
@@ -191,21 +459,27 @@ with tab2:
             - خسائر تشغيلية = 0.5
             - تشديد رقابي = 0.4
         - 📈 كلما ارتفع مؤشر الحوكمة، قلت المدة الزمنية.
+        - 📉 مسار رأس المال يومي: تقع خسارة الصدمة ثم تُسد الفجوة تدريجيًا بحيث يُسترد 99% منها خلال المدة أعلاه،
+          مع تذبذب يومي عشوائي؛ ويُعرض الوسيط والمئينان 5 و 95 عبر المسارات.
         """)
 
     if "governance_score" not in st.session_state:
         st.error("⚠️ الرجاء إدخال مؤشرات الحوكمة أولاً في التبويب 1.")
     else:
-        capital = st.number_input("رأس المال الحالي (بالدرهم)", min_value=0.00, value=100.0)
-        shock_type = st.selectbox("نوع الصدمة", ["انخفاض في السيولة", "خسائر تشغيلية", "تشديد رقابي"])
-
-        def simulate_adjustment(capital, governance_score, shock_type):
-            impact = {"انخفاض في السيولة": 0.3, "خسائر تشغيلية": 0.5, "تشديد رقابي": 0.4}
-            duration = (capital * impact[shock_type]) / (governance_score + 1)
-            return round(duration, 2)
+        capital = st.number_input("رأس المال الحالي (بالدرهم)", min_value=0.00, value=100.0, key="capital", persist_state="session")
+        shock_type = st.selectbox("نوع الصدمة", ["انخفاض في السيولة", "خسائر تشغيلية", "تشديد رقابي"],
+                                  key="shock_type", persist_state="session")
+        path_cols = st.columns(3)
+        horizon = path_cols[0].number_input("أفق المسار (يوم)", 30, 3650, 90, step=30,
+                                            key="path_horizon", persist_state="session")
+        path_scenarios = path_cols[1].selectbox("عدد المسارات", [1, 100, 1000, 10_000], index=2,
+                                                key="path_scenarios", persist_state="session")
+        daily_vol = path_cols[2].number_input("التذبذب اليومي لرأس المال", 0.0, 0.1, 0.005, step=0.001,
+                                              format="%.3f", key="path_daily_vol", persist_state="session")
 
         if st.button("تنفيذ المحاكاة"):
-            days = simulate_adjustment(capital, st.session_state["governance_score"], shock_type)
+            with profiler.stage(STAGE_FIT):
+                days = simulate_adjustment(capital, st.session_state["governance_score"], shock_type)
             st.success(f"⏱️ الزمن التقديري لتعديل رأس المال: **{days} يومًا**")
 
             if days <= 7:
@@ -215,13 +489,25 @@ with tab2:
             else:
                 st.error("❗ استجابة بطيئة، قد تؤثر على الاستقرار المالي.")
 
-            timeline = list(range(1, int(days) + 1))
-            values = [capital - (i * capital * 0.025) for i in timeline]
-            df_chart = pd.DataFrame({"يوم": timeline, "رأس المال المتوقع": values})
+            # مسار رأس المال يومًا بيوم: خسارة الصدمة ثم تعافٍ تحدد سرعته الحوكمة، عبر مسارات عشوائية
+            with profiler.stage(STAGE_FIT):
+                traj = simulate_trajectories(
+                    capital, st.session_state["governance_score"], shock_type, horizon=horizon,
+                    n_scenarios=path_scenarios, impact_vol=0.25 if path_scenarios > 1 else 0.0,
+                    daily_vol=daily_vol, max_points=MAX_CHART_POINTS, seed=42,
+                )
+            df_chart = pd.DataFrame({"يوم": traj.days, "رأس المال المتوقع (الوسيط)": capital * traj.percentiles[50]})
+            if path_scenarios > 1:
+                df_chart["المئين 5"] = capital * traj.percentiles[5]
+                df_chart["المئين 95"] = capital * traj.percentiles[95]
             st.line_chart(df_chart.set_index("يوم"))
 
-            decrease_pct = round((capital - values[-1]) / capital * 100, 2)
-            st.metric(label="النسبة المئوية للانخفاض في رأس المال", value=f"{decrease_pct}%")
+            bank = traj.banks.iloc[0]
+            t1, t2, t3 = st.columns(3)
+            t1.metric("أقصى انخفاض في رأس المال", f"{bank['max_drawdown']:.2%}")
+            recovery = bank["recovery_median"]
+            t2.metric("زمن التعافي (الوسيط)", f"{recovery:.0f} يوم" if np.isfinite(recovery) else "خارج الأفق")
+            t3.metric("احتمال التعافي خلال الأفق", f"{bank['prob_recovered']:.1%}")
 
             st.markdown("###  توصيات مخصصة:")
             if st.session_state["governance_score"] < 6:
@@ -252,7 +538,69 @@ with tab2:
                     "مما قد يعرض البنك لمخاطر مالية كبيرة ويحتاج إلى إصلاحات عاجلة في الحوكمة وإدارة المخاطر."
                 )
 
-with tab3:
+        # --- اختبار الضغط: محاكاة مونت كارلو ---
+        st.markdown("---")
+        st.markdown("### 🎲 اختبار الضغط (محاكاة مونت كارلو)")
+        with st.expander("📘 ما هي افتراضات المحاكاة؟"):
+            st.markdown("""
+            - ⚠️ معامل كل صدمة عشوائي (توزيع لوغاريتمي طبيعي متوسطه المعامل الثابت).
+            - 🔗 الصدمات مترابطة، وقد تتزامن صدمات أخرى مع الصدمة المختارة.
+            - 📏 مؤشر الحوكمة غير مؤكد ويتغير حول القيمة المدخلة.
+            - 📉 النتائج: توزيع المدة، المئينات (VaR)، العجز المتوقع (ES) واحتمال تجاوز 14 يومًا.
+            """)
+
+        mc_cols = st.columns(3)
+        n_scenarios = mc_cols[0].selectbox("عدد السيناريوهات", [10_000, 100_000, 1_000_000, 5_000_000], index=1,
+                                           key="mc_scenarios", persist_state="session")
+        impact_vol = mc_cols[1].number_input("تذبذب معامل الصدمة", 0.0, 2.0, 0.25, step=0.05,
+                                             key="mc_impact_vol", persist_state="session")
+        score_sd = mc_cols[2].number_input("عدم اليقين في مؤشر الحوكمة", 0.0, 5.0, 0.5, step=0.1,
+                                           key="mc_score_sd", persist_state="session")
+        correlation = mc_cols[0].number_input("الارتباط بين أنواع الصدمات", -0.4, 0.99, 0.5, step=0.05,
+                                              key="mc_correlation", persist_state="session")
+        contagion_prob = mc_cols[1].number_input("احتمال تزامن صدمة أخرى", 0.0, 1.0, 0.1, step=0.05,
+                                                 key="mc_contagion", persist_state="session")
+        seed = mc_cols[2].number_input("البذرة العشوائية", 0, 2**31 - 1, 42,
+                                       key="mc_seed", persist_state="session")
+
+        if st.button("🎲 تنفيذ محاكاة مونت كارلو"):
+            import plotly.express as px
+
+            with profiler.stage(STAGE_FIT):
+                mc = monte_carlo_adjustment(
+                    capital, st.session_state["governance_score"], shock_type, n_scenarios=n_scenarios,
+                    impact_vol=impact_vol, score_sd=score_sd, correlation=correlation,
+                    contagion_prob=contagion_prob, seed=int(seed),
+                )
+
+            m1, m2, m3, m4 = st.columns(4)
+            m1.metric("متوسط المدة", f"{mc.mean:.2f} يوم")
+            m2.metric("المئين 95 (VaR)", f"{mc.percentiles[95]:.2f} يوم")
+            m3.metric("العجز المتوقع 95 (ES)", f"{mc.expected_shortfall[95]:.2f} يوم")
+            m4.metric("احتمال تجاوز 14 يومًا", f"{mc.prob_exceed:.1%}")
+
+            df_pct = pd.DataFrame({
+                "المئين": [f"P{q}" for q in mc.percentiles],
+                "المدة (يوم)": list(mc.percentiles.values()),
+                "العجز المتوقع (يوم)": list(mc.expected_shortfall.values()),
+            })
+            st.table(df_pct.style.format({"المدة (يوم)": "{:.2f}", "العجز المتوقع (يوم)": "{:.2f}"}))
+
+            centers, hist_counts = coarse_histogram(mc)
+            df_hist = pd.DataFrame({"المدة (يوم)": centers, "عدد السيناريوهات": hist_counts})
+            fig_mc = px.bar(df_hist, x="المدة (يوم)", y="عدد السيناريوهات", title="توزيع مدة تعديل رأس المال")
+            fig_mc.add_vline(x=14, line_dash="dash", line_color="red")
+            plot(fig_mc)
+
+            if mc.prob_exceed >= 0.25:
+                st.error("❗ احتمال مرتفع لتجاوز 14 يومًا في سيناريوهات الضغط، ينصح بتعزيز الحوكمة والسيولة.")
+            elif mc.prob_exceed >= 0.05:
+                st.warning("⚠️ احتمال غير مهمل لاستجابة بطيئة في سيناريوهات الضغط.")
+            else:
+                st.success("✅ البنك يحافظ على استجابة مقبولة في أغلب سيناريوهات الضغط.")
+
+
+def performance_tab():
     st.subheader("3️⃣ تحليل الأداء المالي")
 
     st.markdown("📊 في هذا القسم يمكنك تحليل العلاقة بين مؤشرات الحوكمة والأداء المالي للبنك باستخدام معامل الارتباط بيرسون. يتم ذلك بناءً على الملف الذي تقوم بتحميله والذي يحتوي على مؤشرات مالية مثل ROA، ROE، وغيرها.")
@@ -278,42 +626,141 @@ with tab3:
     if "governance_score" not in st.session_state:
         st.error("⚠️ الرجاء إدخال مؤشرات الحوكمة أولاً في التبويب 1.")
     else:
-        uploaded_file = st.file_uploader("📁 ارفع ملف الأداء المالي (CSV أو Excel)", type=["csv", "xlsx"])
-        if uploaded_file:
-            if uploaded_file.name.endswith("csv"):
-                df = pd.read_csv(uploaded_file)
-            else:
-                df = pd.read_excel(uploaded_file)
+        upload = kept_upload("📁 ارفع ملف الأداء المالي (CSV أو Excel)", ["csv", "xlsx"], "tab3_file")
+        ingested = None
+        if upload:
+            with profiler.stage(STAGE_READ):
+                ingested = open_upload(upload,
+                                       lambda f: ingest_upload(f.getvalue(), f.name, frame_cache, required=()),
+                                       lambda key: reload_ingested(key, frame_cache, required=()))
+        if ingested is not None:
+            import plotly.express as px
+
+            df = ingested.frame
 
             st.dataframe(df.head())
+            show_ingest_report(ingested, "tab3_issues")
+            # مقاييس المؤشرات المالية مختلفة، فلا يُطبق عليها حد القفزات بنقاط مقياس الحوكمة
+            df, file_key = screening_panel(df, ingested, "tab3_screening",
+                                           df.select_dtypes(include=["float", "int"]).columns.tolist(), jump=None)
 
+            fill_score = None
             if "Governance_Score" not in df.columns:
-                df["Governance_Score"] = st.session_state["governance_score"]
+                fill_score = st.session_state["governance_score"]
+                df["Governance_Score"] = fill_score
                 st.info("✅ تم إضافة عمود مؤشر الحوكمة تلقائيًا.")
 
             num_cols = df.select_dtypes(include=["float", "int"]).columns.tolist()
             if "Governance_Score" in num_cols:
                 num_cols.remove("Governance_Score")
 
-            if num_cols:
+            analysis_mode = st.radio("🔎 نمط التحليل", ["مؤشر واحد", "جميع المؤشرات", "بيانات البانل (آثار ثابتة)"],
+                                     horizontal=True, key="tab3_mode", persist_state="session")
+
+            if num_cols and analysis_mode == "جميع المؤشرات":
+                # كل المؤشرات في تمريرة مصفوفية واحدة بدل إعادة التشغيل لكل مؤشر
+                with profiler.stage(STAGE_FIT):
+                    screen = result_cache.get_or_compute(make_key("tab3_screen", file_key, fill_score),
+                                                         metric_screen, df, num_cols)
+                st.markdown(f"### 📋 ترتيب {len(screen)} مؤشرًا حسب قوة الارتباط مع الحوكمة")
+                st.dataframe(
+                    screen.rename(columns={
+                        "metric": "المؤشر", "n": "عدد المشاهدات", "pearson": "ارتباط بيرسون",
+                        "spearman": "ارتباط سبيرمان", "slope": "الميل", "intercept": "الثابت", "r2": "R²",
+                        "mae": "MAE", "mse": "MSE", "rmse": "RMSE", "strength": "قوة العلاقة",
+                    }).style.format({
+                        "ارتباط بيرسون": "{:.3f}", "ارتباط سبيرمان": "{:.3f}", "الميل": "{:.3f}",
+                        "الثابت": "{:.3f}", "R²": "{:.3f}", "MAE": "{:.3f}", "MSE": "{:.3f}", "RMSE": "{:.3f}",
+                    }),
+                    hide_index=True,
+                )
+                top = screen.head(20)
+                fig_screen = px.bar(top, x="metric", y="pearson", color="strength",
+                                    labels={"metric": "المؤشر", "pearson": "ارتباط بيرسون", "strength": "قوة العلاقة"},
+                                    title="أقوى 20 مؤشرًا ارتباطًا بالحوكمة")
+                plot(fig_screen)
+            elif num_cols and analysis_mode.startswith("بيانات البانل"):
+                st.markdown("### 🏦 انحدار بيانات البانل (مؤسسة × سنة)")
+                st.caption("تُزال الآثار الثابتة لكل مؤسسة (وكل سنة اختياريًا) بطرح المتوسطات، والأخطاء المعيارية مجمّعة حسب المؤسسة.")
+                all_cols = df.columns.tolist()
+                panel_cols = st.columns(3)
+                entity_col = panel_cols[0].selectbox("🏦 عمود المؤسسة", all_cols, key="panel_entity")
+                time_options = ["(بدون)"] + [c for c in all_cols if c != entity_col]
+                time_col = panel_cols[1].selectbox("📅 عمود السنة", time_options, key="panel_time")
+                dep_var = panel_cols[2].selectbox("🎯 المتغير التابع", num_cols, key="panel_y")
+                regressor_options = [c for c in ["Governance_Score"] + INDICATORS + num_cols
+                                     if c in df.columns and c not in (dep_var, entity_col, time_col)]
+                regressor_options = list(dict.fromkeys(regressor_options))
+                default_regressors = [c for c in INDICATORS if c in regressor_options] or regressor_options[:1]
+                regressors = st.multiselect("📊 المتغيرات المستقلة", regressor_options, default=default_regressors,
+                                            key="panel_x")
+                time_effects = st.checkbox("إضافة آثار ثابتة للسنوات", value=time_col != "(بدون)",
+                                           disabled=time_col == "(بدون)", key="panel_time_fx")
+
+                if regressors:
+                    panel_key = make_key("tab3_panel", file_key, fill_score, entity_col, time_col, dep_var,
+                                         tuple(regressors), time_effects)
+                    try:
+                        panel = result_cache.get_or_compute(
+                            panel_key, panel_regression, df, dep_var, regressors, entity_col,
+                            None if time_col == "(بدون)" else time_col, time_effects,
+                        )
+                    except ValueError as exc:
+                        panel = None
+                        st.warning(f"⚠️ تعذر تقدير النموذج: {exc}")
+
+                    if panel is not None:
+                        p1, p2, p3 = st.columns(3)
+                        p1.metric("عدد المشاهدات", f"{panel.n_obs:,}")
+                        p2.metric("عدد المؤسسات", f"{panel.n_entities:,}")
+                        p3.metric("R² داخل المؤسسات", f"{panel.r2_within:.3f}")
+                        st.dataframe(
+                            panel.coefficients.rename(columns={
+                                "variable": "المتغير", "coef": "المعامل", "std_err": "الخطأ المعياري (مجمّع)",
+                                "t": "t", "p_value": "القيمة الاحتمالية", "ci_low": "حد أدنى 95%", "ci_high": "حد أعلى 95%",
+                            }).style.format(precision=4),
+                            hide_index=True,
+                        )
+                        if panel.dropped:
+                            st.info(f"ℹ️ تم استبعاد متغيرات ثابتة داخل كل مؤسسة: {', '.join(map(str, panel.dropped))}")
+            elif num_cols:
                 selected_metric = st.selectbox("📈 اختر مؤشرًا ماليًا للتحليل", num_cols)
 
-                df_clean = df[["Governance_Score", selected_metric]].copy()
-                df_clean["Governance_Score"] = pd.to_numeric(df_clean["Governance_Score"], errors="coerce")
-                df_clean[selected_metric] = pd.to_numeric(df_clean[selected_metric], errors="coerce")
-                df_clean = df_clean.dropna()
+                analysis_key = make_key("tab3", file_key, selected_metric, fill_score)
+                with profiler.stage(STAGE_FIT):
+                    df_clean, analysis = result_cache.get_or_compute(analysis_key, clean_and_analyze, df,
+                                                                     selected_metric)
 
-                if df_clean["Governance_Score"].nunique() <= 1 or df_clean[selected_metric].nunique() <= 1:
+                if analysis["corr"] is None:
                     st.warning("⚠️ البيانات لا تحتوي على تباين كافٍ لحساب معامل الارتباط.")
                 else:
-                    corr = df_clean["Governance_Score"].corr(df_clean[selected_metric])
+                    corr = analysis["corr"]
                     st.metric(label="📊 معامل الارتباط", value=f"{corr:.2f}")
 
-                    fig = px.scatter(df_clean, x="Governance_Score", y=selected_metric,
-                                     trendline="ols",
-                                     title=f"العلاقة بين الحوكمة و {selected_metric}",
-                                     labels={"Governance_Score": "مؤشر الحوكمة", selected_metric: selected_metric})
-                    st.plotly_chart(fig)
+                    # مع البيانات الكبيرة يُرسل إلى المتصفح عدد محدود من النقاط أو شبكة كثافة فقط
+                    plot_title = f"العلاقة بين الحوكمة و {selected_metric}"
+                    plot_labels = {"Governance_Score": "مؤشر الحوكمة", selected_metric: selected_metric}
+                    scatter_method = METHOD_RANDOM
+                    if len(df_clean) > MAX_CHART_POINTS:
+                        scatter_options = {"عينة عشوائية": METHOD_RANDOM, "LTTB": METHOD_LTTB,
+                                           "خريطة كثافة": METHOD_DENSITY}
+                        scatter_method = scatter_options[st.radio("🖼️ طريقة عرض النقاط", list(scatter_options),
+                                                                  horizontal=True, key="tab3_scatter")]
+                    if scatter_method == METHOD_DENSITY:
+                        density = density_frame(df_clean["Governance_Score"], df_clean[selected_metric])
+                        fig = px.scatter(density, x="x", y="y", size="count", color="count", title=plot_title,
+                                         labels={"x": "مؤشر الحوكمة", "y": selected_metric, "count": "عدد النقاط"})
+                    else:
+                        fig = px.scatter(downsample(df_clean, "Governance_Score", selected_metric,
+                                                    method=scatter_method),
+                                         x="Governance_Score", y=selected_metric, title=plot_title, labels=plot_labels)
+                    if len(df_clean) > MAX_CHART_POINTS:
+                        st.caption(f"يُعرض ملخص {len(df_clean):,} نقطة؛ الارتباط والانحدار محسوبان على كل البيانات.")
+                    # خط الاتجاه من معاملات الانحدار المحسوبة مسبقًا بدل إعادة التقدير عبر statsmodels
+                    x_line = np.array([df_clean["Governance_Score"].min(), df_clean["Governance_Score"].max()])
+                    fig.add_scatter(x=x_line, y=analysis["intercept"] + analysis["slope"] * x_line,
+                                    mode="lines", name="خط الانحدار (OLS)")
+                    plot(fig)
 
                     # تحليل العلاقة بناءً على القيمة
                     if corr >= 0.7:
@@ -325,6 +772,49 @@ with tab3:
                     else:
                         st.error("❗ لا توجد علاقة واضحة.")
 
+                    with st.expander("🎯 فترات الثقة والقيمة الاحتمالية (Bootstrap واختبار التبديل)"):
+                        st.caption("يُعاد سحب البيانات آلاف المرات لقياس مدى ثبات الارتباط والميل و R²، "
+                                   "خاصة مع العينات الصغيرة.")
+                        boot_cols = st.columns(3)
+                        n_resamples = boot_cols[0].select_slider("عدد العينات", [200, 500, 1000, 2000, 5000, 10000],
+                                                                 value=1000, key="boot_n")
+                        confidence = boot_cols[1].select_slider("مستوى الثقة", [0.8, 0.9, 0.95, 0.99], value=0.95,
+                                                                format_func=lambda c: f"{c:.0%}", key="boot_conf")
+                        parallel = boot_cols[2].checkbox("تنفيذ متوازٍ", value=False, key="boot_parallel")
+                        if st.checkbox("احسب فترات الثقة", key="boot_run"):
+                            boot_key = make_key("tab3_boot", file_key, selected_metric, fill_score, n_resamples,
+                                                confidence, parallel)
+                            try:
+                                with profiler.stage(STAGE_FIT):
+                                    boot = result_cache.get_or_compute(
+                                        boot_key, bootstrap_pair, df_clean, selected_metric, "Governance_Score",
+                                        n_resamples, n_resamples, confidence, 0, None if parallel else 1,
+                                        BOOTSTRAP_TIME_BUDGET,
+                                    )
+                            except ValueError as exc:
+                                boot = None
+                                st.warning(f"⚠️ تعذر حساب فترات الثقة: {exc}")
+
+                            if boot is not None:
+                                table = boot.table.assign(statistic=boot.table["statistic"].map(
+                                    {"corr": "معامل الارتباط", "slope": "الميل", "r2": "R²"}))
+                                st.dataframe(
+                                    table.rename(columns={
+                                        "statistic": "المقياس", "estimate": "التقدير", "std_err": "الخطأ المعياري",
+                                        "ci_low": f"حد أدنى {confidence:.0%}", "ci_high": f"حد أعلى {confidence:.0%}",
+                                        "p_value": "القيمة الاحتمالية",
+                                    }).style.format(precision=4),
+                                    hide_index=True,
+                                )
+                                probs = pd.DataFrame({"المستوى": list(boot.strength_probs),
+                                                      "النسبة": list(boot.strength_probs.values())})
+                                plot(px.bar(probs, x="المستوى", y="النسبة",
+                                            title="احتمال كل مستوى من مستويات قوة العلاقة عبر العينات"))
+                                st.caption(f"{boot.n_resamples:,} عينة Bootstrap و {boot.n_permutations:,} تبديل "
+                                           f"على {boot.n:,} صف في {boot.elapsed:.2f} ثانية.")
+                                if boot.n_resamples < n_resamples:
+                                    st.info("ℹ️ توقف الحساب عند حد الوقت المسموح، وتعتمد النتائج على العينات المنفذة فقط.")
+
                     # تفسير تفصيلي
                     st.markdown("---")
                     st.markdown("#### 📌 تفسير تفصيلي لنتيجة معامل الارتباط:")
@@ -347,18 +837,10 @@ with tab3:
                             "عدم وجود علاقة واضحة يشير إلى ضعف انعكاس الحوكمة على الأداء المالي. يفضل مراجعة الاستراتيجية والبيانات."
                         )
                     # تحليل الانحدار الخطي وتقييم النموذج
-                    if abs(corr) >= 0.4:
-                        X = df_clean[["Governance_Score"]].values
-                        y = df_clean[selected_metric].values
-
-                        model = LinearRegression()
-                        model.fit(X, y)
-                        y_pred = model.predict(X)
-
-                        r2 = model.score(X, y)
-                        mae = mean_absolute_error(y, y_pred)
-                        mse = mean_squared_error(y, y_pred)
-                        rmse = mse ** 0.5
+                    if analysis["regression"] is not None:
+                        reg = analysis["regression"]
+                        slope, intercept = reg["slope"], reg["intercept"]
+                        r2, mae, mse, rmse = reg["r2"], reg["mae"], reg["mse"], reg["rmse"]
 
                         st.markdown("### 🔍 نتائج تحليل الانحدار:")
                         st.metric("📊 معامل التحديد R²", f"{r2:.3f}")
@@ -370,11 +852,11 @@ with tab3:
                         st.markdown(f"#### 📌 معادلة الانحدار:")
                         st.markdown(f"""
                         <div style='background-color:#f0f2f6; padding:15px; border-radius:10px; font-size:18px;'>
-                        💡 <b>{selected_metric} = {model.coef_[0]:.3f} × مؤشر الحوكمة + {model.intercept_:.3f}</b><br><br>
-                        🧮 هذا يعني أنه لكل وحدة زيادة في مؤشر الحوكمة، يرتفع <b>{selected_metric}</b> بمقدار <b>{model.coef_[0]:.3f}</b> نقطة تقريبًا.<br>
-                        📉 عندما يكون مؤشر الحوكمة = 0، فإن القيمة التقديرية لـ <b>{selected_metric}</b> تساوي <b>{model.intercept_:.3f}</b>.<br>
+                        💡 <b>{selected_metric} = {slope:.3f} × مؤشر الحوكمة + {intercept:.3f}</b><br><br>
+                        🧮 هذا يعني أنه لكل وحدة زيادة في مؤشر الحوكمة، يرتفع <b>{selected_metric}</b> بمقدار <b>{slope:.3f}</b> نقطة تقريبًا.<br>
+                        📉 عندما يكون مؤشر الحوكمة = 0، فإن القيمة التقديرية لـ <b>{selected_metric}</b> تساوي <b>{intercept:.3f}</b>.<br>
                         📊 على سبيل المثال، إذا كانت درجة الحوكمة = 7، فإن:<br>
-                        <b>{selected_metric} = {model.coef_[0]:.3f} × 7 + {model.intercept_:.3f} = {(model.coef_[0] * 7 + model.intercept_):.3f}</b>
+                        <b>{selected_metric} = {slope:.3f} × 7 + {intercept:.3f} = {(slope * 7 + intercept):.3f}</b>
                         </div>
                         """, unsafe_allow_html=True)
 
@@ -385,8 +867,13 @@ with tab3:
                             st.info("النموذج يفسر جزءًا معقولًا من التغيرات. مفيد لكن يحتاج دعم بمتغيرات إضافية.")
                         else:
                             st.warning("النموذج ضعيف في تفسير العلاقة. قد تكون العلاقة غير خطية أو هناك متغيرات مؤثرة أخرى.")
-with tab4:
+
+
+def evaluation_tab():
     st.subheader("4️⃣ تقييم جودة الحوكمة")
+    # نظام الأوزان المختار في التبويب 1 يبقى في الجلسة وإن لم يكن التبويب معروضًا
+    weight_scheme = st.session_state.get("weight_scheme", DEFAULT_SCHEME)
+    import plotly.express as px
 
     with st.expander("📘 كيف يتم تقييم الحوكمة من الملفات؟"):
         st.markdown("""
@@ -405,58 +892,230 @@ with tab4:
         - 🧠 توصيات بناءً على الأداء العام للحوكمة في القطاع.
         """)
 
-    uploaded_file = st.file_uploader("📁 ارفع ملف تقييم (Excel أو CSV)", type=["xlsx", "csv"])
-    if uploaded_file:
-        df = pd.read_excel(uploaded_file) if uploaded_file.name.endswith("xlsx") else pd.read_csv(uploaded_file)
-        st.dataframe(df)
-
-        required_cols = ["Transparency", "Board_Independence", "Audit_Committee", "Risk_Committee", "Shareholder_Rights"]
-        if all(col in df.columns for col in required_cols):
-            weights = [0.25, 0.25, 0.2, 0.15, 0.15]
-            df["Governance_Score"] = df[required_cols].dot(weights)
-            st.success("✅ تم احتساب مؤشر الحوكمة")
-            st.dataframe(df[["Governance_Score"]])
-
-            avg_score = df["Governance_Score"].mean()
-            if avg_score >= 8:
-                st.info(f"🏆 متوسط الحوكمة عالي ({avg_score:.2f})، الأداء جيد.")
-            elif avg_score >= 5:
-                st.warning(f"⚠️ متوسط الحوكمة متوسط ({avg_score:.2f})، تفاوت بين المؤسسات.")
+    data_source = st.radio("📂 مصدر البيانات", ["رفع ملف", "مخزن المؤشرات"], horizontal=True, key="tab4_source",
+                           persist_state="session")
+    upload = None
+    if data_source == "رفع ملف":
+        upload = kept_upload("📁 ارفع ملف تقييم (Excel أو CSV)", ["xlsx", "csv"], "tab4_file")
+    scored = False
+
+    if data_source == "مخزن المؤشرات":
+        # المجاميع محفوظة ومحدّثة تراكميًا في المخزن، فلا حاجة لإعادة قراءة أي ملف
+        with profiler.stage(STAGE_READ):
+            overview = store.overview()
+        if overview["count"] == 0:
+            st.info("ℹ️ المخزن فارغ. ارفع ملفًا واحفظه في المخزن أولًا.")
+        else:
+            st.caption(f"📦 {overview['count']:,} مشاهدة محفوظة في المخزن")
+            avg_score = overview["mean"]
+            st.metric("📏 الانحراف المعياري", f"{overview['std']:.2f}")
+            st.dataframe(overview["bands"].rename(columns={"band": "التصنيف", "count": "عدد المؤسسات"}))
+
+            with profiler.stage(STAGE_READ):
+                periods = store.period_summary()
+            if len(periods) > 1:
+                plot(px.line(periods, x="period", y="mean", markers=True,
+                             title="متوسط الحوكمة لكل فترة",
+                             labels={"period": "الفترة", "mean": "متوسط الحوكمة"}))
+            with profiler.stage(STAGE_READ):
+                entities = store.entity_summary()
+            st.markdown("#### 🏦 ملخص المؤسسات")
+            st.dataframe(
+                entities.rename(columns={
+                    "entity": "المؤسسة", "periods": "عدد الفترات", "mean": "المتوسط", "std": "الانحراف المعياري",
+                    "trend": "الاتجاه (نقطة/سنة)", "first_period": "أول سنة", "last_period": "آخر فترة",
+                    "last_score": "آخر درجة", "last_band": "التصنيف الحالي",
+                }).style.format(precision=2),
+                hide_index=True,
+            )
+            with st.expander("🏅 الترتيب بين النظراء وأقرب المؤسسات"):
+                # الفهرس يُبنى مرة لكل حالة للمخزن (تتغير المجاميع مع كل إضافة أو تعديل)
+                with profiler.stage(STAGE_FIT):
+                    peer_index = result_cache.get_or_compute(
+                        make_key("tab4_peers_store", overview["count"], overview["mean"], overview["std"], weight_scheme),
+                        lambda: PeerIndex.from_frame(store.observations(), "entity", "period", weight_scheme),
+                    )
+                peer_panel(peer_index, "peers_store")
+            fig2 = px.bar(overview["histogram"], x="Governance_Score", y="count", title="توزيع درجات الحوكمة")
+            scored = True
+    elif upload:
+        # الملفات الكبيرة تُقرأ على أجزاء مع مجاميع تراكمية وعينة للعرض فقط
+        stream_mode = st.checkbox("⚡ وضع التدفق للملفات الكبيرة (قراءة على أجزاء)",
+                                  value=upload.size > STREAM_THRESHOLD_BYTES,
+                                  key=f"stream_mode_{upload.file_id}", persist_state="session")
+
+        if stream_mode:
+            # لا جدول كامل في وضع التدفق: تُحفظ المجاميع والعينة نفسها بالبصمة لإعادة عرضها دون الملف
+            stream_key = make_key("tab4_stream", upload.key, weight_scheme)
+            try:
+                # القراءة والحساب متداخلان في وضع التدفق فيُقاسان معًا
+                with profiler.stage(STAGE_READ):
+                    result = open_upload(upload,
+                                         lambda f: result_cache.get_or_compute(stream_key, stream_evaluate, f, f.name,
+                                                                               weights=weight_scheme),
+                                         lambda key: result_cache.get(stream_key))
+                if result is None:
+                    upload = None  # أُخلي من الذاكرة وطُلب رفعه من جديد
+            except KeyError:
+                result = None
+            if result is not None and result.stats.count > 0:
+                stats_run = result.stats
+                st.caption(f"عينة عشوائية من {len(result.preview)} صف من أصل {stats_run.count + stats_run.missing} صف")
+                st.dataframe(result.preview)
+                st.success("✅ تم احتساب مؤشر الحوكمة")
+
+                avg_score = stats_run.mean
+                st.metric("📏 الانحراف المعياري", f"{stats_run.std:.2f}")
+                st.dataframe(stats_run.bands_frame().rename(columns={"band": "التصنيف", "count": "عدد المؤسسات"}))
+                fig2 = px.bar(stats_run.histogram_frame(), x="Governance_Score", y="count",
+                              title="توزيع درجات الحوكمة")
+                scored = True
+        else:
+            with profiler.stage(STAGE_READ):
+                ingested = open_upload(upload, lambda f: ingest_upload(f.getvalue(), f.name, frame_cache),
+                                       lambda key: reload_ingested(key, frame_cache))
+            if ingested is None:
+                upload = None  # أُخلي من الذاكرة وطُلب رفعه من جديد
             else:
-                st.error(f"❗ متوسط الحوكمة ضعيف ({avg_score:.2f})، حاجة لتحسين.")
+                df = ingested.frame
+                st.dataframe(df)
+                show_ingest_report(ingested, "tab4_issues")
+
+            if ingested is not None and not ingested.missing_columns:
+                df, data_key = screening_panel(df, ingested, "tab4_screening", INDICATORS)
+                with profiler.stage(STAGE_SCORE):
+                    df["Governance_Score"] = compute_scores(df, weight_scheme)
+                st.success("✅ تم احتساب مؤشر الحوكمة")
+                st.dataframe(df[["Governance_Score"]])
+
+                avg_score = df["Governance_Score"].mean()
+                fig2 = px.bar(histogram_frame(df["Governance_Score"], bins=len(HIST_EDGES) - 1, value_range=(0, 10),
+                                              name="Governance_Score"),
+                              x="Governance_Score", y="count", title="توزيع درجات الحوكمة")
+                scored = True
+
+                with st.expander("⚖️ حساسية الترتيب لأنظمة الأوزان"):
+                    st.caption(f"تُسحب آلاف الأوزان العشوائية حول نظام «{weight_scheme}» ويُقاس ثبات ترتيب المؤسسات "
+                               "(Kendall tau والتغير في أعلى k) مقارنة بالترتيب الحالي.")
+                    sens_cols = st.columns(4)
+                    sens_id = sens_cols[0].selectbox("🏦 عمود المؤسسة", ["(رقم الصف)"] + df.columns.tolist(),
+                                                     key="sens_id")
+                    n_schemes = sens_cols[1].select_slider("عدد الأنظمة", [100, 500, 1000, 2000, 5000], value=1000,
+                                                           key="sens_n")
+                    concentration = sens_cols[2].select_slider("التركّز حول الأوزان", [5, 20, 50, 200], value=50,
+                                                               key="sens_conc")
+                    top_k = int(sens_cols[3].number_input("k (أعلى k)", min_value=1, max_value=max(len(df), 1),
+                                                          value=min(10, max(len(df), 1)), key="sens_k"))
+                    if st.button("⚖️ تحليل الحساسية"):
+                        try:
+                            with profiler.stage(STAGE_SCORE):
+                                sens = weight_sensitivity(
+                                    df, n_schemes, base_weights=weight_scheme,
+                                    ids=None if sens_id == "(رقم الصف)" else df[sens_id].to_numpy(),
+                                    top_k=top_k, concentration=concentration, seed=0,
+                                    time_budget=SENSITIVITY_TIME_BUDGET,
+                                )
+                        except ValueError as exc:
+                            sens = None
+                            st.warning(f"⚠️ تعذر التحليل: {exc}")
+                        if sens is not None:
+                            if len(sens.schemes) < n_schemes:
+                                st.caption(f"⏱️ بلغ التحليل الحد الزمني ({SENSITIVITY_TIME_BUDGET:.0f} ث)، فالنتائج من "
+                                           f"{len(sens.schemes):,} نظام أوزان من أصل {n_schemes:,}.")
+                            s1, s2, s3 = st.columns(3)
+                            s1.metric("متوسط Kendall tau", f"{np.mean(sens.kendall_tau):.3f}")
+                            s2.metric("أدنى Kendall tau", f"{np.min(sens.kendall_tau):.3f}")
+                            s3.metric(f"متوسط التغير في أعلى {sens.top_k}", f"{np.mean(sens.top_k_churn):.0%}")
+                            plot(px.bar(histogram_frame(sens.kendall_tau, bins=50, name="Kendall tau"),
+                                        x="Kendall tau", y="count",
+                                        title="توزيع Kendall tau عبر أنظمة الأوزان"))
+                            st.dataframe(
+                                sens.entities.rename(columns={
+                                    "entity": "المؤسسة", "base_score": "الدرجة", "base_rank": "الترتيب الحالي",
+                                    "mean_rank": "متوسط الترتيب", "rank_std": "انحراف الترتيب",
+                                    "best_rank": "أفضل ترتيب", "worst_rank": "أسوأ ترتيب",
+                                    "top_k_share": f"نسبة البقاء في أعلى {sens.top_k}",
+                                }).style.format(precision=2),
+                                hide_index=True,
+                            )
+
+                with st.expander("🏅 الترتيب بين النظراء وأقرب المؤسسات"):
+                    peer_cols = st.columns(2)
+                    peer_entity = peer_cols[0].selectbox("🏦 عمود المؤسسة", df.columns.tolist(), key="peers_entity_col",
+                                                         persist_state="session")
+                    peer_period = peer_cols[1].selectbox("📅 عمود الفترة", ["(بدون)"] + df.columns.tolist(),
+                                                         key="peers_period_col", persist_state="session")
+                    peer_period = None if peer_period == "(بدون)" else peer_period
+                    if peer_entity == peer_period:
+                        st.warning("⚠️ اختر عمودين مختلفين للمؤسسة والفترة.")
+                    else:
+                        with profiler.stage(STAGE_FIT):
+                            peer_index = result_cache.get_or_compute(
+                                make_key("tab4_peers", data_key, peer_entity, peer_period, weight_scheme),
+                                PeerIndex.from_frame, df, peer_entity, peer_period, weight_scheme,
+                            )
+                        peer_panel(peer_index, "peers_upload")
+
+                with st.expander("💾 حفظ في مخزن المؤشرات"):
+                    st.caption("تُحسب درجات الصفوف الجديدة أو المعدّلة فقط، وتُحدَّث متوسطات المؤسسات والفترات تراكميًا.")
+                    all_cols = df.columns.tolist()
+                    key_cols = st.columns(2)
+                    entity_col = key_cols[0].selectbox("🏦 عمود المؤسسة", all_cols, key="store_entity")
+                    period_col = key_cols[1].selectbox("📅 عمود الفترة (سنة أو ربع)", all_cols,
+                                                       index=min(1, len(all_cols) - 1), key="store_period")
+                    if st.button("💾 إضافة إلى المخزن"):
+                        if entity_col == period_col:
+                            st.warning("⚠️ اختر عمودين مختلفين للمؤسسة والفترة.")
+                        else:
+                            try:
+                                with profiler.stage(STAGE_SCORE):
+                                    added = store.append(df, entity_col, period_col, weights=weight_scheme)
+                                st.success(f"✅ جديد: {added.inserted:,} | معدّل: {added.updated:,} | "
+                                           f"دون تغيير: {added.unchanged:,} | مستبعد (بيانات ناقصة): {added.skipped:,}")
+                            except (KeyError, ValueError) as exc:
+                                st.error(f"❌ تعذر الحفظ: {exc}")
+
+    if scored:
+        if avg_score >= 8:
+            st.info(f"🏆 متوسط الحوكمة عالي ({avg_score:.2f})، الأداء جيد.")
+        elif avg_score >= 5:
+            st.warning(f"⚠️ متوسط الحوكمة متوسط ({avg_score:.2f})، تفاوت بين المؤسسات.")
+        else:
+            st.error(f"❗ متوسط الحوكمة ضعيف ({avg_score:.2f})، حاجة لتحسين.")
 
-            st.markdown("###  توصيات:")
-            if avg_score < 5:
-                st.markdown("- 🛠️  تحسين شامل للحوكمة عبر المؤسسات او السنوات.")
-            elif avg_score < 8:
-                st.markdown("- 🧩 مشاركة أفضل الممارسات بين المؤسسات او السنوات.")
-            else:
-                st.markdown("- ✅ الاستمرار في التحسينات الحالية.")
+        st.markdown("###  توصيات:")
+        if avg_score < 5:
+            st.markdown("- 🛠️  تحسين شامل للحوكمة عبر المؤسسات او السنوات.")
+        elif avg_score < 8:
+            st.markdown("- 🧩 مشاركة أفضل الممارسات بين المؤسسات او السنوات.")
+        else:
+            st.markdown("- ✅ الاستمرار في التحسينات الحالية.")
 
-            fig2 = px.histogram(df, x="Governance_Score", title="توزيع درجات الحوكمة")
-            st.plotly_chart(fig2)
+        plot(fig2)
 
-            # شرح مفسر لنتيجة متوسط الحوكمة
-            st.markdown("---")
-            st.markdown("#### 📌 تفسير متوسط مؤشر الحوكمة:")
-            if avg_score >= 8:
-                st.success(
-                    "متوسط الحوكمة العالي يدل على أن المؤسسة أو المؤسسات بشكل عام تحكم جيد ومستقر، وهذا يشير إلى "
-                    "بيئة أعمال سليمة وتحكم فعال."
-                )
-            elif avg_score >= 5:
-                st.warning(
-                    "متوسط الحوكمة المتوسط يعكس تفاوتًا في جودة الحوكمة ، وينصح بتبادل الخبرات "
-                    "وتبني ممارسات أفضل."
-                )
-            else:
-                st.error(
-                    "متوسط الحوكمة المنخفض يشير إلى وجود مشاكل كبيرة في الحوكمة على مستوى عدد السنوات أو المؤسسات، "
-                    "مما يستدعي تدخلات إصلاحية عاجلة."
-                )
+        # شرح مفسر لنتيجة متوسط الحوكمة
+        st.markdown("---")
+        st.markdown("#### 📌 تفسير متوسط مؤشر الحوكمة:")
+        if avg_score >= 8:
+            st.success(
+                "متوسط الحوكمة العالي يدل على أن المؤسسة أو المؤسسات بشكل عام تحكم جيد ومستقر، وهذا يشير إلى "
+                "بيئة أعمال سليمة وتحكم فعال."
+            )
+        elif avg_score >= 5:
+            st.warning(
+                "متوسط الحوكمة المتوسط يعكس تفاوتًا في جودة الحوكمة ، وينصح بتبادل الخبرات "
+                "وتبني ممارسات أفضل."
+            )
         else:
-            st.warning("⚠️ تأكد من وجود الأعمدة المطلوبة في الملف.")
-with tab5:
+            st.error(
+                "متوسط الحوكمة المنخفض يشير إلى وجود مشاكل كبيرة في الحوكمة على مستوى عدد السنوات أو المؤسسات، "
+                "مما يستدعي تدخلات إصلاحية عاجلة."
+            )
+    elif upload:
+        st.warning("⚠️ تأكد من وجود الأعمدة المطلوبة في الملف.")
+
+
+def allocation_tab():
     st.subheader("5️⃣ تحسين رأس المال بعد الصدمة - بقيود")
 
     st.markdown("📝 في هذا القسم يتم تحسين توزيع رأس المال بعد تعرض البنك لصدمة، مع مراعاة مستويات الحوكمة والقيود التنظيمية.")
@@ -469,38 +1128,66 @@ with tab5:
         - ⏱️ زمن التعديل يُحسب كنسبة بين رأس المال المخصص للكل وحدة وتأثير الصدمة مضروبًا بعامل يعكس مستوى الحوكمة.
         - 💡 كلما ارتفع مستوى الحوكمة، كلما قل زمن تعديل رأس المال، مما يعكس مرونة واستجابة أسرع.
         - 🛑 يتم فرض قيود على الحد الأقصى لرأس المال لكل وحدة لضمان الالتزام التنظيمي.
+        - 🧮 الطريقة التناسبية توزع رأس المال حسب (الحوكمة + 1) مع احترام السقف بدقة، أما طريقة أقل زمن فتحل البرنامج الخطي الذي يقلل مجموع أزمنة التعديل.
 
         هذه المنهجية تتيح توزيعًا متوازنًا ومرنًا لرأس المال لتحسين سرعة التكيف مع الصدمات المالية.
         """)
 
-    num_units = st.number_input("🔢 عدد الوحدات", 2, 10, 3)
-    total_capital = st.number_input("💰 رأس المال (مليون)", 0.0, 10000.0, 100.0)
-    shock_impact = st.number_input("⚠️ معامل الصدمة", 0.1, 1.0, 0.3)
-    min_gov = st.number_input("📉 الحد الأدنى للحوكمة", 0.0, 10.0, 5.0)
-    max_alloc = st.number_input("🔒 الحد الأقصى للوحدة (مليون)", 0.0)
+    input_mode_units = st.radio("🗂️ طريقة إدخال الوحدات", ["حقول فردية (حتى 10 وحدات)", "جدول أو ملف (عدد غير محدود)"],
+                                horizontal=True, key="units_input_mode", persist_state="session")
+    bulk_units = input_mode_units.startswith("جدول")
+    if not bulk_units:
+        num_units = st.number_input("🔢 عدد الوحدات", 2, 10, 3, key="num_units", persist_state="session")
+    total_capital = st.number_input("💰 رأس المال (مليون)", 0.0, 10000.0, 100.0, key="alloc_capital", persist_state="session")
+    shock_impact = st.number_input("⚠️ معامل الصدمة", 0.1, 1.0, 0.3, key="alloc_shock", persist_state="session")
+    min_gov = st.number_input("📉 الحد الأدنى للحوكمة", 0.0, 10.0, 5.0, key="alloc_min_gov", persist_state="session")
+    max_alloc = st.number_input("🔒 الحد الأقصى للوحدة (مليون)", 0.0, key="alloc_max", persist_state="session")
+    alloc_method = st.radio(
+        "⚙️ طريقة التوزيع",
+        [METHOD_PROPORTIONAL, METHOD_MIN_DURATION],
+        format_func={
+            METHOD_PROPORTIONAL: "تناسبي مع الحوكمة (تعبئة مائية بسقف)",
+            METHOD_MIN_DURATION: "أقل زمن تعديل كلي (برمجة خطية)",
+        }.get,
+        key="alloc_method",
+        persist_state="session",
+    )
+
+    if bulk_units:
+        # جدول واحد بدل حقل لكل وحدة، ويمكن تعبئته من ملف (أعمدة: الوحدة، مستوى الحوكمة أو Unit, Governance)
+        units_file = kept_upload("📁 ملف الوحدات (CSV أو Excel)", ["csv", "xlsx"], "units_file")
+        units_table = default_units(3)
+        if units_file:
+            with profiler.stage(STAGE_READ):
+                loaded = open_upload(units_file, lambda f: read_upload(f.getvalue(), f.name, frame_cache),
+                                     lambda key: reload_upload(key, frame_cache))
+            if loaded is not None:
+                units_table = loaded[1]
+        units_table = kept_editor(units_table, f"units_editor_{units_file.file_id if units_file else 'default'}")
+        try:
+            unit_names, g_arr = units_from_frame(units_table)
+        except KeyError:
+            st.error(f"❌ الجدول يجب أن يحتوي على عمود «{UNIT_GOV}» أو Governance.")
+            unit_names, g_arr = [], np.array([])
+        num_units = len(g_arr)
+    else:
+        g_arr = [st.number_input(f"حوكمة وحدة {i+1}", 0.0, 10.0, 6.0, key=f"unit_gov{i}", persist_state="session")
+                 for i in range(int(num_units))]
+        unit_names = [f"وحدة {i+1}" for i in range(num_units)]
 
-    g_arr = [st.number_input(f"حوكمة وحدة {i+1}", 0.0, 10.0, 6.0) for i in range(int(num_units))]
+    if st.button("🔄 تحسين التوزيع") and num_units > 0:
+        import plotly.express as px
 
-    if st.button("🔄 تحسين التوزيع"):
         g_arr = np.array(g_arr)
-        eff = g_arr + 1
-        eligible = g_arr >= min_gov
-        eff[~eligible] = 0
-
-        weights = eff / eff.sum() if eff.sum() > 0 else np.zeros_like(eff)
-        alloc = weights * total_capital
-        alloc = np.minimum(alloc, max_alloc)
-
-        unused = total_capital - alloc.sum()
-        room = max_alloc - alloc
-        if room.sum() > 0 and unused > 0:
-            share = room / room.sum()
-            alloc += unused * share
-
-        duration = (alloc * shock_impact) / (g_arr + 1)
+        with profiler.stage(STAGE_SOLVE):
+            allocation = allocate_capital(g_arr, total_capital, shock_impact, min_gov=min_gov,
+                                          max_alloc=max_alloc, method=alloc_method)
+        alloc, duration, eligible = allocation.alloc, allocation.duration, allocation.eligible
+        if allocation.unallocated > 1e-9:
+            st.warning(f"⚠️ تعذر توزيع {allocation.unallocated:.2f} مليون بسبب السقف أو عدم أهلية الوحدات.")
 
         df_alloc = pd.DataFrame({
-            "الوحدة": [f"وحدة {i+1}" for i in range(num_units)],
+            "الوحدة": unit_names,
             "مؤهل؟": ["✅" if e else "❌" for e in eligible],
             "مستوى الحوكمة": g_arr,
             "رأس المال المخصص": alloc,
@@ -511,21 +1198,18 @@ with tab5:
         st.metric("⏱️ الزمن الكلي", f"{duration.sum():.2f} يومًا")
 
         fig = px.bar(df_alloc, x="الوحدة", y="رأس المال المخصص", color="مؤهل؟", text="زمن التعديل (يوم)")
-        st.plotly_chart(fig)
+        plot(fig)
 
         # --- تحليل الحساسية ---
         shock_values = np.linspace(0.1, 1.0, 10)
-        avg_durations = []
-        for val in shock_values:
-            dur = (alloc * val) / (g_arr + 1)
-            avg_durations.append(dur.mean())
+        avg_durations = ((alloc * shock_values[:, None]) / (g_arr + 1)).mean(axis=1)
 
         fig_sensitivity = px.line(
             x=shock_values, y=avg_durations,
             labels={"x": "معامل الصدمة", "y": "متوسط زمن التعديل (يوم)"},
             title="تحليل حساسية متوسط زمن التعديل لمعان الصدمة"
         )
-        st.plotly_chart(fig_sensitivity)
+        plot(fig_sensitivity)
 
         # --- تحليلات إضافية ---
         st.markdown("---")
@@ -558,8 +1242,9 @@ with tab5:
         else:
             st.success("- 🚀 جميع الوحدات لديها زمن تعديل مقبول.")
 
+
 # تبويب 6: تحسين العائد باستخدام لاكرانج + مؤشرات المخاطر + نموذج تحسين متعدد
-with tab6:
+def returns_tab():
     st.subheader("6️⃣ تحسين العائد باستخدام مضاعفات لاكرانج")
 
     st.markdown("📝 في هذا القسم يتم تحسين توزيع الاستثمارات لتحقيق أعلى عائد ممكن ضمن قيود المخاطر والحدود التنظيمية.")
@@ -577,40 +1262,93 @@ with tab6:
         هذه المنهجية تتيح اختيار أفضل توزيع للأصول لتحقيق أفضل أداء مالي ممكن ضمن قيود المخاطر والتنظيم.
         """)
 
-    total_capital = st.number_input("💰 القيمة الإجمالية للاستثمار (بالدرهم)", 10000.0, 1e8, 100000.0, step=1000.0)
+    total_capital = st.number_input("💰 القيمة الإجمالية للاستثمار (بالدرهم)", 10000.0, 1e8, 100000.0, step=1000.0,
+                                    key="returns_capital", persist_state="session")
 
-    n_assets = st.number_input("🔢 عدد الاستثمارات", 2, 10, 3)
+    input_mode_assets = st.radio("🗂️ طريقة إدخال الاستثمارات", ["حقول فردية (حتى 10 استثمارات)", "جدول أو ملف (عدد غير محدود)"],
+                                 horizontal=True, key="assets_input_mode", persist_state="session")
+    bulk_assets = input_mode_assets.startswith("جدول")
     r_list, max_list, min_list = [], [], []
-    for i in range(int(n_assets)):
-        r = st.number_input(f"📈 عائد الاستثمار {i+1} (%)", key=f"r{i}")
-        max_dh = st.number_input(f"🔒 الحد الأقصى للاستثمار {i+1} (درهم)", 0.0, total_capital, total_capital, key=f"m{i}")
-        min_dh = st.number_input(f"⬇️ الحد الأدنى للاستثمار {i+1} (درهم)", 0.0, total_capital, 0.0, key=f"mn{i}")
-
-        r_list.append(r / 100)
-        max_list.append(max_dh / total_capital)
-        min_list.append(min_dh / total_capital)
-
-    cov_matrix = np.identity(int(n_assets)) * 0.02  # تغاير بسيط لكل أصل (افتراضي)
-
-    if st.button("🚀 تنفيذ تحسين العائد"):
+    if bulk_assets:
+        # جدول واحد بدل ثلاثة حقول لكل استثمار (أعمدة CSV: Asset, Return, Max, Min)
+        assets_file = kept_upload("📁 ملف الاستثمارات (CSV أو Excel)", ["csv", "xlsx"], "assets_file")
+        assets_table = default_assets(3, total_capital)
+        if assets_file:
+            with profiler.stage(STAGE_READ):
+                loaded = open_upload(assets_file, lambda f: read_upload(f.getvalue(), f.name, frame_cache),
+                                     lambda key: reload_upload(key, frame_cache))
+            if loaded is not None:
+                assets_table = loaded[1]
+        assets_table = kept_editor(assets_table, f"assets_editor_{assets_file.file_id if assets_file else 'default'}")
+        try:
+            asset_labels, r_bulk, max_bulk, min_bulk = assets_from_frame(assets_table, total_capital)
+            r_list, max_list, min_list = list(r_bulk), list(max_bulk), list(min_bulk)
+        except KeyError:
+            st.error(f"❌ الجدول يجب أن يحتوي على عمود «{ASSET_RETURN}» أو Return.")
+            asset_labels = []
+        n_assets = len(asset_labels)
+    else:
+        n_assets = st.number_input("🔢 عدد الاستثمارات", 2, 10, 3, key="n_assets", persist_state="session")
+        asset_labels = [f"استثمار {i+1}" for i in range(int(n_assets))]
+        for i in range(int(n_assets)):
+            r = st.number_input(f"📈 عائد الاستثمار {i+1} (%)", key=f"r{i}", persist_state="session")
+            max_dh = st.number_input(f"🔒 الحد الأقصى للاستثمار {i+1} (درهم)", 0.0, total_capital, total_capital, key=f"m{i}")
+            min_dh = st.number_input(f"⬇️ الحد الأدنى للاستثمار {i+1} (درهم)", 0.0, total_capital, 0.0, key=f"mn{i}")
+
+            r_list.append(r / 100)
+            max_list.append(max_dh / total_capital)
+            min_list.append(min_dh / total_capital)
+
+    cov_matrix = default_covariance(n_assets)  # تغاير بسيط لكل أصل (افتراضي)
+
+    with st.expander("📂 تقدير التغاير من سجل العوائد (اختياري)"):
+        returns_file = kept_upload("ارفع سجل العوائد (كل صف فترة، وكل عمود استثمار، بالكسور العشرية)",
+                                   ["csv", "xlsx"], "returns_history")
+        cov_method = st.selectbox("طريقة التقدير", COVARIANCE_METHODS, index=1, format_func={
+            "sample": "تغاير العينة",
+            "ledoit_wolf": "انكماش Ledoit-Wolf",
+            "ewma": "متوسط متحرك أسي (EWMA)",
+        }.get, key="cov_method", persist_state="session")
+    loaded = None
+    if returns_file:
+        with profiler.stage(STAGE_READ):
+            loaded = open_upload(returns_file, lambda f: read_upload(f.getvalue(), f.name, frame_cache),
+                                 lambda key: reload_upload(key, frame_cache))
+    if loaded is not None:
+        returns_key, df_returns = loaded
+        try:
+            with profiler.stage(STAGE_FIT):
+                cov_est, return_cols = result_cache.get_or_compute(
+                    make_key("covariance", returns_key, cov_method), estimate_covariance, df_returns, cov_method
+                )
+        except ValueError:
+            cov_est, return_cols = None, []
+        if cov_est is not None and len(return_cols) == n_assets:
+            cov_matrix = cov_est
+            st.success(f"✅ تم تقدير التغاير من {len(df_returns)} فترة لـ {len(return_cols)} استثمارات.")
+        else:
+            st.warning(f"⚠️ عدد أعمدة العوائد الصالحة ({len(return_cols)}) لا يطابق عدد الاستثمارات ({n_assets})، "
+                       "سيتم استخدام التغاير الافتراضي.")
+
+    solver_cols = st.columns(2)
+    solver_options = available_solvers()
+    solver_name = (solver_cols[0].selectbox("🧮 محلل CVXPY", solver_options, key="solver", persist_state="session")
+                   if solver_options else None)
+    risk_aversion = solver_cols[1].number_input("⚖️ معامل المخاطرة (λ)", 0.0, 100.0, DEFAULT_LAMBDA, step=0.05,
+                                                key="risk_aversion", persist_state="session")
+    show_frontier = st.checkbox("📈 رسم الحد الكفء (مسح قيم λ)", key="show_frontier", persist_state="session")
+    frontier_points = (st.slider("عدد قيم λ في المسح", 50, 1000, 200, step=50, key="frontier_points",
+                                 persist_state="session") if show_frontier else 0)
+
+    if st.button("🚀 تنفيذ تحسين العائد") and n_assets > 0:
+        import plotly.express as px
 
         r = np.array(r_list)
         max_c = np.array(max_list)
         min_c = np.array(min_list)
 
-        base = r / r.sum()
-        w = np.maximum(base, min_c)
-        w = np.minimum(w, max_c)
-
-        unused = 1.0 - w.sum()
-        if unused > 0:
-            room = max_c - w
-            room[room < 0] = 0
-            share = room / room.sum() if room.sum() > 0 else 0
-            w += unused * share
-
-        if w.sum() > 1:
-            w = w / w.sum()
+        with profiler.stage(STAGE_SOLVE):
+            w = heuristic_weights(r, min_c, max_c)
 
         p_return = np.dot(w, r)
         port_variance = np.dot(w.T, np.dot(cov_matrix, w))
@@ -620,22 +1358,18 @@ with tab6:
         sharpe_ratio = (p_return - risk_free_rate) / port_std if port_std != 0 else 0
 
         # تحليل الحساسية للعائد
-        sensitivity = []
         delta = 0.01
-        for i in range(len(r)):
-            r_sens = r.copy()
-            r_sens[i] += delta
-            p_return_sens = np.dot(w, r_sens)
-            sensitivity.append((p_return_sens - p_return) / delta)
+        # كل صف يرفع عائد استثمار واحد بمقدار delta، فتُحسب الحساسيات كلها بضرب مصفوفي واحد
+        sensitivity = ((r + delta * np.eye(len(r))) @ w - p_return) / delta
 
         equal_w = np.ones_like(w) / len(w)
         equal_return = np.dot(equal_w, r)
 
-        unconstrained_w = base / base.sum()
+        unconstrained_w = r / r.sum()
         unconstrained_return = np.dot(unconstrained_w, r)
 
         df_result = pd.DataFrame({
-            "الاستثمار": [f"استثمار {i+1}" for i in range(n_assets)],
+            "الاستثمار": asset_labels,
             "الوزن الأمثل": w,
             "القيمة بالدرهم": w * total_capital,
             "العائد المتوقع (%)": r * 100,
@@ -665,27 +1399,24 @@ with tab6:
 
         fig = px.bar(df_result, x="الاستثمار", y="الوزن الأمثل", color="العائد المتوقع (%)",
                      labels={"الوزن الأمثل": "الوزن الأمثل (%)", "العائد المتوقع (%)": "العائد (%)"})
-        st.plotly_chart(fig)
+        plot(fig)
 
         # --- نموذج تحسين العائد مقابل المخاطرة باستخدام ---
         st.subheader("تحسين العائد مقابل المخاطرة باستخدام CVXPY")
 
         n = len(r_list)
-        w_var = cp.Variable(n)
         r_arr = np.array(r_list)
-        cov = np.diag(np.full(n, 0.02))  # تغاير افتراضي ثابت
 
-        _lambda = 0.1  # معاملة المخاطرة
+        # المسألة تُبنى مرة واحدة لكل عدد أصول ومحلل، ثم يُعاد حلها بتغيير المعاملات فقط
+        prob = get_portfolio_problem(n, solver_name, covariance_structure(cov_matrix))
+        with profiler.stage(STAGE_SOLVE):
+            solution = prob.solve(r_arr, min_c, max_c, risk_aversion, cov_matrix)
+        st.caption(f"⏱️ زمن الحل: {solution.solve_time * 1000:.1f} ms (الحل رقم {prob.solves} لهذه المسألة)")
 
-        objective = cp.Maximize(r_arr.T @ w_var - _lambda * cp.quad_form(w_var, cov))
-        constraints = [cp.sum(w_var) == 1, w_var >= min_c, w_var <= max_c]
-        prob = cp.Problem(objective, constraints)
-        prob.solve()
-
-        if prob.status == "optimal" and w_var.value is not None and not np.any(np.isnan(w_var.value)):
-            optimal_weights = w_var.value
+        if solution.weights is not None:
+            optimal_weights = solution.weights
             df_opt = pd.DataFrame({
-                "الاستثمار": [f"استثمار {i+1}" for i in range(n)],
+                "الاستثمار": asset_labels,
                 "الوزن الأمثل (CVXPY)": optimal_weights,
                 "القيمة بالدرهم": optimal_weights * total_capital
             })
@@ -696,9 +1427,88 @@ with tab6:
         else:
             st.error("❌ لم يتم التوصل إلى توزيع أمثل باستخدام CVXPY. تحقق من القيود أو معاملات العائد.")
 
+        # --- الحد الكفء: حل المسألة لمئات القيم من λ دفعة واحدة ---
+        if show_frontier:
+            st.subheader("📈 الحد الكفء للعائد مقابل المخاطرة")
+            try:
+                with profiler.stage(STAGE_SOLVE):
+                    frontier = efficient_frontier(r_arr, cov_matrix, min_c, max_c, default_lambdas(frontier_points),
+                                                  problem=prob)
+            except ValueError:
+                frontier = None
+                st.error("❌ القيود غير متسقة: يجب أن يكون مجموع الحدود الدنيا ≤ 100% ≤ مجموع الحدود القصوى.")
+
+            if frontier is not None and frontier.max_sharpe is not None:
+                best = frontier.max_sharpe
+                df_frontier = pd.DataFrame({
+                    "λ": frontier.lambdas,
+                    "المخاطرة (%)": frontier.risks * 100,
+                    "العائد (%)": frontier.returns * 100,
+                    "مؤشر شارب": frontier.sharpe,
+                })
+                fig_frontier = px.line(df_frontier, x="المخاطرة (%)", y="العائد (%)", hover_data=["λ", "مؤشر شارب"],
+                                       title="الحد الكفء")
+                fig_frontier.add_scatter(x=[frontier.risks[best] * 100], y=[frontier.returns[best] * 100],
+                                         mode="markers", marker=dict(size=14, color="red"), name="أعلى شارب")
+                plot(fig_frontier)
+
+                st.metric("🏅 أعلى مؤشر شارب", f"{frontier.sharpe[best]:.2f}", help=f"λ = {frontier.lambdas[best]:.4g}")
+
+                df_path = pd.DataFrame(frontier.weights, columns=asset_labels)
+                df_path.insert(0, "λ", frontier.lambdas)
+                fig_path = px.area(df_path, x="λ", y=df_path.columns[1:], log_x=True,
+                                   title="مسار الأوزان المثلى حسب معامل المخاطرة")
+                plot(fig_path)
+
         # توصيات ذكية
         st.markdown("### 🤖 توصيات:")
         if sharpe_ratio < 1:
             st.warning("مخاطر المحفظة عالية نسبيًا، يُنصح بإعادة توزيع الأوزان أو زيادة التنويع.")
         else:
             st.success("المحفظة متوازنة جيدًا مع عائد ومخاطر محسوبة.")
+
+# تبويبات رئيسية: يُنفذ التبويب المعروض فقط، والتنقل بينها يعيد التشغيل
+TABS = [
+    ("tab1", "1️⃣ إدخال مؤشرات الحوكمة", indicators_tab),
+    ("tab2", "2️⃣ محاكاة تعديل رأس المال", adjustment_tab),
+    ("tab3", "3️⃣ تحليل الأداء المالي", performance_tab),
+    ("tab4", "4️⃣ تقييم جودة الحوكمة", evaluation_tab),
+    ("tab5", "5️⃣ تحسين رأس المال", allocation_tab),
+    ("tab6", "6️⃣ تحسين العائد", returns_tab),
+]
+
+tabs = st.tabs([label for _, label, _ in TABS], key="active_tab", on_change=keep_tables)
+for tab, (name, _, render) in zip(tabs, TABS):
+    if tab.open:
+        with tab, profiler.tab(name):
+            render()
+
+# تترك الجلسة الجداول التي لم يستخدمها هذا التشغيل، وتُغلق الجداول التي لم تعد أي جلسة نشطة تستخدمها
+frame_cache.close()
+shared_frames.sweep(session_active)
+
+# لوحة التشخيص في نهاية التشغيل بعد أن سُجلت مراحل كل التبويبات
+run_records = profiler.close()
+if profiler.enabled:
+    history = st.session_state.setdefault("profile_history", [])
+    history.append(run_records)
+    del history[:-PROFILE_HISTORY_RUNS]
+    all_records = [r for run in history for r in run]
+    with st.sidebar.expander("📋 لوحة التشخيص", expanded=True):
+        last_run = records_frame(run_records)
+        st.caption(f"التشغيل الأخير: {last_run.loc[last_run['stage'] == 'total', 'seconds'].sum():.2f} ث "
+                   f"| عدد التشغيلات المسجلة: {len(history)}")
+        shared = shared_frames.stats()
+        st.caption(f"الجداول المشتركة: {shared.datasets} في الذاكرة ({shared.memory_bytes / 2**20:,.1f} MB) "
+                   f"| الجلسات: {shared.sessions} | على القرص: {shared.files} ({shared.disk_bytes / 2**20:,.1f} MB)")
+        st.dataframe(last_run[["tab", "stage", "seconds", "peak_mb", "status"]].rename(columns={
+            "tab": "التبويب", "stage": "المرحلة", "seconds": "الزمن (ث)", "peak_mb": "ذروة الذاكرة (MB)",
+            "status": "الحالة",
+        }).style.format(precision=3), hide_index=True)
+        st.markdown("**ملخص التشغيلات الأخيرة**")
+        st.dataframe(stage_summary(all_records).rename(columns={
+            "tab": "التبويب", "stage": "المرحلة", "runs": "التشغيلات", "median_s": "وسيط الزمن (ث)",
+            "max_s": "أقصى زمن (ث)", "peak_mb": "أقصى ذروة (MB)",
+        }).style.format(precision=3), hide_index=True)
+        st.download_button("⬇️ تنزيل السجلات (JSON lines)", to_jsonl(all_records).encode("utf-8"),
+                           file_name="governance_profile.jsonl", mime="application/x-ndjson", key="profile_jsonl")
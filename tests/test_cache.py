@@ -0,0 +1,77 @@
+"""ذاكرة الجداول المشتركة: جلسات (خيوط) ترفع المحتوى نفسه في الوقت نفسه."""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from governance_engine.cache import FrameCache, SharedFrameCache, content_hash, read_upload
+from governance_engine.ingest import parse_table
+
+THREADS = 8
+
+
+def concurrent_puts(cache, key, df):
+    barrier = threading.Barrier(THREADS)
+    results, errors = [], []
+
+    def put():
+        barrier.wait()
+        try:
+            results.append(cache.put(key, df))
+        except Exception as exc:  # noqa: BLE001 - أي استثناء في خيط يجب أن يُفشل الاختبار
+            errors.append(exc)
+
+    threads = [threading.Thread(target=put) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+@pytest.mark.parametrize("cache_class", [SharedFrameCache, FrameCache])
+def test_concurrent_put_same_key(tmp_path, cache_class):
+    pytest.importorskip("pyarrow")
+    writes = []
+
+    class Counting(cache_class):
+        def _write(self, df, path):
+            writes.append(path)
+            super()._write(df, path)
+
+    cache = Counting(str(tmp_path))
+    df = pd.DataFrame({"a": np.arange(200_000, dtype=np.float64), "b": np.arange(200_000) % 7})
+    results, errors = concurrent_puts(cache, "k", df)
+
+    assert errors == []
+    assert results == [True] * THREADS
+    assert len(writes) == 1
+    assert os.listdir(tmp_path) == [f"k{cache.SUFFIX}"]
+    pd.testing.assert_frame_equal(cache.get("k"), df)
+
+
+def test_failed_write_releases_waiters(tmp_path):
+    pytest.importorskip("pyarrow")
+
+    class Failing(SharedFrameCache):
+        def _write(self, df, path):
+            raise ValueError("not convertible")
+
+    cache = Failing(str(tmp_path))
+    results, errors = concurrent_puts(cache, "k", pd.DataFrame({"a": [1.0]}))
+
+    assert errors == []
+    assert results == [False] * THREADS
+    assert os.listdir(tmp_path) == []
+    assert cache.get("k") is None
+
+
+def test_read_upload_parses_once_with_ingest_parser(tmp_path):
+    data = b"unit,governance\nA,6.5\nB,8\n"
+    cache = FrameCache(str(tmp_path))
+    key, df = read_upload(data, "units.csv", cache)
+    assert key == content_hash(data)
+    pd.testing.assert_frame_equal(df, parse_table(data, "units.csv"))
+    assert read_upload(data, "renamed.csv", cache)[1].equals(df)
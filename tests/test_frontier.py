@@ -0,0 +1,41 @@
+"""الحد الكفء لتغاير كثيف: مسار الخط الحرج مقارنة بحل CVXPY لكل قيمة λ."""
+import numpy as np
+import pytest
+
+from governance_engine.frontier import default_lambdas, efficient_frontier, solver_frontier_weights
+from governance_engine.portfolio import available_solvers
+
+
+def dense_problem(n, seed=0, upper=0.3):
+    rng = np.random.default_rng(seed)
+    history = rng.normal(0, 0.02, (200, n)) @ (np.eye(n) + 0.3 * rng.random((n, n)))
+    return rng.random(n) * 0.1 + 0.01, np.cov(history, rowvar=False), np.zeros(n), np.full(n, upper)
+
+
+def reference(r, cov, lo, hi, lambdas):
+    # OSQP قد يفشل عند λ الصغيرة (شبه برنامج خطي)، فالمرجع محلل نقطة داخلية
+    pytest.importorskip("cvxpy")
+    if "CLARABEL" not in available_solvers():
+        pytest.skip("needs the CLARABEL solver")
+    return solver_frontier_weights(r, cov, lo, hi, lambdas, solver="CLARABEL")
+
+
+@pytest.mark.parametrize("n, upper", [(2, 0.5), (12, 0.3), (40, 1.0)])
+def test_critical_line_matches_solver(n, upper):
+    r, cov, lo, hi = dense_problem(n, upper=upper)
+    lambdas = default_lambdas(40)
+    frontier = efficient_frontier(r, cov, lo, hi, lambdas)
+    assert frontier.method == "critical_line"
+    np.testing.assert_allclose(frontier.weights.sum(axis=1), 1.0, atol=1e-9)
+    assert np.all(frontier.weights >= lo - 1e-12) and np.all(frontier.weights <= hi + 1e-12)
+    np.testing.assert_allclose(frontier.weights, reference(r, cov, lo, hi, lambdas), atol=1e-4)
+
+
+def test_degenerate_returns_fall_back_to_solver():
+    r, cov, lo, hi = dense_problem(6, upper=0.3)
+    r[:] = 0.05  # كل العوائد متساوية: لا ترتيب للرأس الابتدائي
+    pytest.importorskip("cvxpy")
+    lambdas = default_lambdas(10)
+    frontier = efficient_frontier(r, cov, lo, hi, lambdas)
+    assert frontier.method == "solver"
+    np.testing.assert_allclose(frontier.weights, solver_frontier_weights(r, cov, lo, hi, lambdas), atol=1e-9)
@@ -0,0 +1,32 @@
+"""Kendall tau في تحليل حساسية الأوزان مقارنة بـ scipy."""
+import numpy as np
+import pytest
+
+from governance_engine.sensitivity import TAU_PAIRS, weight_sensitivity
+
+
+def reference_tau(X, result):
+    from scipy.stats import kendalltau
+
+    # الرتب نفسها التي يستخدمها التحليل: الأعلى درجة أولًا، والتعادل يُكسر بترتيب الصفوف
+    def ranks(scores):
+        return np.argsort(np.argsort(-scores, kind="stable"), kind="stable")
+
+    base = ranks(X @ result.base_weights)
+    return np.array([kendalltau(base, ranks(X @ w)).statistic for w in result.schemes])
+
+
+def test_tau_is_exact_for_small_panels():
+    pytest.importorskip("scipy")
+    X = np.round(np.random.default_rng(0).random((300, 5)) * 10)  # درجات صحيحة: تعادلات كثيرة
+    result = weight_sensitivity(X, 200, seed=1)
+    assert len(result.schemes) == 200
+    np.testing.assert_allclose(result.kendall_tau, reference_tau(X, result), atol=1e-12)
+
+
+def test_tau_is_estimated_from_sampled_pairs_for_large_panels():
+    pytest.importorskip("scipy")
+    X = np.random.default_rng(2).random((3000, 5)) * 10
+    assert 3000 * 2999 // 2 > TAU_PAIRS
+    result = weight_sensitivity(X, 50, seed=3, concentration=5)
+    np.testing.assert_allclose(result.kendall_tau, reference_tau(X, result), atol=6 / np.sqrt(TAU_PAIRS))
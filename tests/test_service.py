@@ -0,0 +1,185 @@
+"""خدمة HTTP من طرف إلى طرف: نسخة محلية عبر start_local()، ومقارنة كل مسار مع النواة المقابلة."""
+import http.client
+import io
+import json
+import threading
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("uvicorn")
+pa = pytest.importorskip("pyarrow")
+
+from governance_engine.allocation import allocate_capital  # noqa: E402
+from governance_engine.portfolio import PortfolioProblem, default_covariance  # noqa: E402
+from governance_engine.scoring import INDICATORS, score_batch  # noqa: E402
+from governance_engine.service import (  # noqa: E402
+    FORMAT_ARROW, FORMAT_JSON, FORMAT_JSONL, FORMATS, start_local,
+)
+from governance_engine.simulation import SHOCK_IMPACT, adjustment_duration  # noqa: E402
+
+MAX_BODY = 64 << 10
+SHOCK = next(iter(SHOCK_IMPACT))
+FORMAT_NAMES = ["json", "jsonl", "arrow"]
+
+
+@pytest.fixture(scope="module")
+def server():
+    process, port = start_local(args=["--max-body-bytes", str(MAX_BODY)])
+    yield port
+    process.terminate()
+    process.wait()
+
+
+def request(port, method, path, body=b"", media_type=FORMAT_JSON):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        conn.request(method, path, body, {"Content-Type": media_type, "Accept": media_type})
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def encode_body(items, media_type):
+    if media_type == FORMAT_ARROW:
+        table = pa.Table.from_pylist(items)
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue()
+    if media_type == FORMAT_JSONL:
+        return "".join(json.dumps(item) + "\n" for item in items).encode("utf-8")
+    return json.dumps(items).encode("utf-8")
+
+
+def decode_body(payload, media_type):
+    if media_type == FORMAT_ARROW:
+        return pa.ipc.open_stream(payload).read_all().to_pylist()
+    if media_type == FORMAT_JSONL:
+        return [json.loads(line) for line in payload.splitlines()]
+    return json.loads(payload)
+
+
+def post(port, endpoint, items, fmt):
+    media_type = FORMATS[fmt]
+    status, payload = request(port, "POST", f"/{endpoint}", encode_body(items, media_type), media_type)
+    assert status == 200, payload
+    return decode_body(payload, media_type)
+
+
+def indicator_rows(n=20, seed=0):
+    x = np.round(np.random.default_rng(seed).random((n, len(INDICATORS))) * 10, 3)
+    return x, [dict(zip(INDICATORS, row), id=f"B{i}") for i, row in enumerate(x.tolist())]
+
+
+@pytest.mark.parametrize("fmt", FORMAT_NAMES)
+def test_score_matches_score_batch(server, fmt):
+    x, rows = indicator_rows()
+    out = post(server, "score", rows, fmt)
+    expected = score_batch(x)
+    assert [r["id"] for r in out] == [r["id"] for r in rows]
+    np.testing.assert_allclose([r["Governance_Score"] for r in out], expected.scores)
+    np.testing.assert_array_equal([r["band"] for r in out], expected.bands)
+
+
+@pytest.mark.parametrize("fmt", FORMAT_NAMES)
+def test_simulate_matches_adjustment_duration(server, fmt):
+    x, rows = indicator_rows(seed=1)
+    capital = np.round(np.random.default_rng(2).random(len(rows)) * 500, 2)
+    for row, cap in zip(rows, capital.tolist()):
+        row.update(capital=cap, shock_type=SHOCK)
+    out = post(server, "simulate", rows, fmt)
+    expected = adjustment_duration(capital, score_batch(x).scores, SHOCK_IMPACT[SHOCK])
+    np.testing.assert_allclose([r["duration"] for r in out], np.round(expected, 2))
+
+
+@pytest.mark.parametrize("fmt", FORMAT_NAMES)
+def test_allocate_matches_allocate_capital(server, fmt):
+    rng = np.random.default_rng(3)
+    items = [{"governance": np.round(rng.random(8) * 10, 3).tolist(), "total_capital": 1000.0,
+              "shock_type": SHOCK, "min_gov": 2.0, "max_alloc": 300.0} for _ in range(3)]
+    out = post(server, "allocate", items, fmt)
+    for item, result in zip(items, out):
+        expected = allocate_capital(np.asarray(item["governance"]), 1000.0, SHOCK_IMPACT[SHOCK],
+                                    min_gov=2.0, max_alloc=300.0)
+        np.testing.assert_allclose(result["alloc"], expected.alloc)
+        assert result["unallocated"] == pytest.approx(expected.unallocated)
+
+
+@pytest.mark.parametrize("fmt", FORMAT_NAMES)
+def test_optimize_matches_portfolio_problem(server, fmt):
+    pytest.importorskip("cvxpy")
+    rng = np.random.default_rng(4)
+    items = [{"returns": np.round(rng.random(6) * 0.1 + 0.01, 4).tolist(), "upper": 0.4} for _ in range(2)]
+    out = post(server, "optimize", items, fmt)
+    problem = PortfolioProblem(6)
+    for item, result in zip(items, out):
+        expected = problem.solve(np.asarray(item["returns"]), np.zeros(6), np.full(6, 0.4),
+                                 cov=default_covariance(6))
+        assert result["status"] == expected.status
+        # مسألة الخادم محفوظة وتبدأ من الحل السابق، فالفرق في حدود دقة المحلل
+        np.testing.assert_allclose(result["weights"], expected.weights, atol=1e-4)
+
+
+@pytest.mark.parametrize("endpoint, body, media_type", [
+    ("score", b"{not json", FORMAT_JSON),
+    ("score", b"1\n2\n", FORMAT_JSONL),
+    ("score", b"not arrow", FORMAT_ARROW),
+    ("score", b"[{}]", "text/csv"),
+    ("allocate", b"1\n", FORMAT_JSONL),
+    ("allocate", b'{"governance": [5, 6], "shock_impact": [1, 2]}', FORMAT_JSON),
+    ("allocate", b'{"governance": [[5], [6]], "shock_type": "%s"}' % SHOCK.encode(), FORMAT_JSON),
+    ("optimize", b'{"returns": 0.1}', FORMAT_JSON),
+    ("optimize", b'{"returns": [0.1, 0.2], "risk_aversion": "high"}', FORMAT_JSON),
+    ("optimize", b'{"returns": [0.1, 0.2], "cov": [1, 2, 3, 4]}', FORMAT_JSON),
+])
+def test_bad_payloads_are_400(server, endpoint, body, media_type):
+    status, payload = request(server, "POST", f"/{endpoint}", body, media_type)
+    assert status == 400, payload
+    assert "error" in json.loads(payload)
+
+
+def test_unknown_endpoint_is_404(server):
+    assert request(server, "POST", "/nope", b"[]")[0] == 404
+
+
+def test_get_on_endpoint_is_405(server):
+    assert request(server, "GET", "/score")[0] == 405
+
+
+def test_large_body_is_413(server):
+    assert request(server, "POST", "/score", b" " * (MAX_BODY + 1))[0] == 413
+
+
+def test_health_reports_cache(server):
+    status, payload = request(server, "GET", "/health")
+    assert status == 200
+    assert {"requests", "cache_entries", "cache_bytes"} <= json.loads(payload).keys()
+
+
+def test_slow_optimize_does_not_block_health(server):
+    pytest.importorskip("cvxpy")
+    rng = np.random.default_rng(7)
+    items = [{"returns": np.round(rng.random(12) * 0.1, 4).tolist(), "risk_aversion": float(lam)}
+             for lam in np.round(rng.random(400) * 5 + 0.1, 3)]
+    body = encode_body(items, FORMAT_JSON)
+    assert len(body) < MAX_BODY  # أقل من OFFLOAD_BYTES: الإحالة إلى خيط منفصل بحسب المسار لا الحجم
+    slow = {}
+
+    def run_slow():
+        start = time.perf_counter()
+        slow["status"] = request(server, "POST", "/optimize", body)[0]
+        slow["seconds"] = time.perf_counter() - start
+
+    thread = threading.Thread(target=run_slow)
+    thread.start()
+    time.sleep(0.3)
+    start = time.perf_counter()
+    status, _ = request(server, "GET", "/health")
+    health_seconds = time.perf_counter() - start
+    thread.join()
+    assert status == 200 and slow["status"] == 200
+    assert slow["seconds"] > 1.0
+    assert health_seconds < slow["seconds"] / 4